@@ -0,0 +1,65 @@
+# Compares the JSON codecs on a view page decode and a document save encode.
+#
+#   python benchmarks/codec.py
+import json
+import os
+import sys
+import timeit
+from django.core.exceptions import ImproperlyConfigured
+
+# Importable from a checkout without installing the package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from couch.codec import CODECS  # noqa: E402
+from couch.codec import get_codec  # noqa: E402
+
+ROWS = 1000
+NUMBER = 50
+
+
+def get_view_page(rows):
+    doc = dict(
+        document_type='book',
+        title='Python Cookbook',
+        author='David Beazley',
+        pages=806,
+        price=39.99,
+        tags=['python', 'recipes', 'programming'],
+        published='2013-05-10T00:00:00',
+    )
+    result = dict(total_rows=rows, offset=0, rows=[])
+    for i in range(rows):
+        _id = 'book_{:06d}'.format(i)
+        row_doc = dict(doc, _id=_id, _rev='1-{:032x}'.format(i))
+        result['rows'].append(dict(id=_id, key=_id, value=None, doc=row_doc))
+    return json.dumps(result).encode('utf-8')
+
+
+def main():
+    content = get_view_page(ROWS)
+    doc = json.loads(content)['rows'][0]['doc']
+    # The previous code path: response.text, then json.loads on the str.
+    baseline = dict(
+        decode=timeit.timeit(lambda: json.loads(content.decode('utf-8')), number=NUMBER),
+        encode=timeit.timeit(lambda: json.dumps(doc), number=NUMBER * ROWS),
+    )
+    print('{} rows per view page, {} bytes'.format(ROWS, len(content)))
+    print('{:<10} {:>14} {:>10} {:>14} {:>10}'.format('codec', 'view page ms', 'speedup', 'save us', 'speedup'))
+    print('{:<10} {:>14.3f} {:>10} {:>14.3f} {:>10}'.format(
+        'baseline', baseline['decode'] * 1000 / NUMBER, '1.00x',
+        baseline['encode'] * 1000000 / (NUMBER * ROWS), '1.00x'))
+    for name in CODECS:
+        try:
+            codec = get_codec(name)
+        except ImproperlyConfigured:
+            print('{:<10} not installed'.format(name))
+            continue
+        decode = timeit.timeit(lambda: codec.loads(content), number=NUMBER)
+        encode = timeit.timeit(lambda: codec.dumps(doc), number=NUMBER * ROWS)
+        print('{:<10} {:>14.3f} {:>9.2f}x {:>14.3f} {:>9.2f}x'.format(
+            name, decode * 1000 / NUMBER, baseline['decode'] / decode,
+            encode * 1000000 / (NUMBER * ROWS), baseline['encode'] / encode))
+
+
+if __name__ == '__main__':
+    main()
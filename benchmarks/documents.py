@@ -0,0 +1,150 @@
+# Times document hydration (database.to_document for Manager.get and the
+# view and find hydrator) and serialization (Document._get_data), the per
+# row and per save hot loops, against the generic per attribute loops they
+# replaced.
+#
+#   python benchmarks/documents.py [count]
+import datetime
+import os
+import sys
+import timeit
+from decimal import Decimal
+import pytz
+from django.conf import settings
+
+# Importable from a checkout without installing the package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+settings.configure(USE_TZ=True, TIME_ZONE='UTC', COUCH_SERVERS=dict(default=dict()))
+
+from couch import documents  # noqa: E402
+from couch.database import get_hydrator  # noqa: E402
+from couch.database import to_document  # noqa: E402
+
+
+class Book(documents.Document):
+    title = documents.TextField()
+    pages = documents.IntegerField()
+    weight = documents.FloatField()
+    date = documents.DateField()
+    datetime = documents.DateTimeField()
+    price = documents.DecimalField()
+    published = documents.BooleanField()
+    tags = documents.JsonField()
+
+    class Meta:
+        database_name = 'db'
+        document_type = 'book'
+
+
+def legacy_to_document(data):
+    document = Book()
+    if 'document_type' in data:
+        data.pop('document_type')
+    for key, value in data.items():
+        if key in document._fields:
+            document._lazy[key] = value
+        else:
+            setattr(document, key, value)
+    document._take_snapshot()
+    return document
+
+
+def legacy_find_document(data):
+    # View and find rows used to be built with the constructor, leaving field
+    # values unconverted, so callers converted them in their own loops.
+    document = Book(**data)
+    for name, field in document._fields.items():
+        value = getattr(document, name)
+        if value is not None:
+            setattr(document, name, field._to_python(value))
+    document._take_snapshot()
+    return document
+
+
+def legacy_get_data(document, include_lazy=True):
+    data = dict()
+    for key, value in document.__dict__.items():
+        if key in document._fields:
+            data[key] = document._fields[key]._to_json(value)
+        else:
+            if not key.startswith('_'):
+                data[key] = value
+    if include_lazy:
+        for key, value in document._lazy.items():
+            field = document._fields[key]
+            data[key] = field._to_json(field._to_python(value))
+    if document._id:
+        data['_id'] = document._id
+    if document._rev:
+        data['_rev'] = document._rev
+    if document._meta.document_type:
+        document.document_type = document._meta.document_type
+        data['document_type'] = document.document_type
+    return data
+
+
+def get_data(i):
+    return dict(
+        _id='book_{:06d}'.format(i),
+        _rev='1-{:032x}'.format(i),
+        document_type='book',
+        title='Python Cookbook',
+        pages=806,
+        weight=0.45,
+        date='2013-05-01',
+        datetime='2013-05-01T09:00:00+00:00',
+        price='49.99',
+        published=True,
+        tags=['python', 'recipes'],
+        isbn='978-1449340377',
+    )
+
+
+def get_book(i):
+    return Book(
+        _id='book_{:06d}'.format(i),
+        title='Python Cookbook',
+        pages=806,
+        weight=0.45,
+        date=datetime.date(2013, 5, 1),
+        datetime=pytz.utc.localize(datetime.datetime(2013, 5, 1, 9, 0)),
+        price=Decimal('49.99'),
+        published=True,
+        tags=['python', 'recipes'],
+        isbn='978-1449340377',
+    )
+
+
+def main(count):
+    rows = [get_data(i) for i in range(count)]
+    books = [get_book(i) for i in range(count)]
+    loaded = [to_document(Book, dict(row)) for row in rows]
+    for book in books + loaded:
+        assert legacy_get_data(book) == book._get_data()
+    cases = (
+        ('hydrate',
+         lambda: [legacy_to_document(dict(row)) for row in rows],
+         lambda: [to_document(Book, dict(row)) for row in rows]),
+        ('hydrate find',
+         lambda: [legacy_find_document(dict(row)).datetime for row in rows],
+         lambda: [document.datetime for document in map(get_hydrator(Book), map(dict, rows))]),
+        ('serialize new',
+         lambda: [legacy_get_data(book) for book in books],
+         lambda: [book._get_data() for book in books]),
+        ('serialize loaded',
+         lambda: [legacy_get_data(document) for document in loaded],
+         lambda: [document._get_data() for document in loaded]),
+        ('dirty check loaded',
+         lambda: [document._get_snapshot(legacy_get_data(document, False)) for document in loaded],
+         lambda: [document._get_snapshot(document._get_data(False)) for document in loaded]),
+    )
+    print('{} documents, us per document'.format(count))
+    print('{:<20} {:>10} {:>10} {:>10}'.format('', 'before', 'after', 'speedup'))
+    for name, legacy, function in cases:
+        before = min(timeit.repeat(legacy, number=1, repeat=5)) * 1000000 / count
+        after = min(timeit.repeat(function, number=1, repeat=5)) * 1000000 / count
+        print('{:<20} {:>10.2f} {:>10.2f} {:>9.2f}x'.format(name, before, after, before / after))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,69 @@
+# Compares DateField and DateTimeField to_python against plain dateutil
+# parsing, as done before the ISO 8601 fast path.
+#
+#   python benchmarks/fields.py [count]
+import datetime
+import os
+import sys
+import time
+import pytz
+from dateutil.parser import parse
+from django.conf import settings
+
+# Importable from a checkout without installing the package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+settings.configure(USE_TZ=True, TIME_ZONE='Europe/Rome')
+
+from django.utils.timezone import get_current_timezone  # noqa: E402
+from couch import fields  # noqa: E402
+
+# dateutil is slow, the baseline runs on a sample and is scaled up.
+BASELINE_SAMPLE = 100
+
+
+def dateutil_date(value):
+    return parse(value).date()
+
+
+def dateutil_datetime(value):
+    value = parse(value)
+    if not value.tzinfo:
+        value = pytz.utc.normalize(pytz.utc.localize(value))
+    tz = get_current_timezone()
+    return value.astimezone(tz)
+
+
+def get_values(count, date_only):
+    start = datetime.datetime(2013, 5, 1, 12, 0, tzinfo=pytz.utc)
+    values = []
+    for i in range(count):
+        value = start + datetime.timedelta(minutes=i)
+        values.append(value.date().isoformat() if date_only else value.isoformat())
+    return values
+
+
+def measure(function, values):
+    start = time.perf_counter()
+    for value in values:
+        function(value)
+    return time.perf_counter() - start
+
+
+def main(count):
+    print('{} values'.format(count))
+    print('{:<15} {:>12} {:>12} {:>10}'.format('field', 'dateutil s', 'fast s', 'speedup'))
+    cases = (
+        ('DateField', dateutil_date, fields.DateField().to_python, True),
+        ('DateTimeField', dateutil_datetime, fields.DateTimeField().to_python, False),
+    )
+    for name, baseline, fast, date_only in cases:
+        values = get_values(count, date_only)
+        sample = values[:max(1, count // BASELINE_SAMPLE)]
+        assert all(baseline(value) == fast(value) for value in sample)
+        baseline_time = measure(baseline, sample) * count / len(sample)
+        fast_time = measure(fast, values)
+        print('{:<15} {:>12.2f} {:>12.2f} {:>9.1f}x'.format(name, baseline_time, fast_time, baseline_time / fast_time))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
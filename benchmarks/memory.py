@@ -0,0 +1,92 @@
+# Memory held by hydrated view rows, regular against compact documents.
+#
+#   python benchmarks/memory.py [count]
+import gc
+import os
+import sys
+import tracemalloc
+from django.conf import settings
+
+# Importable from a checkout without installing the package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+settings.configure(USE_TZ=True, TIME_ZONE='UTC', COUCH_SERVERS=dict(default=dict()))
+
+from couch import documents  # noqa: E402
+from couch.database import get_hydrator  # noqa: E402
+
+
+class Book(documents.Document):
+    title = documents.TextField()
+    pages = documents.IntegerField()
+    weight = documents.FloatField()
+    date = documents.DateField()
+    datetime = documents.DateTimeField()
+    price = documents.DecimalField()
+    published = documents.BooleanField()
+
+    class Meta:
+        database_name = 'db'
+        document_type = 'book'
+
+
+class CompactBook(documents.Document):
+    title = documents.TextField()
+    pages = documents.IntegerField()
+    weight = documents.FloatField()
+    date = documents.DateField()
+    datetime = documents.DateTimeField()
+    price = documents.DecimalField()
+    published = documents.BooleanField()
+
+    class Meta:
+        database_name = 'db'
+        document_type = 'book'
+        compact = True
+
+
+def get_rows(count):
+    return [
+        dict(
+            _id='book_{:06d}'.format(i),
+            _rev='1-{:032x}'.format(i),
+            document_type='book',
+            title='Python Cookbook',
+            pages=806,
+            weight=0.45,
+            date='2013-05-01',
+            datetime='2013-05-01T09:00:00+00:00',
+            price='49.99',
+            published=True,
+            isbn='978-1449340377',
+        )
+        for i in range(count)
+    ]
+
+
+def measure(document_class, rows, read):
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    result = list(map(get_hydrator(document_class), rows))
+    if read:
+        for document in result:
+            document.title, document.datetime, document.price
+    size = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main(count):
+    # Rows are shared by both runs, only document overhead is measured.
+    rows = get_rows(count)
+    print('{} documents, bytes per document'.format(count))
+    print('{:<25} {:>10} {:>10} {:>10}'.format('', 'regular', 'compact', 'ratio'))
+    for name, read in (('hydrated', False), ('3 fields read', True)):
+        regular = measure(Book, rows, read) / count
+        compact = measure(CompactBook, rows, read) / count
+        print('{:<25} {:>10.0f} {:>10.0f} {:>9.2f}x'.format(name, regular, compact, regular / compact))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -1,6 +1,10 @@
 from django.apps import AppConfig
+from .aio import AsyncDatabase
+from .aio import AsyncServer
 from .database import Database
 from .server import Server
+from .registry import get_database
+from .registry import get_server
 
 
 default_app_config = 'couch.CouchConfig'
@@ -9,3 +13,8 @@ default_app_config = 'couch.CouchConfig'
 class CouchConfig(AppConfig):
     name = 'couch'
     verbose_name = 'Couch'
+
+    def ready(self):
+        # Cache invalidation for the servers configured with INVALIDATION.
+        from .invalidation import start_listeners
+        start_listeners()
@@ -0,0 +1,511 @@
+import asyncio
+import json
+import time
+from functools import partial
+from functools import wraps
+from django.core.exceptions import ImproperlyConfigured
+from . import exceptions
+from .changes import AsyncCheckpoint
+from .changes import check_changes_options
+from .changes import DEFAULT_MAX_RETRIES
+from .columns import ColumnBuilder
+from .database import ChangesFeed
+from .database import check_prefetch
+from .database import Database
+from .database import FindPager
+from .database import SKIP
+from .database import ViewKeysPager
+from .database import ViewPager
+from .server import Server
+from .server import STATUS_CODES_2XX
+from .server import STREAM_CHUNK_SIZE
+from .streaming import RowParser
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+
+async def iterate(iterable):
+    for item in iterable:
+        yield item
+
+
+async def prefetch_batches(generator, batch_size, prefetch):
+    # Consume generator in a background task, keeping at most `prefetch`
+    # batches ready while the caller processes the current one.
+    queue = asyncio.Queue(maxsize=prefetch)
+
+    async def worker():
+        try:
+            batch = []
+            async for item in generator:
+                batch.append(item)
+                if len(batch) == batch_size:
+                    await queue.put((batch, None))
+                    batch = []
+            if batch:
+                await queue.put((batch, None))
+            await queue.put((None, None))
+        except asyncio.CancelledError:
+            raise
+        except Exception as exception:
+            await queue.put((None, exception))
+        finally:
+            await generator.aclose()
+
+    task = asyncio.ensure_future(worker())
+    try:
+        while True:
+            batch, exception = await queue.get()
+            if exception is not None:
+                raise exception
+            if batch is None:
+                return
+            for item in batch:
+                yield item
+    finally:
+        # Cancels the in-flight request, if any, and waits for the worker
+        # to close the generator.
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+class AsyncServer(Server):
+    body_argument = 'content'
+
+    def __init__(self, *args, **kwargs):
+        if httpx is None:  # pragma: no cover
+            raise ImproperlyConfigured('AsyncServer requires the httpx package.')
+        super(AsyncServer, self).__init__(*args, **kwargs)
+        self._async_session_lock = asyncio.Lock()
+
+    def _create_session(self):
+        # httpx pools per host on its own, POOL_CONNECTIONS does not apply.
+        limits = httpx.Limits(
+            max_connections=self.pool_maxsize,
+            max_keepalive_connections=self.pool_maxsize,
+        )
+        if not self.pool_block:
+            # Like requests: open extra connections, keep only pool_maxsize alive.
+            limits = httpx.Limits(
+                max_connections=None,
+                max_keepalive_connections=self.pool_maxsize,
+            )
+        auth = None
+        if self.authentication == 'basic':
+            auth = self.auth
+        return httpx.AsyncClient(auth=auth, limits=limits, timeout=httpx.Timeout(None))
+
+    def close(self):
+        raise TypeError('Use aclose() to close an AsyncServer.')
+
+    async def aclose(self):
+        await self.session.aclose()
+
+    async def _login(self):
+        url = '{}/_session'.format(self.url)
+        kwargs = self._encode_body(dict(json=dict(name=self.username, password=self.password)))
+        response = await self.session.post(url, **kwargs)
+        self._check_response(response, STATUS_CODES_2XX)
+        self._session_started = time.time()
+
+    async def _ensure_session(self):
+        if self._session_expired():
+            async with self._async_session_lock:
+                if self._session_expired():
+                    await self._login()
+
+    async def _send(self, method, url, acceptable_status_codes, stream=False, **kwargs):
+        url = '{}/{}'.format(self.url, url)
+        kwargs = self._encode_body(kwargs)
+        if self.authentication == 'cookie':
+            await self._ensure_session()
+        session_started = self._session_started
+        request = self.session.build_request(method, url, **kwargs)
+        response = await self.session.send(request, stream=stream)
+        if self.authentication == 'cookie':
+            if response.status_code == 401 and 401 not in acceptable_status_codes:
+                # Expired or revoked session: log in again, unless another
+                # task already did, and retry once.
+                await response.aclose()
+                async with self._async_session_lock:
+                    if self._session_started == session_started:
+                        await self._login()
+                request = self.session.build_request(method, url, **kwargs)
+                response = await self.session.send(request, stream=stream)
+            elif 'AuthSession' in response.cookies:
+                # Couchdb refreshed the cookie on its own.
+                self._session_started = time.time()
+        return response
+
+    async def _request(self, method, url, acceptable_status_codes, **kwargs):
+        response = await self._send(method, url, acceptable_status_codes, **kwargs)
+        return self._check_response(response, acceptable_status_codes)
+
+    async def stream_rows(self, url, method='GET', key='rows', acceptable_status_codes=STATUS_CODES_2XX, **kwargs):
+        # Yields the items of the `key` array as they are received.
+        try:
+            response = await self._send(method, url, acceptable_status_codes, stream=True, **kwargs)
+            try:
+                if response.status_code not in acceptable_status_codes:
+                    await response.aread()
+                    self._check_response(response, acceptable_status_codes)
+                parser = RowParser(key=key)
+                async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+                    for row in parser.feed(chunk):
+                        yield row
+                parser.close()
+            finally:
+                await response.aclose()
+        except httpx.TransportError as exception:
+            data = dict(error='httpx.TransportError', reason=str(exception))
+            raise exceptions.CouchError(data)
+
+    async def stream_lines(self, url, method='GET', acceptable_status_codes=STATUS_CODES_2XX, **kwargs):
+        # Yields the json lines of a continuous feed as they are received,
+        # None for the empty lines couchdb sends as heartbeat.
+        try:
+            response = await self._send(method, url, acceptable_status_codes, stream=True, **kwargs)
+            try:
+                if response.status_code not in acceptable_status_codes:
+                    await response.aread()
+                    self._check_response(response, acceptable_status_codes)
+                async for line in response.aiter_lines():
+                    line = line.strip()
+                    if line:
+                        yield self.codec.loads(line)
+                    else:
+                        yield None
+            finally:
+                await response.aclose()
+        except httpx.TransportError as exception:
+            data = dict(error='httpx.TransportError', reason=str(exception))
+            raise exceptions.CouchError(data)
+
+    def check_connection_error(f):
+        @wraps(f)
+        async def wrapped(*args, **kwargs):
+            try:
+                return await f(*args, **kwargs)
+            except httpx.TransportError as exception:
+                data = dict(error='httpx.TransportError', reason=str(exception))
+                raise exceptions.CouchError(data)
+        return wrapped
+
+    @check_connection_error
+    async def get(self, url, acceptable_status_codes=STATUS_CODES_2XX, **kwargs):
+        return await self._request('GET', url, acceptable_status_codes, **kwargs)
+
+    @check_connection_error
+    async def head(self, url, acceptable_status_codes=STATUS_CODES_2XX, **kwargs):
+        response = await self._send('HEAD', url, acceptable_status_codes, **kwargs)
+        return self._check_head_response(response, acceptable_status_codes)
+
+    @check_connection_error
+    async def conditional_get(self, url, etag=None, acceptable_status_codes=STATUS_CODES_2XX, **kwargs):
+        kwargs = self._set_if_none_match(kwargs, etag)
+        response = await self._send('GET', url, acceptable_status_codes, **kwargs)
+        return self._check_conditional_response(response, etag, acceptable_status_codes)
+
+    @check_connection_error
+    async def post(self, url, acceptable_status_codes=STATUS_CODES_2XX, **kwargs):
+        return await self._request('POST', url, acceptable_status_codes, **kwargs)
+
+    @check_connection_error
+    async def put(self, url, acceptable_status_codes=STATUS_CODES_2XX, **kwargs):
+        return await self._request('PUT', url, acceptable_status_codes, **kwargs)
+
+    @check_connection_error
+    async def delete(self, url, acceptable_status_codes=STATUS_CODES_2XX, **kwargs):
+        return await self._request('DELETE', url, acceptable_status_codes, **kwargs)
+
+    async def _cluster_setup(self):
+        return await self.post('/_cluster_setup', json=dict(action='finish_cluster'))
+
+    async def single_node_setup(self):
+        try:
+            await self._cluster_setup()
+        except exceptions.CouchError as e:
+            if not e.args[0]['reason'] == 'Cluster is already finished':
+                raise
+
+    async def _all_dbs(self):
+        return await self.get('/_all_dbs')
+
+    async def create_database(self, name):
+        await self.put('/{}'.format(self._get_database_name(name)))
+        return AsyncDatabase(name, server=self)
+
+    async def get_database(self, name, check=False):
+        if check:
+            await self.get('/{}'.format(self._get_database_name(name)))
+        return AsyncDatabase(name, server=self)
+
+    async def get_or_create_database(self, name):
+        try:
+            await self.get_database(name, check=True)
+        except exceptions.CouchError as e:
+            if e.args[0]['error'] == 'not_found':
+                return (await self.create_database(name), True)
+            raise
+        return (AsyncDatabase(name, server=self), False)
+
+    async def delete_database(self, name):
+        return await self.delete('/{}'.format(self._get_database_name(name)))
+
+    async def delete_database_if_exists(self, name):
+        try:
+            return await self.delete_database(name)
+        except exceptions.CouchError as e:
+            if e.args[0]['error'] == 'not_found':
+                return
+            raise
+
+    async def list_databases(self):
+        databases = [d for d in await self._all_dbs() if not d.startswith('_')]
+        databases = [d.replace(self.database_prefix, '', 1) for d in databases if d.startswith(self.database_prefix)]
+        return databases
+
+
+class AsyncDatabase(Database):
+    def __init__(self, name, alias='default', server=None):
+        from .registry import get_async_server
+        self.name = name
+        self.server = server or get_async_server(alias)
+
+    async def get(self, url, **kwargs):
+        return await self.server.get(self._get_url(url), **kwargs)
+
+    async def info(self):
+        return await self.get('')
+
+    async def _get_result_token(self, cache):
+        from .invalidation import get_generation
+        from .invalidation import is_listened
+        if cache.freshness == 'changes' and is_listened(self):
+            return ('generation', get_generation(self))
+        return ('update_seq', (await self.info())['update_seq'])
+
+    async def _cached(self, method, url, **kwargs):
+        cache = self.server.result_cache
+        if cache is None:
+            return await method(url, **kwargs)
+        key = cache.make_key(self, url, kwargs)
+        token = await self._get_result_token(cache)
+        result = cache.get(self, key, token)
+        if result is None:
+            result = await method(url, **kwargs)
+            cache.set(self, key, token, result)
+        return result
+
+    async def head(self, url, **kwargs):
+        return await self.server.head(self._get_url(url), **kwargs)
+
+    async def conditional_get(self, url, etag=None, **kwargs):
+        return await self.server.conditional_get(self._get_url(url), etag=etag, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.server.post(self._get_url(url), **kwargs)
+
+    async def put(self, url, **kwargs):
+        return await self.server.put(self._get_url(url), **kwargs)
+
+    async def delete(self, url, **kwargs):
+        return await self.server.delete(self._get_url(url), **kwargs)
+
+    async def bulk_docs(self, docs, **options):
+        options['docs'] = docs
+        return await self.post('_bulk_docs', json=options)
+
+    async def all_docs(self, keys, include_docs=True):
+        params = dict(include_docs=json.dumps(include_docs))
+        return await self.post('_all_docs', params=params, json=dict(keys=keys))
+
+    def stream_rows(self, url, **kwargs):
+        return self.server.stream_rows(self._get_url(url), **kwargs)
+
+    def list_design_documents(self, stream=False):
+        url = '_all_docs?startkey="_design"&endkey="_design0"'
+        if stream:
+            return self.stream_rows(url)
+        return self.get(url)
+
+    def raw_view(self, document_name, view_name, stream=False, keys=None, **kwargs):
+        params = self._get_view_params(**kwargs)
+        url = self._get_view_url(document_name, view_name)
+        if keys is not None:
+            if stream:
+                return self.stream_rows(url, method='POST', params=params, json=dict(keys=keys))
+            return self._cached(self.post, url, params=params, json=dict(keys=keys))
+        if stream:
+            return self.stream_rows(url, params=params)
+        return self._cached(self.get, url, params=params)
+
+    def view(self, document_name, view_name='view', batch_size=100, document_class=None, prefetch=None, stream=False,
+             keys=None, **options):
+        check_prefetch(prefetch)
+        if keys is None:
+            rows = self._view(document_name, view_name, batch_size, document_class, stream, **options)
+        else:
+            rows = self._view_keys(document_name, view_name, keys, batch_size, document_class, stream, **options)
+        if prefetch:
+            return prefetch_batches(rows, batch_size, prefetch)
+        return rows
+
+    def _view(self, document_name, view_name, batch_size, document_class, stream, **options):
+        return self._paged_view(document_name, view_name, stream, partial(
+            ViewPager, self, batch_size, document_class, options,
+        ))
+
+    def _view_keys(self, document_name, view_name, keys, batch_size, document_class, stream, **options):
+        return self._paged_view(document_name, view_name, stream, partial(
+            ViewKeysPager, self, keys, batch_size, document_class, options,
+        ))
+
+    async def _paged_view(self, document_name, view_name, stream, get_pager):
+        pager = get_pager()
+        while True:
+            options = pager.get_options()
+            if options is None:
+                return
+            if stream:
+                rows = self.raw_view(document_name, view_name, stream=True, **options)
+            else:
+                rows = iterate((await self.raw_view(document_name, view_name, **options))['rows'])
+            try:
+                async for row in rows:
+                    item = pager.feed(row)
+                    if item is not SKIP:
+                        yield item
+                    if pager.done:
+                        return
+            finally:
+                await rows.aclose()
+
+    async def view_one(self, document_name, key, view_name='view', document_class=None, **kwargs):
+        kwargs['limit'] = 2
+        kwargs['startkey'] = key
+        kwargs['endkey'] = key
+        result = [row async for row in self.view(document_name, view_name=view_name, document_class=document_class, **kwargs)]
+        if len(result) == 0:
+            raise exceptions.ObjectDoesNotExist()
+        if len(result) > 1:
+            raise exceptions.MultipleObjectsReturned()
+        return result[0]
+
+    def find(self, batch_size=100, document_class=None, warning=True, prefetch=None, **kwargs):
+        check_prefetch(prefetch)
+        docs = self._find(batch_size, document_class, warning, **kwargs)
+        if prefetch:
+            return prefetch_batches(docs, batch_size, prefetch)
+        return docs
+
+    async def _find(self, batch_size, document_class, warning, **kwargs):
+        pager = FindPager(self, batch_size, document_class, warning, kwargs, asynchronous=True)
+        while True:
+            query = pager.get_query()
+            if query is None:
+                return
+            for doc in pager.get_docs(await self._cached(self.post, '_find', json=query)):
+                yield doc
+
+    async def find_one(self, document_class=None, warning=True, **kwargs):
+        kwargs['skip'] = 0
+        kwargs['limit'] = 2
+        result = [doc async for doc in self.find(batch_size=2, document_class=document_class, warning=warning, **kwargs)]
+        if len(result) == 0:
+            raise exceptions.ObjectDoesNotExist()
+        if len(result) > 1:
+            raise exceptions.MultipleObjectsReturned()
+        return result[0]
+
+    async def view_columns(self, document_name, fields, view_name='view', batch_size=100, document_class=None,
+                           use_numpy=None, stream=True, **options):
+        builder = ColumnBuilder(fields, document_class=document_class, use_numpy=use_numpy)
+        key = 'doc' if options.get('include_docs') else 'value'
+        async for row in self._view(document_name, view_name, batch_size, None, stream, **options):
+            builder.append(row[key])
+        return builder.finish()
+
+    async def find_columns(self, fields, batch_size=100, document_class=None, warning=True, use_numpy=None, **kwargs):
+        kwargs.setdefault('fields', list(fields))
+        builder = ColumnBuilder(fields, document_class=document_class, use_numpy=use_numpy)
+        async for doc in self._find(batch_size, None, warning, **kwargs):
+            builder.append(doc)
+        return builder.finish()
+
+    async def list_indexes(self, ddoc=None, name=None):
+        return self._filter_indexes(await self.get('_index'), ddoc=ddoc, name=name)
+
+    async def get_index(self, ddoc=None, name=None):
+        indexes = await self.list_indexes(ddoc=ddoc, name=name)
+        return indexes.get((ddoc, name))
+
+    async def create_index(self, ddoc, name, index):
+        index = self.normalize_index(index)
+        # check existing index
+        existing = (await self.list_indexes(ddoc=ddoc, name=name)).get((ddoc, name), None)
+        if existing:
+            if existing['def'] == index:
+                return dict(result='unchanged', ddoc=ddoc, name=name)
+        data = dict(index=index, ddoc=ddoc, name=name)
+        result = await self.post('_index', json=data)
+        result['ddoc'] = result.pop('id').replace('_design/', '', 1)
+        return result
+
+    async def delete_index(self, ddoc, name):
+        return await self.delete(self._get_index_url(ddoc, name))
+
+    def changes(self, since=None, feed='normal', include_docs=False, selector=None, batch_size=1000, heartbeat=None,
+                checkpoint=None, checkpoint_every=100, retry_delay=1, max_retries=DEFAULT_MAX_RETRIES,
+                yield_heartbeats=False, **options):
+        check_changes_options(feed, batch_size, checkpoint_every)
+        if checkpoint is not None:
+            checkpoint = AsyncCheckpoint(self, checkpoint)
+        return self._changes(ChangesFeed(
+            since, feed, include_docs, selector, batch_size, heartbeat, checkpoint,
+            checkpoint_every, retry_delay, max_retries, yield_heartbeats, options,
+        ))
+
+    async def _changes(self, feed):
+        checkpoint = feed.checkpoint
+        if checkpoint is not None:
+            feed.start(await checkpoint.load())
+        while True:
+            method, kwargs = feed.get_request()
+            try:
+                if feed.feed == 'continuous':
+                    lines = self.stream_lines('_changes', method=method, **kwargs)
+                    try:
+                        async for line in lines:
+                            row = feed.get_line(line)
+                            if row is not SKIP:
+                                yield row
+                                if row is not None and feed.processed(row):
+                                    await checkpoint.save(feed.since)
+                    finally:
+                        await lines.aclose()
+                    result = None
+                elif method == 'POST':
+                    result = await self.post('_changes', **kwargs)
+                else:
+                    result = await self.get('_changes', **kwargs)
+            except exceptions.CouchError as exception:
+                await asyncio.sleep(feed.get_retry_delay(exception))
+                continue
+            if result is not None:
+                for row in feed.get_results(result):
+                    yield row
+                    if feed.processed(row):
+                        await checkpoint.save(feed.since)
+                if feed.end_page(result):
+                    yield None
+            if feed.checkpoint_pending():
+                await checkpoint.save(feed.since)
+            if feed.finished(result):
+                return
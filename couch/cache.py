@@ -0,0 +1,198 @@
+import json
+import threading
+from collections import OrderedDict
+from urllib.parse import quote
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+
+class LRUCache(object):
+    def __init__(self, max_size):
+        if max_size < 1:
+            raise ValueError('max_size must be greater than 0')
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            # Most recently used entries are kept at the end.
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SizedLRUCache(object):
+    # LRU cache bounded by the total size of its values, e.g. in bytes.
+    def __init__(self, max_size):
+        if max_size < 1:
+            raise ValueError('max_size must be greater than 0')
+        self.max_size = max_size
+        self.size = 0
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key][0]
+
+    def set(self, key, value, size):
+        with self._lock:
+            self._pop(key)
+            # Values larger than the whole cache are not kept.
+            if size > self.max_size:
+                return
+            self._data[key] = (value, size)
+            self.size += size
+            while self.size > self.max_size:
+                self.size -= self._data.popitem(last=False)[1][1]
+
+    def _pop(self, key):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.size -= item[1]
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+
+class CacheStats(object):
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def hit(self):
+        self._count('hits')
+
+    def miss(self, stale=False):
+        # Stale entries are misses, counted separately as well.
+        self._count('misses')
+        if stale:
+            self._count('stale')
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        requests = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / requests if requests else 0.0
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = dict(hits=0, misses=0, stale=0)
+
+
+class DocumentCache(CacheStats):
+    # Serialized documents in a django cache, keyed by database and _id.
+    def __init__(self, alias='default', timeout=DEFAULT_TIMEOUT, max_size=None, validate=False, key_prefix='couch'):
+        self.alias = alias
+        self.timeout = timeout
+        # Larger documents, in serialized bytes, are not cached.
+        self.max_size = max_size
+        # Check the cached revision against the server with a HEAD request.
+        self.validate = validate
+        self.key_prefix = key_prefix
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def make_key(self, db, document_id):
+        return '{}:{}:{}'.format(self.key_prefix, db._get_database_name(), quote(document_id, safe=''))
+
+    def get(self, db, document_id):
+        value = self.cache.get(self.make_key(db, document_id))
+        if value is None:
+            return None
+        return db.server.codec.loads(value)
+
+    def set(self, db, data):
+        value = db.server.codec.dumps(data)
+        key = self.make_key(db, data['_id'])
+        if self.max_size is not None and len(value) > self.max_size:
+            self.cache.delete(key)
+        else:
+            self.cache.set(key, value, timeout=self.timeout)
+
+    def delete(self, db, document_id):
+        self.cache.delete(self.make_key(db, document_id))
+
+
+RESULT_CACHE_FRESHNESS = ('update_seq', 'changes')
+
+
+class ResultCache(CacheStats):
+    # Serialized view and Mango responses of a server, keyed by database,
+    # url and request options, bounded by their total size in bytes. Entries
+    # are tagged with the database update_seq, read with a GET /{db} before
+    # each request: any document change, design documents included, makes
+    # them stale. With freshness='changes' the generation counter of a
+    # running invalidation listener is used instead, saving that request at
+    # the cost of about a second of staleness.
+    def __init__(self, max_size=64 * 1024 * 1024, freshness='update_seq'):
+        if freshness not in RESULT_CACHE_FRESHNESS:
+            raise ValueError("freshness must be one of {}".format(', '.join(RESULT_CACHE_FRESHNESS)))
+        self.freshness = freshness
+        self.cache = SizedLRUCache(max_size)
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def make_key(self, db, url, options):
+        return (db._get_database_name(), url, json.dumps(options, sort_keys=True, default=str))
+
+    def get(self, db, key, token):
+        entry = self.cache.get(key)
+        if entry is not None and entry[0] == token:
+            self.hit()
+            # Callers get their own copy of the response.
+            return db.server.codec.loads(entry[1])
+        if entry is not None:
+            self.cache.delete(key)
+        self.miss(stale=entry is not None)
+        return None
+
+    def set(self, db, key, token, data):
+        value = db.server.codec.dumps(data)
+        self.cache.set(key, (token, value), len(value))
+
+    def clear(self):
+        self.cache.clear()
@@ -0,0 +1,115 @@
+import json
+from . import exceptions
+
+CHANGES_FEEDS = ('normal', 'longpoll', 'continuous')
+# Milliseconds between the newlines couchdb sends on idle live feeds.
+DEFAULT_HEARTBEAT = 10000
+# A connection silent for this many heartbeats is considered dead.
+HEARTBEAT_TIMEOUT_RATIO = 3
+MAX_RETRY_DELAY = 60
+# Reconnections in a row before giving up, None retries forever.
+DEFAULT_MAX_RETRIES = 5
+# Errors after which a feed reconnects from the last sequence seen.
+RECONNECT_ERRORS = (
+    'requests.exceptions.ConnectionError',
+    'requests.exceptions.Timeout',
+    'httpx.TransportError',
+    'stream_error',
+)
+
+
+def check_changes_options(feed, batch_size, checkpoint_every):
+    if feed not in CHANGES_FEEDS:
+        raise ValueError("feed must be one of {}".format(', '.join(CHANGES_FEEDS)))
+    if batch_size is not None and batch_size < 1:
+        raise ValueError('batch_size must be greater than 0')
+    if checkpoint_every < 1:
+        raise ValueError('checkpoint_every must be greater than 0')
+
+
+def get_changes_request(feed, since, batch_size, heartbeat, include_docs, selector, options):
+    # Returns method and request arguments for the _changes endpoint.
+    params = dict(feed=feed)
+    for name, value in options.items():
+        if isinstance(value, bool):
+            value = json.dumps(value)
+        params[name] = value
+    if include_docs:
+        params['include_docs'] = 'true'
+    if since is not None:
+        params['since'] = since
+    if batch_size is not None and not feed == 'continuous':
+        params['limit'] = batch_size
+    kwargs = dict(params=params)
+    if not feed == 'normal':
+        if heartbeat is None:
+            heartbeat = DEFAULT_HEARTBEAT
+        params['heartbeat'] = heartbeat
+        kwargs['timeout'] = heartbeat * HEARTBEAT_TIMEOUT_RATIO / 1000.0
+    if selector is not None:
+        params['filter'] = '_selector'
+        kwargs['json'] = dict(selector=selector)
+        return 'POST', kwargs
+    return 'GET', kwargs
+
+
+def get_retry_delay(retry_delay, retries):
+    # Exponential backoff, the first retry waits retry_delay seconds.
+    return min(retry_delay * 2 ** (retries - 1), MAX_RETRY_DELAY)
+
+
+def is_reconnect_error(exception, retries, max_retries):
+    if not exception.args or not isinstance(exception.args[0], dict):
+        return False
+    if exception.args[0].get('error') not in RECONNECT_ERRORS:
+        return False
+    return max_retries is None or retries <= max_retries
+
+
+class Checkpoint(object):
+    # Last sequence processed by a changes consumer, kept in a _local
+    # document: it is neither replicated nor part of the changes feed.
+    def __init__(self, db, name):
+        self.db = db
+        self.id = '_local/{}'.format(name)
+        self.rev = None
+        self.seq = None
+
+    def _loaded(self, data):
+        self.rev = data.get('_rev')
+        self.seq = data.get('last_seq')
+        return self.seq
+
+    def _saved(self, seq, result):
+        self.rev = result['rev']
+        self.seq = seq
+
+    def _get_data(self, seq):
+        data = dict(last_seq=seq)
+        if self.rev:
+            data['_rev'] = self.rev
+        return data
+
+    def load(self):
+        try:
+            return self._loaded(self.db.get(self.id))
+        except exceptions.CouchError as e:
+            if e.args[0]['error'] == 'not_found':
+                return None
+            raise
+
+    def save(self, seq):
+        self._saved(seq, self.db.put(self.id, json=self._get_data(seq)))
+
+
+class AsyncCheckpoint(Checkpoint):
+    async def load(self):
+        try:
+            return self._loaded(await self.db.get(self.id))
+        except exceptions.CouchError as e:
+            if e.args[0]['error'] == 'not_found':
+                return None
+            raise
+
+    async def save(self, seq):
+        self._saved(seq, await self.db.put(self.id, json=self._get_data(seq)))
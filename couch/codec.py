@@ -0,0 +1,57 @@
+import json
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+
+class JsonCodec(object):
+    def dumps(self, data):
+        return json.dumps(data).encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonCodec(object):
+    def __init__(self):
+        import orjson
+        self.orjson = orjson
+
+    def dumps(self, data):
+        return self.orjson.dumps(data)
+
+    def loads(self, data):
+        return self.orjson.loads(data)
+
+
+class UjsonCodec(object):
+    def __init__(self):
+        import ujson
+        self.ujson = ujson
+
+    def dumps(self, data):
+        return self.ujson.dumps(data).encode('utf-8')
+
+    def loads(self, data):
+        return self.ujson.loads(data)
+
+
+CODECS = dict(
+    json=JsonCodec,
+    orjson=OrjsonCodec,
+    ujson=UjsonCodec,
+)
+
+
+def get_codec(name):
+    # A codec turns python data into request body bytes and response body
+    # bytes back into python data, without going through str.
+    codec_class = CODECS.get(name)
+    if codec_class is None:
+        try:
+            codec_class = import_string(name)
+        except ImportError as e:
+            raise ImproperlyConfigured("Unknown JSON codec '{}': {}".format(name, e))
+    try:
+        return codec_class()
+    except ImportError as e:
+        raise ImproperlyConfigured("JSON codec '{}' is not available: {}".format(name, e))
@@ -0,0 +1,167 @@
+import array
+import datetime
+from collections import OrderedDict
+from . import fields as couch_fields
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+# Stored for missing dates and datetimes, it is numpy's NaT.
+NAT = -2 ** 63
+EPOCH = datetime.datetime(1970, 1, 1)
+EPOCH_DATE = EPOCH.date()
+
+
+class ObjectColumn(object):
+    def __init__(self, field=None):
+        self.field = field
+        self.values = []
+
+    def append(self, value):
+        if value is not None and self.field is not None:
+            value = self.field._to_python(value)
+        self.values.append(value)
+
+    def finish(self, use_numpy):
+        if use_numpy:
+            values = numpy.empty(len(self.values), dtype=object)
+            values[:] = self.values
+            return values
+        return self.values
+
+
+class TypedColumn(ObjectColumn):
+    # Values in an array.array of `typecode`, viewed as `dtype` with numpy.
+    typecode = None
+    dtype = None
+    # Stored for None, if None the column falls back to a list.
+    missing = None
+
+    def __init__(self, field=None):
+        self.field = field
+        self.values = array.array(self.typecode)
+        self.objects = None
+
+    def convert(self, value):
+        return value
+
+    def revert(self, value):
+        return value
+
+    def append(self, value):
+        if self.objects is None and value is None and self.missing is None:
+            self.objects = [self.revert(item) for item in self.values]
+            self.values = self.objects
+        if self.objects is not None:
+            super(TypedColumn, self).append(value)
+        elif value is None:
+            self.values.append(self.missing)
+        else:
+            self.values.append(self.convert(value))
+
+    def finish(self, use_numpy):
+        if self.objects is not None:
+            return super(TypedColumn, self).finish(use_numpy)
+        if use_numpy:
+            return numpy.frombuffer(self.values, dtype=self.values.typecode).astype(self.dtype)
+        return self.values
+
+
+class IntegerColumn(TypedColumn):
+    typecode = 'q'
+    dtype = 'int64'
+
+    def convert(self, value):
+        return int(value)
+
+
+class FloatColumn(TypedColumn):
+    typecode = 'd'
+    dtype = 'float64'
+    missing = float('nan')
+
+    def convert(self, value):
+        return float(value)
+
+
+class BooleanColumn(TypedColumn):
+    typecode = 'b'
+    dtype = 'bool'
+
+    def convert(self, value):
+        return bool(value)
+
+    def revert(self, value):
+        return bool(value)
+
+
+class DateTimeColumn(TypedColumn):
+    # Microseconds since the epoch, in utc.
+    typecode = 'q'
+    dtype = 'datetime64[us]'
+    missing = NAT
+
+    def convert(self, value):
+        value = couch_fields.parse_datetime(value)
+        if value.tzinfo:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        delta = value - EPOCH
+        return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+    def finish(self, use_numpy):
+        if self.objects is None and use_numpy:
+            return numpy.frombuffer(self.values, dtype='int64').view(self.dtype)
+        return super(DateTimeColumn, self).finish(use_numpy)
+
+
+class DateColumn(DateTimeColumn):
+    # Days since the epoch.
+    dtype = 'datetime64[D]'
+
+    def convert(self, value):
+        return (couch_fields.parse_date(value) - EPOCH_DATE).days
+
+
+COLUMN_CLASSES = (
+    (couch_fields.IntegerField, IntegerColumn),
+    (couch_fields.FloatField, FloatColumn),
+    (couch_fields.BooleanField, BooleanColumn),
+    (couch_fields.DateTimeField, DateTimeColumn),
+    (couch_fields.DateField, DateColumn),
+)
+
+
+def get_column(field):
+    for field_class, column_class in COLUMN_CLASSES:
+        if isinstance(field, field_class):
+            return column_class(field)
+    return ObjectColumn(field)
+
+
+class ColumnBuilder(object):
+    # Collects the `fields` of json documents into one column per field,
+    # typed after the fields of document_class.
+    def __init__(self, fields, document_class=None, use_numpy=None):
+        if use_numpy is None:
+            use_numpy = numpy is not None
+        if use_numpy and numpy is None:
+            raise ImportError('numpy is not installed.')
+        self.use_numpy = use_numpy
+        document_fields = getattr(document_class, '_fields', dict())
+        self.columns = OrderedDict((name, get_column(document_fields.get(name))) for name in fields)
+
+    def append(self, data):
+        for name, column in self.columns.items():
+            column.append(data.get(name))
+
+    def finish(self):
+        return OrderedDict((name, column.finish(self.use_numpy)) for name, column in self.columns.items())
+
+
+def to_columns(documents, fields, document_class=None, use_numpy=None):
+    builder = ColumnBuilder(fields, document_class=document_class, use_numpy=use_numpy)
+    for data in documents:
+        builder.append(data)
+    return builder.finish()
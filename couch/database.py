@@ -1,83 +1,509 @@
+import contextvars
 import json
+import threading
+import time
 import warnings
+from contextlib import closing
 from copy import deepcopy
+from functools import partial
+from queue import Empty
+from queue import Full
+from queue import Queue
 from . import exceptions
-from .server import Server
+from .changes import check_changes_options
+from .changes import Checkpoint
+from .changes import DEFAULT_MAX_RETRIES
+from .changes import get_changes_request
+from .changes import get_retry_delay
+from .changes import is_reconnect_error
+from .columns import ColumnBuilder
+from .identity import get_identity_map
+from .registry import get_server
+
+PREFETCH_POLL_INTERVAL = 0.1
+
+
+def chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def get_hydrator(document_class, db=None, loaded_fields=None, raw=False):
+    # Returns a function turning result data into documents, used for every
+    # row of a page. Documents are built by the class decoder, see
+    # documents.get_decoder, so fields are converted like in Manager.get.
+    decode = getattr(document_class, '_decode', None)
+    # Partial and raw documents never replace full ones in the identity map.
+    identity_map = None
+    if db is not None and loaded_fields is None and not raw:
+        identity_map = get_identity_map()
+
+    def hydrate(data):
+        if decode is None:
+            return document_class(**data)
+        document = decode(data, raw)
+        if loaded_fields is not None:
+            # Partial document, the other keys are fetched on first access.
+            document._loaded_fields = loaded_fields
+        if identity_map is not None and document._id:
+            return identity_map.add(db, document)
+        return document
+
+    return hydrate
+
+
+def to_document(document_class, data, db=None, loaded_fields=None, raw=False):
+    return get_hydrator(document_class, db, loaded_fields, raw)(data)
+
+
+class AsyncLoadedFields(frozenset):
+    # Loaded fields of partial documents from an AsyncDatabase, their other
+    # keys are loaded with Document.aload_deferred only.
+    pass
+
+
+def get_loaded_fields(document_class, options, asynchronous=False):
+    # Mango projection for documents: the keys needed to save them again
+    # are always requested.
+    fields = options.get('fields')
+    if not document_class or fields is None or not hasattr(document_class, '_meta'):
+        return None
+    fields = list(fields)
+    required = ['_id', '_rev']
+    if document_class._meta.document_type:
+        required.append('document_type')
+    for key in required:
+        if key not in fields:
+            fields.append(key)
+    options['fields'] = fields
+    if asynchronous:
+        return AsyncLoadedFields(fields)
+    return frozenset(fields)
+
+
+def check_prefetch(prefetch):
+    if prefetch is not None and prefetch < 1:
+        raise ValueError('prefetch must be greater than 0')
+
+
+def prefetch_batches(iterable, batch_size, prefetch):
+    # Consume iterable in a background thread, keeping at most `prefetch`
+    # batches ready while the caller processes the current one.
+    queue = Queue(maxsize=prefetch)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=PREFETCH_POLL_INTERVAL)
+                return True
+            except Full:
+                pass
+        return False
+
+    def worker():
+        try:
+            for batch in chunks(iterable, batch_size):
+                if not put((batch, None)):
+                    return
+            put((None, None))
+        except Exception as exception:
+            put((None, exception))
+        finally:
+            # Generators must be closed by the thread running them.
+            close = getattr(iterable, 'close', None)
+            if close:
+                close()
+
+    # The worker hydrates documents, it needs the caller identity map.
+    thread = threading.Thread(target=contextvars.copy_context().run, args=(worker,))
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            try:
+                batch, exception = queue.get(timeout=PREFETCH_POLL_INTERVAL)
+            except Empty:
+                if not thread.is_alive() and queue.empty():
+                    return  # pragma: no cover
+                continue
+            if exception is not None:
+                raise exception
+            if batch is None:
+                return
+            for item in batch:
+                yield item
+    finally:
+        # No new request is issued once the caller is gone, an in-flight one
+        # completes in the background and its rows are dropped.
+        stop.set()
+
+
+# Returned by the pagers for rows that are not yielded.
+SKIP = object()
+
+
+class ViewPager(object):
+    # Paging of Database.view and AsyncDatabase.view, their loops only send
+    # the requests.
+    def __init__(self, db, batch_size, document_class, options):
+        # Check sane batch size.
+        if batch_size < 1:
+            raise ValueError('batch_size must be greater than 0')
+        # Save caller's limit, it must be handled manually.
+        self.limit = options.get('limit')
+        if self.limit is not None and self.limit < 1:
+            raise ValueError('limit must be greater than 0')
+        self.db = db
+        self.batch_size = batch_size
+        self.document_class = document_class
+        self.options = options
+        self.done = False
+        self.count = None
+        self.next_row = None
+
+    def get_options(self):
+        # Options of the next request, None once there is nothing else to yield.
+        if self.count is not None:
+            # Decrement limit counter.
+            if self.limit is not None:
+                self.limit -= self.count
+            if self.next_row is None or self.limit == 0:
+                return None
+            # Update options with start keys for next loop.
+            self.options.update(startkey=self.next_row['key'], startkey_docid=self.next_row['id'], skip=0)
+        self.hydrate = None
+        if self.document_class:
+            self.hydrate = get_hydrator(self.document_class, self.db)
+        self.loop_limit = min(self.limit or self.batch_size, self.batch_size)
+        # Get rows in batches, with one extra for start of next batch.
+        self.options['limit'] = self.loop_limit + 1
+        self.count = 0
+        self.next_row = None
+        return self.options
+
+    def feed(self, row):
+        if self.count == self.loop_limit:
+            self.next_row = row
+            return SKIP
+        self.count += 1
+        if self.hydrate:
+            return self.hydrate(row['value'])
+        return row
+
+
+class ViewKeysPager(object):
+    # Keys are posted batch_size at a time, rows come in the order of the
+    # keys, one chunk after the other.
+    def __init__(self, db, keys, batch_size, document_class, options):
+        if batch_size < 1:
+            raise ValueError('batch_size must be greater than 0')
+        # Caller's limit and skip apply to the whole result.
+        self.limit = options.pop('limit', None)
+        if self.limit is not None and self.limit < 1:
+            raise ValueError('limit must be greater than 0')
+        self.skip = options.pop('skip', 0)
+        self.db = db
+        self.chunks = chunks(keys, batch_size)
+        self.document_class = document_class
+        self.options = options
+        self.done = False
+
+    def get_options(self):
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            return None
+        self.hydrate = None
+        if self.document_class:
+            self.hydrate = get_hydrator(self.document_class, self.db)
+        if self.limit is not None:
+            self.options['limit'] = self.skip + self.limit
+        return dict(self.options, keys=chunk)
+
+    def feed(self, row):
+        if self.skip:
+            self.skip -= 1
+            return SKIP
+        if self.limit is not None:
+            self.limit -= 1
+            self.done = self.limit == 0
+        if self.hydrate:
+            return self.hydrate(row['value'])
+        return row
+
+
+class FindPager(object):
+    # Paging of Database.find and AsyncDatabase.find.
+    def __init__(self, db, batch_size, document_class, warning, query, asynchronous=False):
+        # Check sane batch size.
+        if batch_size < 1:
+            raise ValueError('batch_size must be greater than 0')
+        # Save caller's limit, it must be handled manually.
+        self.limit = query.get('limit')
+        if self.limit is not None and self.limit < 1:
+            raise ValueError('limit must be greater than 0')
+        self.loaded_fields = get_loaded_fields(document_class, query, asynchronous)
+        self.db = db
+        self.batch_size = batch_size
+        self.document_class = document_class
+        self.warning = warning
+        self.query = query
+        self.done = False
+
+    def get_query(self):
+        if self.done:
+            return None
+        self.query['limit'] = min(self.limit or self.batch_size, self.batch_size)
+        return self.query
+
+    def get_docs(self, result):
+        # Docs of a result page, the query is updated for the next one.
+        if self.warning and 'warning' in result:
+            msg = '{} - Query: {}'.format(result['warning'], self.query)
+            warnings.warn(msg)
+            self.warning = False
+        docs = result['docs']
+        # Decrement limit counter.
+        if self.limit is not None:
+            self.limit -= min(len(docs), self.batch_size)
+        # Check if there is nothing else to yield.
+        if len(docs) < self.batch_size or self.limit == 0:
+            self.done = True
+        # Continue from the bookmark, the caller's skip was already applied.
+        elif 'bookmark' in result:
+            self.query['bookmark'] = result['bookmark']
+            self.query.pop('skip', None)
+        else:
+            self.query['skip'] = self.query.get('skip', 0) + len(docs)
+        if self.document_class:
+            return map(get_hydrator(self.document_class, self.db, self.loaded_fields), docs)
+        return docs
+
+
+class ChangesFeed(object):
+    # State of Database.changes and AsyncDatabase.changes: the sequence to
+    # resume from, retries and checkpoints.
+    def __init__(self, since, feed, include_docs, selector, batch_size, heartbeat, checkpoint,
+                 checkpoint_every, retry_delay, max_retries, yield_heartbeats, options):
+        self.since = since
+        self.feed = feed
+        self.include_docs = include_docs
+        self.selector = selector
+        self.batch_size = batch_size
+        self.heartbeat = heartbeat
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+        self.retry_delay = retry_delay
+        self.max_retries = max_retries
+        self.yield_heartbeats = yield_heartbeats
+        self.options = options
+        # Changes yielded since the last checkpoint, a change counts as
+        # processed once the caller asks for the next one.
+        self.count = 0
+        self.retries = 0
+
+    def start(self, seq):
+        if self.since is None:
+            self.since = seq
+
+    def get_request(self):
+        return get_changes_request(
+            self.feed, self.since, self.batch_size, self.heartbeat, self.include_docs, self.selector, self.options,
+        )
+
+    def get_retry_delay(self, exception):
+        # Resume from the last sequence seen.
+        self.retries += 1
+        if not is_reconnect_error(exception, self.retries, self.max_retries):
+            raise exception
+        return get_retry_delay(self.retry_delay, self.retries)
+
+    def get_line(self, line):
+        # Row to yield for a line of a continuous feed, None for heartbeats.
+        self.retries = 0
+        if line is None:
+            if self.yield_heartbeats:
+                return None
+        elif 'last_seq' in line:
+            self.since = line['last_seq']
+        else:
+            return line
+        return SKIP
+
+    def get_results(self, result):
+        self.retries = 0
+        return result['results']
+
+    def processed(self, row):
+        # True when the checkpoint is due.
+        self.since = row['seq']
+        self.count += 1
+        if self.checkpoint is not None and self.count >= self.checkpoint_every:
+            self.count = 0
+            return True
+        return False
+
+    def end_page(self, result):
+        # True when an empty page is yielded as heartbeat.
+        self.since = result['last_seq']
+        return self.yield_heartbeats and not result['results']
+
+    def checkpoint_pending(self):
+        if self.checkpoint is not None and not self.since == self.checkpoint.seq:
+            self.count = 0
+            return True
+        return False
+
+    def finished(self, result):
+        return self.feed == 'normal' and (self.batch_size is None or len(result['results']) < self.batch_size)
 
 
 class Database(object):
     def __init__(self, name, alias='default', server=None):
         self.name = name
-        self.server = server or Server(alias=alias)
+        self.server = server or get_server(alias)
 
     def _get_database_name(self):
         return self.server._get_database_name(self.name)
 
-    def get(self, url, **kwargs):
+    def _get_url(self, url):
         if url:
             url = '/{}'.format(url)
-        url = '/{}{}'.format(self._get_database_name(), url)
-        return self.server.get(url, **kwargs)
+        return '/{}{}'.format(self._get_database_name(), url)
+
+    def get(self, url, **kwargs):
+        return self.server.get(self._get_url(url), **kwargs)
+
+    def info(self):
+        return self.get('')
+
+    def head(self, url, **kwargs):
+        return self.server.head(self._get_url(url), **kwargs)
+
+    def conditional_get(self, url, etag=None, **kwargs):
+        return self.server.conditional_get(self._get_url(url), etag=etag, **kwargs)
 
     def post(self, url, **kwargs):
-        if url:
-            url = '/{}'.format(url)
-        url = '/{}{}'.format(self._get_database_name(), url)
-        return self.server.post(url, **kwargs)
+        return self.server.post(self._get_url(url), **kwargs)
 
     def put(self, url, **kwargs):
-        if url:
-            url = '/{}'.format(url)
-        url = '/{}{}'.format(self._get_database_name(), url)
-        return self.server.put(url, **kwargs)
+        return self.server.put(self._get_url(url), **kwargs)
 
     def delete(self, url, **kwargs):
-        if url:
-            url = '/{}'.format(url)
-        url = '/{}{}'.format(self._get_database_name(), url)
-        return self.server.delete(url, **kwargs)
+        return self.server.delete(self._get_url(url), **kwargs)
+
+    def bulk_docs(self, docs, **options):
+        options['docs'] = docs
+        return self.post('_bulk_docs', json=options)
+
+    def all_docs(self, keys, include_docs=True):
+        params = dict(include_docs=json.dumps(include_docs))
+        return self.post('_all_docs', params=params, json=dict(keys=keys))
+
+    def stream_rows(self, url, **kwargs):
+        return self.server.stream_rows(self._get_url(url), **kwargs)
+
+    def stream_lines(self, url, **kwargs):
+        return self.server.stream_lines(self._get_url(url), **kwargs)
+
+    def _get_result_token(self, cache):
+        from .invalidation import get_generation
+        from .invalidation import is_listened
+        if cache.freshness == 'changes' and is_listened(self):
+            return ('generation', get_generation(self))
+        return ('update_seq', self.info()['update_seq'])
 
-    def list_design_documents(self):
-        return self.get('_all_docs?startkey="_design"&endkey="_design0"')
+    def _cached(self, method, url, **kwargs):
+        # Identical queries are answered from the server result cache while
+        # the database is unchanged, see cache.ResultCache.
+        cache = self.server.result_cache
+        if cache is None:
+            return method(url, **kwargs)
+        key = cache.make_key(self, url, kwargs)
+        # Read before the query: a concurrent change leaves the entry stale.
+        token = self._get_result_token(cache)
+        result = cache.get(self, key, token)
+        if result is None:
+            result = method(url, **kwargs)
+            cache.set(self, key, token, result)
+        return result
+
+    def list_design_documents(self, stream=False):
+        url = '_all_docs?startkey="_design"&endkey="_design0"'
+        if stream:
+            return self.stream_rows(url)
+        return self.get(url)
 
-    def raw_view(self, document_name, view_name, **kwargs):
+    def _get_view_params(self, **kwargs):
         params = dict()
         for name, value in kwargs.items():
             if name in ('key', 'startkey', 'endkey', 'start_key', 'end_key'):
                 value = json.dumps(value)
             params[name] = value
-        url = '_design/{}/_view/{}'.format(document_name, view_name)
-        return self.get(url, params=params)
+        return params
 
-    def view(self, document_name, view_name='view', batch_size=100, document_class=None, **options):
-        # Check sane batch size.
-        if batch_size < 1:
-            raise ValueError('batch_size must be greater than 0')
-        # Save caller's limit, it must be handled manually.
-        limit = options.get('limit')
-        if limit is not None and limit < 1:
-            raise ValueError('limit must be greater than 0')
-        # Batch loop
+    def _get_view_url(self, document_name, view_name):
+        return '_design/{}/_view/{}'.format(document_name, view_name)
+
+    def raw_view(self, document_name, view_name, stream=False, keys=None, **kwargs):
+        params = self._get_view_params(**kwargs)
+        url = self._get_view_url(document_name, view_name)
+        if keys is not None:
+            # Keys are posted, the url length does not limit their number.
+            if stream:
+                return self.stream_rows(url, method='POST', params=params, json=dict(keys=keys))
+            return self._cached(self.post, url, params=params, json=dict(keys=keys))
+        if stream:
+            return self.stream_rows(url, params=params)
+        return self._cached(self.get, url, params=params)
+
+    def view(self, document_name, view_name='view', batch_size=100, document_class=None, prefetch=None, stream=False,
+             keys=None, **options):
+        check_prefetch(prefetch)
+        if keys is None:
+            rows = self._view(document_name, view_name, batch_size, document_class, stream, **options)
+        else:
+            rows = self._view_keys(document_name, view_name, keys, batch_size, document_class, stream, **options)
+        if prefetch:
+            return prefetch_batches(rows, batch_size, prefetch)
+        return rows
+
+    def _view(self, document_name, view_name, batch_size, document_class, stream, **options):
+        return self._paged_view(document_name, view_name, stream, partial(
+            ViewPager, self, batch_size, document_class, options,
+        ))
+
+    def _view_keys(self, document_name, view_name, keys, batch_size, document_class, stream, **options):
+        return self._paged_view(document_name, view_name, stream, partial(
+            ViewKeysPager, self, keys, batch_size, document_class, options,
+        ))
+
+    def _paged_view(self, document_name, view_name, stream, get_pager):
+        # Arguments are checked once iterated, by the pager.
+        pager = get_pager()
         while True:
-            loop_limit = min(limit or batch_size, batch_size)
-            # Get rows in batches, with one extra for start of next batch.
-            options['limit'] = loop_limit + 1
-            rows = self.raw_view(document_name, view_name, **options)['rows']
-            # Yield rows from this batch.
-            for row in rows[:loop_limit]:
-                if document_class:
-                    yield document_class(**row['value'])
-                else:
-                    yield row
-            # Decrement limit counter.
-            if limit is not None:
-                limit -= min(len(rows), batch_size)
-            # Check if there is nothing else to yield.
-            if len(rows) <= batch_size or (limit is not None and limit == 0):
-                break
-            # Update options with start keys for next loop.
-            options.update(startkey=rows[-1]['key'],
-                           startkey_docid=rows[-1]['id'], skip=0)
+            options = pager.get_options()
+            if options is None:
+                return
+            rows = self.raw_view(document_name, view_name, stream=stream, **options)
+            if not stream:
+                rows = rows['rows']
+            try:
+                for row in rows:
+                    item = pager.feed(row)
+                    if item is not SKIP:
+                        yield item
+                    if pager.done:
+                        return
+            finally:
+                if stream:
+                    rows.close()
 
     def view_one(self, document_name, key, view_name='view', document_class=None, **kwargs):
         kwargs['limit'] = 2
@@ -90,38 +516,21 @@ class Database(object):
             raise exceptions.MultipleObjectsReturned()
         return result[0]
 
-    def find(self, batch_size=100, document_class=None, warning=True, **kwargs):
-        kwargs['skip'] = kwargs.get('skip', 0)
-        # Check sane batch size.
-        if batch_size < 1:
-            raise ValueError('batch_size must be greater than 0')
-        # Save caller's limit, it must be handled manually.
-        limit = kwargs.get('limit')
-        if limit is not None and limit < 1:
-            raise ValueError('limit must be greater than 0')
-        # Batch loop
+    def find(self, batch_size=100, document_class=None, warning=True, prefetch=None, **kwargs):
+        check_prefetch(prefetch)
+        docs = self._find(batch_size, document_class, warning, **kwargs)
+        if prefetch:
+            return prefetch_batches(docs, batch_size, prefetch)
+        return docs
+
+    def _find(self, batch_size, document_class, warning, **kwargs):
+        pager = FindPager(self, batch_size, document_class, warning, kwargs)
         while True:
-            kwargs['limit'] = min(limit or batch_size, batch_size)
-            result = self.post('_find', json=kwargs)
-            if warning and 'warning' in result:
-                msg = '{} - Query: {}'.format(result['warning'], kwargs)
-                warnings.warn(msg)
-                warning = False
-            docs = result['docs']
-            # Yield rows from this batch.
-            for doc in docs:
-                if document_class:
-                    yield document_class(**doc)
-                else:
-                    yield doc
-            # Decrement limit counter.
-            if limit is not None:
-                limit -= min(len(docs), batch_size)
-            # Check if there is nothing else to yield.
-            if len(docs) < batch_size or (limit is not None and limit == 0):
-                break
-            # Update skip parameter
-            kwargs['skip'] += batch_size
+            query = pager.get_query()
+            if query is None:
+                return
+            for doc in pager.get_docs(self._cached(self.post, '_find', json=query)):
+                yield doc
 
     def find_one(self, document_class=None, warning=True, **kwargs):
         kwargs['skip'] = 0
@@ -133,6 +542,23 @@ class Database(object):
             raise exceptions.MultipleObjectsReturned()
         return result[0]
 
+    def view_columns(self, document_name, fields, view_name='view', batch_size=100, document_class=None,
+                     use_numpy=None, stream=True, **options):
+        # Row values, or docs with include_docs, go straight into columns.
+        builder = ColumnBuilder(fields, document_class=document_class, use_numpy=use_numpy)
+        key = 'doc' if options.get('include_docs') else 'value'
+        for row in self._view(document_name, view_name, batch_size, None, stream, **options):
+            builder.append(row[key])
+        return builder.finish()
+
+    def find_columns(self, fields, batch_size=100, document_class=None, warning=True, use_numpy=None, **kwargs):
+        # Only the needed fields are requested.
+        kwargs.setdefault('fields', list(fields))
+        builder = ColumnBuilder(fields, document_class=document_class, use_numpy=use_numpy)
+        for doc in self._find(batch_size, None, warning, **kwargs):
+            builder.append(doc)
+        return builder.finish()
+
     def normalize_index(self, index):
         if 'fields' in index:
             fields = []
@@ -144,9 +570,9 @@ class Database(object):
             index['fields'] = fields
         return index
 
-    def list_indexes(self, ddoc=None, name=None):
+    def _filter_indexes(self, data, ddoc=None, name=None):
         indexes = dict()
-        for index in self.get('_index')['indexes']:
+        for index in data['indexes']:
             if index['ddoc']:
                 index['ddoc'] = index['ddoc'].replace('_design/', '', 1)
             keep = True
@@ -158,6 +584,9 @@ class Database(object):
                 indexes[(index['ddoc'], index['name'])] = index
         return indexes
 
+    def list_indexes(self, ddoc=None, name=None):
+        return self._filter_indexes(self.get('_index'), ddoc=ddoc, name=name)
+
     def get_index(self, ddoc=None, name=None):
         indexes = self.list_indexes(ddoc=ddoc, name=name)
         return indexes.get((ddoc, name))
@@ -174,6 +603,57 @@ class Database(object):
         result['ddoc'] = result.pop('id').replace('_design/', '', 1)
         return result
 
+    def _get_index_url(self, ddoc, name):
+        return '_index/{ddoc}/json/{name}'.format(ddoc=ddoc, name=name)
+
     def delete_index(self, ddoc, name):
-        url = '_index/{ddoc}/json/{name}'.format(ddoc=ddoc, name=name)
-        return self.delete(url)
+        return self.delete(self._get_index_url(ddoc, name))
+
+    def changes(self, since=None, feed='normal', include_docs=False, selector=None, batch_size=1000, heartbeat=None,
+                checkpoint=None, checkpoint_every=100, retry_delay=1, max_retries=DEFAULT_MAX_RETRIES,
+                yield_heartbeats=False, **options):
+        # Yields the rows of the _changes feed. With a checkpoint name the
+        # last processed sequence is saved in a _local document and used as
+        # default for since, see changes.Checkpoint.
+        check_changes_options(feed, batch_size, checkpoint_every)
+        if checkpoint is not None:
+            checkpoint = Checkpoint(self, checkpoint)
+        return self._changes(ChangesFeed(
+            since, feed, include_docs, selector, batch_size, heartbeat, checkpoint,
+            checkpoint_every, retry_delay, max_retries, yield_heartbeats, options,
+        ))
+
+    def _changes(self, feed):
+        checkpoint = feed.checkpoint
+        if checkpoint is not None:
+            feed.start(checkpoint.load())
+        while True:
+            method, kwargs = feed.get_request()
+            try:
+                if feed.feed == 'continuous':
+                    with closing(self.stream_lines('_changes', method=method, **kwargs)) as lines:
+                        for line in lines:
+                            row = feed.get_line(line)
+                            if row is not SKIP:
+                                yield row
+                                if row is not None and feed.processed(row):
+                                    checkpoint.save(feed.since)
+                    result = None
+                elif method == 'POST':
+                    result = self.post('_changes', **kwargs)
+                else:
+                    result = self.get('_changes', **kwargs)
+            except exceptions.CouchError as exception:
+                time.sleep(feed.get_retry_delay(exception))
+                continue
+            if result is not None:
+                for row in feed.get_results(result):
+                    yield row
+                    if feed.processed(row):
+                        checkpoint.save(feed.since)
+                if feed.end_page(result):
+                    yield None
+            if feed.checkpoint_pending():
+                checkpoint.save(feed.since)
+            if feed.finished(result):
+                return
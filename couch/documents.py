@@ -1,8 +1,18 @@
 import json
+from collections import OrderedDict
 from copy import deepcopy
+from django.core.exceptions import ImproperlyConfigured
 from django.utils import six
 from . import exceptions
-from . import Server
+from .cache import DocumentCache
+from .cache import LRUCache
+from .database import AsyncLoadedFields
+from .database import chunks
+from .database import get_hydrator
+from .database import to_document
+from .identity import get_identity_map
+from .registry import get_async_database
+from .registry import registry
 from .fields import (
     Field,
     TextField,
@@ -16,6 +26,8 @@ from .fields import (
 )
 
 RESERVED_ATTRIBUTES = ['_fields', '_meta']
+# Snapshot values are compared as strings, keys must be sorted.
+snapshot_encode = json.JSONEncoder(sort_keys=True).encode
 
 
 class Options(object):
@@ -23,43 +35,369 @@ class Options(object):
         self.server_alias = getattr(meta, 'server_alias', 'default')
         self.database_name = getattr(meta, 'database_name', None)
         self.document_type = getattr(meta, 'document_type', None)
+        # Slotted instances without snapshot, for large result sets.
+        self.compact = getattr(meta, 'compact', False)
+        # Number of documents kept for conditional GETs, revalidated by ETag.
+        self.etag_cache_size = getattr(meta, 'etag_cache', None)
+        self.etag_cache = None
+        if self.etag_cache_size:
+            self.etag_cache = LRUCache(self.etag_cache_size)
+        # Django cache for serialized documents: True, a cache alias or a dict
+        # of DocumentCache arguments.
+        cache = getattr(meta, 'cache', None)
+        self.cache = None
+        if cache:
+            if cache is True:
+                cache = dict()
+            elif isinstance(cache, six.string_types):
+                cache = dict(alias=cache)
+            self.cache = DocumentCache(**cache)
         self.database = None
 
+    @property
+    def database(self):
+        return self._database
+
+    @database.setter
+    def database(self, database):
+        # Explicitly assigned databases are never replaced by the registry.
+        self._database = database
+        self._registry_generation = None
+
     def get_database(self):
-        if self.database:
-            return self.database
-        self.database = Server(alias=self.server_alias).get_database(self.database_name)
-        return self.database
+        if self._database:
+            if self._registry_generation is None or self._registry_generation == registry.generation:
+                return self._database
+        self._database = registry.get_database(self.database_name, alias=self.server_alias)
+        self._registry_generation = registry.generation
+        return self._database
+
+    def get_async_database(self):
+        return get_async_database(self.database_name, alias=self.server_alias)
+
+
+class FindQuery(object):
+    # Mango query of Manager.find and afind, sent when iterated.
+    def __init__(self, manager, args, kwargs, asynchronous=False):
+        self.manager = manager
+        self.args = args
+        self.kwargs = kwargs
+        self.asynchronous = asynchronous
+        self._iterator = None
+
+    def only(self, *fields):
+        # Partial documents with just these fields, see Document._load_deferred.
+        kwargs = dict(self.kwargs, fields=list(fields))
+        return FindQuery(self.manager, self.args, kwargs, asynchronous=self.asynchronous)
+
+    def _get_iterator(self):
+        if self._iterator is None:
+            meta = self.manager.document_class._meta
+            if self.asynchronous:
+                db = meta.get_async_database()
+            else:
+                db = meta.get_database()
+            kwargs = dict(self.kwargs, document_class=self.manager.document_class)
+            self._iterator = db.find(*self.args, **kwargs)
+        return self._iterator
+
+    def __iter__(self):
+        return iter(self._get_iterator())
+
+    def __next__(self):
+        return next(self._get_iterator())
+
+    def close(self):
+        if self._iterator is not None:
+            self._iterator.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self._get_iterator().__anext__()
+
+    async def aclose(self):
+        if self._iterator is not None:
+            await self._iterator.aclose()
 
 
 class Manager(object):
     def __init__(self, document_class):
         self.document_class = document_class
 
+    def _get_cached(self, db, document_id, raw):
+        # Returns the document of the identity map, if any, else the data of
+        # the document cache and whether its revision must be checked.
+        identity_map = None if raw else get_identity_map()
+        if identity_map is not None:
+            document = identity_map.get(db, self.document_class, document_id)
+            if document is not None:
+                return document, None, False
+        cache = self.document_class._meta.cache
+        if cache is None:
+            return None, None, False
+        data = cache.get(db, document_id)
+        return None, data, data is not None and cache.validate
+
+    def _check_cached(self, data, rev=None):
+        # Counts the cache lookup, data is dropped if rev shows it is stale.
+        cache = self.document_class._meta.cache
+        if cache is None:
+            return data
+        stale = data is not None and rev is not None and not data['_rev'] == rev
+        if data is None or stale:
+            cache.miss(stale=stale)
+            return None
+        cache.hit()
+        return data
+
+    def _set_cached(self, db, data):
+        cache = self.document_class._meta.cache
+        if cache is not None:
+            cache.set(db, data)
+
+    def _delete_cached(self, db, document_id):
+        self.document_class._meta.cache.delete(db, document_id)
+
+    def _not_found(self, exception):
+        if exception.args[0]['error'] == 'not_found':
+            return exceptions.ObjectDoesNotExist()
+        return exception  # pragma: no cover
+
+    def _get_etag_key(self, db, document_id):
+        return (db._get_database_name(), document_id)
+
+    def _from_etag_cache(self, cache, key, cached_data, result):
+        etag, data = result
+        if data is None:
+            # Not modified, documents get their own copy of the cached body.
+            return deepcopy(cached_data)
+        if etag:
+            cache.set(key, (etag, deepcopy(data)))
+        return data
+
+    def _get_etag(self, headers):
+        return headers['ETag'].strip('"')
+
     def get(self, document_id, raw=False):
+        db = self.document_class._meta.get_database()
+        document, data, validate = self._get_cached(db, document_id, raw)
+        if document is not None:
+            return document
+        rev = None
+        if validate:
+            try:
+                rev = self.get_rev(document_id)
+            except exceptions.ObjectDoesNotExist:
+                self._delete_cached(db, document_id)
+                raise
+        data = self._check_cached(data, rev)
+        if data is None:
+            data = self._fetch(db, document_id)
+            self._set_cached(db, data)
+        return to_document(self.document_class, data, db, raw=raw)
+
+    def _fetch(self, db, document_id):
+        cache = self.document_class._meta.etag_cache
+        try:
+            if cache is None:
+                return db.get(document_id)
+            key = self._get_etag_key(db, document_id)
+            etag, data = cache.get(key, (None, None))
+            try:
+                return self._from_etag_cache(cache, key, data, db.conditional_get(document_id, etag=etag))
+            except exceptions.CouchError:
+                cache.delete(key)
+                raise
+        except exceptions.CouchError as e:
+            raise self._not_found(e)
+
+    def get_rev(self, document_id):
         db = self.document_class._meta.get_database()
         try:
-            data = db.get(document_id)
+            return self._get_etag(db.head(document_id))
         except exceptions.CouchError as e:
-            if e.args[0]['error'] == 'not_found':
-                raise exceptions.ObjectDoesNotExist()
-            raise  # pragma: no cover
-        document = self.document_class()
-        if raw:
-            setattr(document, '_raw', deepcopy(data))
-        if 'document_type' in data:
-            if not data['document_type'] == document.document_type:
-                msg = "Type mismatch error: document_type '{}' expected, got '{}'".format(
-                    document.document_type, data['document_type']
-                )
-                raise exceptions.CouchError(msg)
-            self.document_type = data.pop('document_type')
-        for key, value in data.items():
-            if key in document._fields:
-                setattr(document, key, document._fields[key]._to_python(value))
+            raise self._not_found(e)
+
+    async def aget(self, document_id, raw=False):
+        db = self.document_class._meta.get_async_database()
+        document, data, validate = self._get_cached(db, document_id, raw)
+        if document is not None:
+            return document
+        rev = None
+        if validate:
+            try:
+                rev = await self.aget_rev(document_id)
+            except exceptions.ObjectDoesNotExist:
+                self._delete_cached(db, document_id)
+                raise
+        data = self._check_cached(data, rev)
+        if data is None:
+            data = await self._afetch(db, document_id)
+            self._set_cached(db, data)
+        return to_document(self.document_class, data, db, raw=raw)
+
+    async def _afetch(self, db, document_id):
+        cache = self.document_class._meta.etag_cache
+        try:
+            if cache is None:
+                return await db.get(document_id)
+            key = self._get_etag_key(db, document_id)
+            etag, data = cache.get(key, (None, None))
+            try:
+                return self._from_etag_cache(cache, key, data, await db.conditional_get(document_id, etag=etag))
+            except exceptions.CouchError:
+                cache.delete(key)
+                raise
+        except exceptions.CouchError as e:
+            raise self._not_found(e)
+
+    async def aget_rev(self, document_id):
+        db = self.document_class._meta.get_async_database()
+        try:
+            return self._get_etag(await db.head(document_id))
+        except exceptions.CouchError as e:
+            raise self._not_found(e)
+
+    def _add_rows(self, db, documents, rows):
+        hydrate = get_hydrator(self.document_class, db)
+        for row in rows:
+            # Missing ids come back with an error, deleted ones with a null doc.
+            if row.get('doc') is None:
+                documents[row['key']] = None
             else:
-                setattr(document, key, value)
-        return document
+                documents[row['key']] = hydrate(row['doc'])
+
+    def get_many(self, document_ids, batch_size=100):
+        batches = self._get_batches(document_ids, batch_size)
+        db = self.document_class._meta.get_database()
+        documents = OrderedDict()
+        for batch in batches:
+            self._add_rows(db, documents, db.all_docs(batch)['rows'])
+        return documents
+
+    def in_bulk(self, document_ids, batch_size=100):
+        documents = self.get_many(document_ids, batch_size=batch_size)
+        return OrderedDict((key, value) for key, value in documents.items() if value is not None)
+
+    async def aget_many(self, document_ids, batch_size=100):
+        batches = self._get_batches(document_ids, batch_size)
+        db = self.document_class._meta.get_async_database()
+        documents = OrderedDict()
+        for batch in batches:
+            self._add_rows(db, documents, (await db.all_docs(batch))['rows'])
+        return documents
+
+    def _bulk_result(self, document, row, result):
+        if 'error' in row:
+            if row['error'] == 'conflict':
+                return exceptions.RevisionMismatch(row)
+            return exceptions.CouchError(row)
+        document._id = row['id']
+        document._rev = row['rev']
+        return result
+
+    def _get_bulk_delete_data(self, document):
+        return dict(_id=document._id, _rev=document._rev, _deleted=True)
+
+    def _get_partial(self, documents):
+        return [document for document in documents if document._loaded_fields is not None]
+
+    def _merge_rows(self, documents, rows):
+        # Returns the errors of the documents that could not be completed,
+        # by document id(): they are reported in place of a save result.
+        errors = dict()
+        for document, row in zip(documents, rows):
+            try:
+                if row.get('doc') is None:
+                    raise exceptions.ObjectDoesNotExist(dict(error='not_found', id=document._id))
+                document._merge_deferred(row['doc'])
+            except (exceptions.ObjectDoesNotExist, exceptions.RevisionMismatch) as exception:
+                errors[id(document)] = exception
+        return errors
+
+    def _bulk_save_results(self, db, batch, errors, data, rows):
+        results = []
+        saved = iter(zip(data, rows))
+        for document in batch:
+            if id(document) in errors:
+                results.append(errors[id(document)])
+                continue
+            document_data, row = next(saved)
+            result = self._bulk_result(document, row, 'saved')
+            if result == 'saved':
+                document._take_snapshot(document_data)
+                document._after_save(db, document_data)
+            results.append(result)
+        return results
+
+    def _get_batches(self, documents, batch_size):
+        if batch_size < 1:
+            raise ValueError('batch_size must be greater than 0')
+        return chunks(documents, batch_size)
+
+    def _get_ids(self, documents):
+        return [document._id for document in documents]
+
+    def _get_bulk_save_data(self, batch, errors):
+        return [document._get_data() for document in batch if id(document) not in errors]
+
+    def _bulk_delete_results(self, db, batch, rows):
+        results = []
+        for document, row in zip(batch, rows):
+            result = self._bulk_result(document, row, 'deleted')
+            if result == 'deleted':
+                document._after_delete(db)
+            results.append(result)
+        return results
+
+    def bulk_save(self, documents, batch_size=100):
+        batches = self._get_batches(documents, batch_size)
+        db = self.document_class._meta.get_database()
+        results = []
+        for batch in batches:
+            # Partial documents are completed with one request per batch.
+            partial = self._get_partial(batch)
+            errors = dict()
+            if partial:
+                errors = self._merge_rows(partial, db.all_docs(self._get_ids(partial))['rows'])
+            data = self._get_bulk_save_data(batch, errors)
+            rows = db.bulk_docs(data) if data else []
+            results.extend(self._bulk_save_results(db, batch, errors, data, rows))
+        return results
+
+    def bulk_delete(self, documents, batch_size=100):
+        batches = self._get_batches(documents, batch_size)
+        db = self.document_class._meta.get_database()
+        results = []
+        for batch in batches:
+            rows = db.bulk_docs([self._get_bulk_delete_data(document) for document in batch])
+            results.extend(self._bulk_delete_results(db, batch, rows))
+        return results
+
+    async def abulk_save(self, documents, batch_size=100):
+        batches = self._get_batches(documents, batch_size)
+        db = self.document_class._meta.get_async_database()
+        results = []
+        for batch in batches:
+            partial = self._get_partial(batch)
+            errors = dict()
+            if partial:
+                errors = self._merge_rows(partial, (await db.all_docs(self._get_ids(partial)))['rows'])
+            data = self._get_bulk_save_data(batch, errors)
+            rows = (await db.bulk_docs(data)) if data else []
+            results.extend(self._bulk_save_results(db, batch, errors, data, rows))
+        return results
+
+    async def abulk_delete(self, documents, batch_size=100):
+        batches = self._get_batches(documents, batch_size)
+        db = self.document_class._meta.get_async_database()
+        results = []
+        for batch in batches:
+            rows = await db.bulk_docs([self._get_bulk_delete_data(document) for document in batch])
+            results.extend(self._bulk_delete_results(db, batch, rows))
+        return results
 
     def view(self, *args, **kwargs):
         db = self.document_class._meta.get_database()
@@ -67,15 +405,386 @@ class Manager(object):
         return db.view(*args, **kwargs)
 
     def find(self, *args, **kwargs):
-        db = self.document_class._meta.get_database()
-        kwargs['document_class'] = self.document_class
-        return db.find(*args, **kwargs)
+        return FindQuery(self, args, kwargs)
 
     def find_one(self, *args, **kwargs):
         db = self.document_class._meta.get_database()
         kwargs['document_class'] = self.document_class
         return db.find_one(*args, **kwargs)
 
+    def view_columns(self, *args, **kwargs):
+        db = self.document_class._meta.get_database()
+        kwargs['document_class'] = self.document_class
+        return db.view_columns(*args, **kwargs)
+
+    def find_columns(self, *args, **kwargs):
+        db = self.document_class._meta.get_database()
+        kwargs['document_class'] = self.document_class
+        return db.find_columns(*args, **kwargs)
+
+    def aview(self, *args, **kwargs):
+        db = self.document_class._meta.get_async_database()
+        kwargs['document_class'] = self.document_class
+        return db.view(*args, **kwargs)
+
+    def afind(self, *args, **kwargs):
+        return FindQuery(self, args, kwargs, asynchronous=True)
+
+    async def afind_one(self, *args, **kwargs):
+        db = self.document_class._meta.get_async_database()
+        kwargs['document_class'] = self.document_class
+        return await db.find_one(*args, **kwargs)
+
+    async def aview_columns(self, *args, **kwargs):
+        db = self.document_class._meta.get_async_database()
+        kwargs['document_class'] = self.document_class
+        return await db.view_columns(*args, **kwargs)
+
+    async def afind_columns(self, *args, **kwargs):
+        db = self.document_class._meta.get_async_database()
+        kwargs['document_class'] = self.document_class
+        return await db.find_columns(*args, **kwargs)
+
+
+class FieldDescriptor(object):
+    def __init__(self, name, field):
+        self.name = name
+        self.field = field
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self.field.default
+        try:
+            return instance.__dict__[self.name]
+        except KeyError:
+            pass
+        lazy = instance.__dict__.get('_lazy')
+        if lazy and self.name in lazy:
+            value = lazy.pop(self.name)
+            instance._snapshot_pending[self.name] = value
+            instance.__dict__[self.name] = self.field._to_python(value)
+            return instance.__dict__[self.name]
+        if self._deferred(instance):
+            instance._load_deferred()
+            return self.__get__(instance, owner)
+        return self.field.default
+
+    def __set__(self, instance, value):
+        self._loaded(instance)
+        instance.__dict__[self.name] = value
+
+    def __delete__(self, instance):
+        if self.name not in instance.__dict__ and self._deferred(instance):
+            instance._load_deferred()
+        loaded = self._loaded(instance)
+        if self.name in instance.__dict__:
+            del instance.__dict__[self.name]
+        elif not loaded:
+            raise AttributeError(self.name)
+
+    def _loaded(self, instance):
+        # A raw value replaced before being read still belongs to the snapshot.
+        lazy = instance.__dict__.get('_lazy')
+        if lazy and self.name in lazy:
+            instance._snapshot_pending[self.name] = lazy.pop(self.name)
+            return True
+        return False
+
+    def _deferred(self, instance):
+        loaded_fields = instance.__dict__.get('_loaded_fields')
+        return loaded_fields is not None and self.name not in loaded_fields
+
+
+class CompactFieldDescriptor(object):
+    # Field value in the `slot` member, raw until first access while `bit`
+    # is set in the instance _lazy_mask.
+    def __init__(self, name, field, slot, bit):
+        self.name = name
+        self.field = field
+        self.slot = slot
+        self.bit = bit
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self.field.default
+        try:
+            value = self.slot.__get__(instance, owner)
+        except AttributeError:
+            if self._deferred(instance):
+                instance._load_deferred()
+                return self.__get__(instance, owner)
+            return self.field.default
+        if instance._lazy_mask & self.bit:
+            value = self.field._to_python(value)
+            self.slot.__set__(instance, value)
+            instance._lazy_mask &= ~self.bit
+        return value
+
+    def __set__(self, instance, value):
+        instance._lazy_mask &= ~self.bit
+        self.slot.__set__(instance, value)
+
+    def __delete__(self, instance):
+        if self._deferred(instance):
+            instance._load_deferred()
+        instance._lazy_mask &= ~self.bit
+        try:
+            self.slot.__delete__(instance)
+        except AttributeError:
+            raise AttributeError(self.name)
+
+    def _deferred(self, instance):
+        loaded_fields = instance._loaded_fields
+        if loaded_fields is None or self.name in loaded_fields:
+            return False
+        try:
+            self.slot.__get__(instance)
+        except AttributeError:
+            return True
+        return False
+
+
+COMPACT_SLOTS = ('_id', '_rev', 'document_type', '_snapshot', '_lazy_mask', '_extra', '_raw', '_loaded_fields')
+
+
+class CompactDocumentMixin(object):
+    # Fields and the attributes above live in slots, any other attribute in
+    # the _extra dict. Compact documents have no snapshot: is_dirty() is
+    # always true and save(only_if_changed=True) compares with the server.
+    __slots__ = ()
+    _lazy = frozenset()
+
+    def __init__(self, **kwargs):
+        self._id = None
+        self._rev = None
+        self._snapshot = None
+        self._lazy_mask = 0
+        self._extra = None
+        self._loaded_fields = None
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+        self._set_document_type()
+
+    def __getattr__(self, name):
+        extra = object.__getattribute__(self, '_extra')
+        if extra and name in extra:
+            return extra[name]
+        if not name[0] == '_' and object.__getattribute__(self, '_loaded_fields') is not None:
+            self._load_deferred()
+            return getattr(self, name)
+        raise AttributeError("'{}' object has no attribute '{}'".format(self.__class__.__name__, name))
+
+    def __setattr__(self, name, value):
+        try:
+            object.__setattr__(self, name, value)
+        except AttributeError:
+            if self._extra is None:
+                self._extra = dict()
+            self._extra[name] = value
+
+    def __delattr__(self, name):
+        try:
+            object.__delattr__(self, name)
+        except AttributeError:
+            if not self._extra or name not in self._extra:
+                raise
+            del self._extra[name]
+
+    def _take_snapshot(self, data=None):
+        pass
+
+    def _set_deferred(self, key, value):
+        if key in self._fields:
+            descriptor = self.__class__.__dict__[key]
+            try:
+                descriptor.slot.__get__(self)
+            except AttributeError:
+                descriptor.slot.__set__(self, value)
+                self._lazy_mask |= descriptor.bit
+        elif key not in COMPACT_SLOTS and not (self._extra and key in self._extra):
+            if self._extra is None:
+                self._extra = dict()
+            self._extra[key] = value
+
+
+def get_compact_encoder(document_class):
+    fields = []
+    for name, field in document_class._fields.items():
+        descriptor = document_class.__dict__[name]
+        fields.append((name, descriptor.slot.__get__, descriptor.bit, field.to_json, field.to_python))
+    document_type = document_class._meta.document_type
+
+    def encode(document, include_lazy=True):
+        data = dict()
+        lazy_mask = document._lazy_mask
+        for name, get, bit, to_json, to_python in fields:
+            try:
+                value = get(document)
+            except AttributeError:
+                continue
+            if value is not None:
+                if lazy_mask & bit:
+                    if not include_lazy:
+                        continue
+                    value = to_python(value)
+                value = to_json(value)
+            data[name] = value
+        if document._extra:
+            for key, value in document._extra.items():
+                if not key[0] == '_':
+                    data[key] = value
+        if document._id:
+            data['_id'] = document._id
+        if document._rev:
+            data['_rev'] = document._rev
+        if document_type:
+            document.document_type = document_type
+            data['document_type'] = document_type
+        else:
+            value = getattr(document, 'document_type', None)
+            if value is not None:
+                data['document_type'] = value
+        return data
+
+    return encode
+
+
+def get_compact_decoder(document_class):
+    slots = dict()
+    for name in document_class._fields:
+        descriptor = document_class.__dict__[name]
+        slots[name] = (descriptor.slot.__set__, descriptor.bit)
+    document_type = document_class._meta.document_type
+    custom_init = not document_class.__init__ is CompactDocumentMixin.__init__
+    set_attribute = object.__setattr__
+
+    def decode(data, raw=False):
+        if document_type and 'document_type' in data:
+            if not data['document_type'] == document_type:
+                msg = "Type mismatch error: document_type '{}' expected, got '{}'".format(
+                    document_type, data['document_type']
+                )
+                raise exceptions.CouchError(msg)
+        if custom_init:
+            document = document_class()
+        else:
+            document = object.__new__(document_class)
+        set_attribute(document, '_id', None)
+        set_attribute(document, '_rev', None)
+        set_attribute(document, '_snapshot', None)
+        set_attribute(document, '_extra', None)
+        set_attribute(document, '_loaded_fields', None)
+        lazy_mask = 0
+        extra = None
+        for key, value in data.items():
+            slot = slots.get(key)
+            if slot is not None:
+                slot[0](document, value)
+                lazy_mask |= slot[1]
+            elif key in COMPACT_SLOTS:
+                set_attribute(document, key, value)
+            else:
+                if extra is None:
+                    extra = dict()
+                extra[key] = value
+        set_attribute(document, '_lazy_mask', lazy_mask)
+        set_attribute(document, '_extra', extra)
+        if document_type:
+            set_attribute(document, 'document_type', document_type)
+        if raw:
+            set_attribute(document, '_raw', deepcopy(data))
+        return document
+
+    return decode
+
+
+def get_encoder(document_class):
+    # Builds document_class._get_data, converters are looked up once here.
+    if document_class._meta.compact:
+        return get_compact_encoder(document_class)
+    to_json = dict()
+    to_python = dict()
+    for name, field in document_class._fields.items():
+        to_json[name] = field.to_json
+        to_python[name] = field.to_python
+    document_type = document_class._meta.document_type
+
+    def encode(document, include_lazy=True):
+        data = dict()
+        state = document.__dict__
+        for key, value in state.items():
+            if key in to_json:
+                data[key] = None if value is None else to_json[key](value)
+            elif not key[0] == '_':
+                data[key] = value
+        if include_lazy and state['_lazy']:
+            # Never accessed fields, converted back and forth for the same output.
+            for key, value in state['_lazy'].items():
+                data[key] = None if value is None else to_json[key](to_python[key](value))
+        if state['_id']:
+            data['_id'] = state['_id']
+        if state['_rev']:
+            data['_rev'] = state['_rev']
+        if document_type:
+            state['document_type'] = document_type
+            data['document_type'] = document_type
+        return data
+
+    return encode
+
+
+def get_decoder(document_class):
+    # Builds document_class._decode, used by database.get_hydrator. Field
+    # values are left raw, see FieldDescriptor, and the snapshot of the other
+    # values is taken here.
+    if document_class._meta.compact:
+        return get_compact_decoder(document_class)
+    fields = document_class._fields
+    document_type = document_class._meta.document_type
+    snapshot_type = snapshot_encode(document_type)
+    # Classes with their own __init__ are built the regular way.
+    custom_init = not document_class.__init__ is Document.__init__
+
+    def decode(data, raw=False):
+        if document_type and 'document_type' in data:
+            if not data['document_type'] == document_type:
+                msg = "Type mismatch error: document_type '{}' expected, got '{}'".format(
+                    document_type, data['document_type']
+                )
+                raise exceptions.CouchError(msg)
+        if custom_init:
+            document = document_class()
+        else:
+            document = document_class.__new__(document_class)
+        state = document.__dict__
+        state['_id'] = None
+        state['_rev'] = None
+        lazy = dict()
+        snapshot = dict()
+        for key, value in data.items():
+            if key in fields:
+                # Loaded values win over the ones set by a custom __init__.
+                state.pop(key, None)
+                lazy[key] = value
+            else:
+                state[key] = value
+                if not key[0] == '_' or key == '_id':
+                    snapshot[key] = snapshot_encode(value)
+        if document_type:
+            state['document_type'] = document_type
+            snapshot['document_type'] = snapshot_type
+        if not state['_id']:
+            snapshot.pop('_id', None)
+        state['_lazy'] = lazy
+        state['_snapshot'] = snapshot
+        state['_snapshot_pending'] = dict()
+        state['_loaded_fields'] = None
+        if raw:
+            state['_raw'] = deepcopy(data)
+        return document
+
+    return decode
+
 
 class DocumentBase(type):
     def __new__(cls, name, bases, attrs):
@@ -85,30 +794,65 @@ class DocumentBase(type):
         parents = [b for b in bases if isinstance(b, DocumentBase)]
         if not parents:
             return super_new(cls, name, bases, attrs)
-        bases = bases + (dict,)
+        attr_meta = attrs.pop('Meta', None)
+        field_names = [key for key, value in attrs.items() if isinstance(value, Field)]
+        compact_parents = [b for b in parents if getattr(b, '_meta', None) and b._meta.compact]
+        compact = getattr(attr_meta, 'compact', bool(compact_parents))
+        if compact_parents and not compact:
+            # Slotted layouts cannot be combined with dict based ones.
+            raise ImproperlyConfigured(
+                "Document '{}' cannot disable compact, it inherits from compact document '{}'.".format(
+                    name, compact_parents[0].__name__))
         # Create the class.
         module = attrs.pop('__module__')
         new_attrs = {'__module__': module}
+        if compact:
+            slots = tuple('_field_{}'.format(key) for key in field_names)
+            if not compact_parents:
+                bases = (CompactDocumentMixin,) + bases
+                slots = COMPACT_SLOTS + slots
+            new_attrs['__slots__'] = slots
+        else:
+            bases = bases + (dict,)
         classcell = attrs.pop('__classcell__', None)
         # It will be needed for python 3.6
         if classcell is not None:  # pragma: no cover
             new_attrs['__classcell__'] = classcell
         new_class = super_new(cls, name, bases, new_attrs)
-        attr_meta = attrs.pop('Meta', None)
         if not attr_meta:
             meta = getattr(new_class, 'Meta', None)
         else:
             meta = attr_meta
-        # Fields
+        # Meta
+        new_class.add_to_class('_meta', Options(meta))
+        new_class._meta.compact = compact
+        # Fields, inherited ones first with the descriptors of the parents:
+        # their slots and lazy bits are shared by the subclass.
         fields = dict()
-        for name in list(attrs.keys()):
-            if isinstance(attrs[name], Field):
-                field = attrs.pop(name)
+        for parent in reversed(parents):
+            for name, field in getattr(parent, '_fields', dict()).items():
+                if name in field_names:
+                    continue
                 fields[name] = field
-                new_class.add_to_class(name, field.default)
+                if compact:
+                    new_class.add_to_class(name, parent.__dict__[name])
+                else:
+                    new_class.add_to_class(name, FieldDescriptor(name, field))
+        inherited_mask = 0
+        for name in fields:
+            if compact:
+                inherited_mask |= new_class.__dict__[name].bit
+        bit = inherited_mask.bit_length()
+        for name in field_names:
+            field = attrs.pop(name)
+            fields[name] = field
+            if compact:
+                slot = new_class.__dict__['_field_{}'.format(name)]
+                new_class.add_to_class(name, CompactFieldDescriptor(name, field, slot, 1 << bit))
+                bit += 1
+            else:
+                new_class.add_to_class(name, FieldDescriptor(name, field))
         new_class.add_to_class('_fields', fields)
-        # Meta
-        new_class.add_to_class('_meta', Options(meta))
         # Manager
         manager = Manager(new_class)
         new_class.add_to_class('objects', manager)
@@ -118,6 +862,9 @@ class DocumentBase(type):
         # Add all attributes to the class.
         for obj_name, obj in attrs.items():
             new_class.add_to_class(obj_name, obj)
+        # Serializers
+        new_class.add_to_class('_get_data', get_encoder(new_class))
+        new_class.add_to_class('_decode', staticmethod(get_decoder(new_class)))
         return new_class
 
     def add_to_class(cls, name, val):
@@ -125,12 +872,25 @@ class DocumentBase(type):
 
 
 class Document(six.with_metaclass(DocumentBase)):
+    # Subclasses get an instance __dict__ unless they are compact.
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super(Document, self).__init__()
         self._id = None
         self._rev = None
+        self._snapshot = None
+        # Raw json values of fields not converted yet.
+        self._lazy = dict()
+        # Raw json values of converted fields, not in the snapshot yet.
+        self._snapshot_pending = dict()
+        # Keys loaded by a projection, None for full documents.
+        self._loaded_fields = None
         for key, value in kwargs.items():
             setattr(self, key, value)
+        self._set_document_type()
+
+    def _set_document_type(self):
         if self._meta.document_type:
             if getattr(self, 'document_type', None):
                 if not self.document_type == self._meta.document_type:
@@ -141,6 +901,13 @@ class Document(six.with_metaclass(DocumentBase)):
             else:
                 self.document_type = self._meta.document_type
 
+    def __getattr__(self, name):
+        # Keys left out by a projection are fetched on first access.
+        if not name[0] == '_' and self.__dict__.get('_loaded_fields') is not None:
+            self._load_deferred()
+            return getattr(self, name)
+        raise AttributeError("'{}' object has no attribute '{}'".format(self.__class__.__name__, name))
+
     def __str__(self):
         if self._id:
             return '{} {}'.format(self.__class__.__name__, self._id)
@@ -152,65 +919,198 @@ class Document(six.with_metaclass(DocumentBase)):
     def __bool__(self):
         return bool(self._id)
 
-    def _get_data(self):
-        data = dict()
-        for key, value in self.__dict__.items():
-            if key in self._fields:
-                data[key] = self._fields[key]._to_json(getattr(self, key))
-            else:
-                if not key.startswith('_'):
-                    data[key] = value
-        if self._id:
-            data['_id'] = self._id
-        if self._rev:
-            data['_rev'] = self._rev
-        if self._meta.document_type:
-            self.document_type = self._meta.document_type
-            data['document_type'] = self.document_type
-        return data
+    def __copy__(self):
+        # Raw values are popped on first read: copies get their own dicts.
+        document = self.__class__.__new__(self.__class__)
+        state = document.__dict__
+        state.update(self.__dict__)
+        state['_lazy'] = dict(self._lazy)
+        state['_snapshot_pending'] = dict(self._snapshot_pending)
+        if self._snapshot is not None:
+            state['_snapshot'] = dict(self._snapshot)
+        return document
+
+    def _get_snapshot(self, data):
+        # Serialized values are compact and immune to in place changes of
+        # mutable field values. Fields never converted are unchanged.
+        return dict(
+            (key, snapshot_encode(value))
+            for key, value in data.items()
+            if not key == '_rev' and key not in self._lazy
+        )
+
+    def _take_snapshot(self, data=None):
+        if data is None:
+            data = self._get_data(include_lazy=False)
+        elif self._id:
+            data = dict(data, _id=self._id)
+        self._snapshot = self._get_snapshot(data)
+        self._snapshot_pending = dict()
+
+    def _get_loaded_snapshot(self):
+        if self._snapshot is None:
+            return None
+        for key, value in self._snapshot_pending.items():
+            field = self._fields[key]
+            self._snapshot[key] = snapshot_encode(field._to_json(field._to_python(value)))
+        self._snapshot_pending = dict()
+        return self._snapshot
+
+    def changed_fields(self):
+        snapshot = self._get_loaded_snapshot() or dict()
+        current = self._get_snapshot(self._get_data(include_lazy=False))
+        keys = set(snapshot) | set(current)
+        return sorted(key for key in keys if not snapshot.get(key) == current.get(key))
+
+    def is_dirty(self):
+        if self._snapshot is None:
+            return True
+        return not self._get_snapshot(self._get_data(include_lazy=False)) == self._get_loaded_snapshot()
+
+    def _has_changed(self, data, prev_data):
+        if '_rev' not in data:
+            prev_data.pop('_rev', None)
+        return not data == prev_data
+
+    def _after_save(self, db, data):
+        identity_map = get_identity_map()
+        if identity_map is not None:
+            identity_map.set(db, self)
+        if self._meta.cache is not None:
+            self._meta.cache.set(db, dict(data, _id=self._id, _rev=self._rev))
+
+    def _after_delete(self, db):
+        identity_map = get_identity_map()
+        if identity_map is not None:
+            identity_map.remove(db, self._id)
+        if self._meta.cache is not None:
+            self._meta.cache.delete(db, self._id)
+
+    def _load_deferred(self):
+        if isinstance(self._loaded_fields, AsyncLoadedFields):
+            # A blocking request would stall the event loop.
+            msg = "Partial document '{}' loaded asynchronously, call 'await document.aload_deferred()' first".format(self._id)
+            raise exceptions.CouchError(msg)
+        db = self._meta.get_database()
+        self._merge_deferred(self.objects._fetch(db, self._id))
+
+    async def aload_deferred(self):
+        if self._loaded_fields is None:
+            return
+        db = self._meta.get_async_database()
+        self._merge_deferred(await self.objects._afetch(db, self._id))
+
+    def _merge_deferred(self, data):
+        # Completes a partial document, values set meanwhile are kept.
+        if not data.get('_rev') == self._rev:
+            raise exceptions.RevisionMismatch(dict(
+                error='conflict', reason='Document changed since it was partially loaded.', id=self._id,
+            ))
+        loaded_fields = self._loaded_fields
+        self._loaded_fields = None
+        for key, value in data.items():
+            if key not in loaded_fields:
+                self._set_deferred(key, value)
+
+    def _set_deferred(self, key, value):
+        state = self.__dict__
+        if key in state:
+            return
+        if key in self._fields:
+            self._lazy[key] = value
+        else:
+            state[key] = value
+            if self._snapshot is not None and not key[0] == '_':
+                self._snapshot[key] = snapshot_encode(value)
+
+    def _revision_mismatch(self, exception):
+        new_exception = exceptions.RevisionMismatch()
+        new_exception.args = exception.args
+        return new_exception
+
+    def _needs_save(self, data, only_if_changed):
+        # None when only the server copy tells whether the document changed.
+        if not only_if_changed or not self._id:
+            return True
+        if self._snapshot is None:
+            return None
+        return not self._get_snapshot(data) == self._get_loaded_snapshot()
+
+    def _is_conflict(self, exception):
+        return exception.args[0]['error'] == 'conflict'
+
+    def _saved(self, db, data, result):
+        if result is None:
+            self._take_snapshot(data)
+            return 'unchanged'
+        self._id = result['id']
+        self._rev = result['rev']
+        self._take_snapshot(data)
+        self._after_save(db, data)
+        return 'saved'
+
+    def _get_delete_url(self):
+        return '{}?rev={}'.format(self._id, self._rev)
 
     def save(self, revision_mismatch_override=False, only_if_changed=False):
         db = self._meta.get_database()
+        if self._loaded_fields is not None:
+            self._load_deferred()
         data = self._get_data()
-        save = True
-        if only_if_changed and self._id:
+        save = self._needs_save(data, only_if_changed)
+        if save is None:
             try:
-                prev_data = self.objects.get(self._id, raw=True)._raw
-                if '_rev' not in data:
-                    prev_data.pop('_rev', None)
-                if data == prev_data:
-                    save = False
+                save = self._has_changed(data, self.objects.get(self._id, raw=True)._raw)
             except exceptions.ObjectDoesNotExist:
-                pass
-        if save:
+                save = True
+        if not save:
+            return self._saved(db, data, None)
+        try:
+            result = db.post('', json=data)
+        except exceptions.CouchError as exception:
+            if not self._is_conflict(exception):
+                raise
+            if not revision_mismatch_override:
+                raise self._revision_mismatch(exception)
+            # read previous revision
+            self._rev = db.get(self._id)['_rev']
+            return self.save()
+        return self._saved(db, data, result)
+
+    async def asave(self, revision_mismatch_override=False, only_if_changed=False):
+        db = self._meta.get_async_database()
+        if self._loaded_fields is not None:
+            await self.aload_deferred()
+        data = self._get_data()
+        save = self._needs_save(data, only_if_changed)
+        if save is None:
             try:
-                result = db.post(
-                    '',
-                    data=json.dumps(data),
-                    headers={'Content-Type': 'application/json'},
-                )
-            except exceptions.CouchError as exception:
-                error = exception.args[0]['error']
-                if error == 'conflict':
-                    if revision_mismatch_override:
-                        # read previous revision
-                        data = db.get(self._id)
-                        self._rev = data['_rev']
-                        return self.save()
-                    else:
-                        new_exception = exceptions.RevisionMismatch()
-                        new_exception.args = exception.args
-                        raise new_exception
+                save = self._has_changed(data, (await self.objects.aget(self._id, raw=True))._raw)
+            except exceptions.ObjectDoesNotExist:
+                save = True
+        if not save:
+            return self._saved(db, data, None)
+        try:
+            result = await db.post('', json=data)
+        except exceptions.CouchError as exception:
+            if not self._is_conflict(exception):
                 raise
-            self._id = result['id']
-            self._rev = result['rev']
-            return 'saved'
-        return 'unchanged'
+            if not revision_mismatch_override:
+                raise self._revision_mismatch(exception)
+            # read previous revision
+            self._rev = (await db.get(self._id))['_rev']
+            return await self.asave()
+        return self._saved(db, data, result)
 
     def delete(self):
         db = self._meta.get_database()
-        url = '{}?rev={}'.format(self._id, self._rev)
-        db.delete(url)
+        db.delete(self._get_delete_url())
+        self._after_delete(db)
+
+    async def adelete(self):
+        db = self._meta.get_async_database()
+        await db.delete(self._get_delete_url())
+        self._after_delete(db)
 
 
 class DesignDocument(Document):
@@ -220,3 +1120,7 @@ class DesignDocument(Document):
     def save(self, **kwargs):
         kwargs['only_if_changed'] = True
         return super(DesignDocument, self).save(**kwargs)
+
+    async def asave(self, **kwargs):
+        kwargs['only_if_changed'] = True
+        return await super(DesignDocument, self).asave(**kwargs)
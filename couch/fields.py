@@ -1,3 +1,4 @@
+import datetime
 import pytz
 from decimal import Decimal
 from dateutil.parser import parse
@@ -5,6 +6,23 @@ from django.utils.timezone import get_current_timezone
 from . import exceptions
 
 
+def parse_date(value):
+    # Strict ISO 8601 first, as written by to_json, dateutil for anything else.
+    try:
+        return datetime.date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return parse(value).date()
+
+
+def parse_datetime(value):
+    try:
+        if value.endswith('Z'):
+            value = '{}+00:00'.format(value[:-1])
+        return datetime.datetime.fromisoformat(value)
+    except (AttributeError, TypeError, ValueError):
+        return parse(value)
+
+
 class Field(object):
     def __init__(self, default=None):
         self.default = default
@@ -64,7 +82,7 @@ class BooleanField(Field):
 
 class DateField(Field):
     def to_python(self, value):
-        return parse(value).date()
+        return parse_date(value)
 
     def to_json(self, value):
         return value.isoformat()
@@ -72,7 +90,7 @@ class DateField(Field):
 
 class DateTimeField(Field):
     def to_python(self, value):
-        value = parse(value)
+        value = parse_datetime(value)
         if not value.tzinfo:
             value = pytz.utc.normalize(pytz.utc.localize(value))
         tz = get_current_timezone()
@@ -0,0 +1,70 @@
+import contextvars
+import threading
+from contextlib import contextmanager
+
+_identity_map = contextvars.ContextVar('couch_identity_map', default=None)
+
+
+class IdentityMap(object):
+    # One instance per database and _id, within a request or a task.
+    def __init__(self):
+        self._documents = dict()
+        # Shared with the prefetch threads of the iterators.
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def _get_key(self, db, document_id):
+        return (db.server.alias, db._get_database_name(), document_id)
+
+    def get(self, db, document_class, document_id):
+        key = self._get_key(db, document_id)
+        with self._lock:
+            document = self._documents.get(key)
+        if isinstance(document, document_class):
+            return document
+        return None
+
+    def add(self, db, document):
+        # Returns the instance already in the map, if any, else registers document.
+        key = self._get_key(db, document._id)
+        with self._lock:
+            existing = self._documents.get(key)
+            if isinstance(existing, document.__class__):
+                return existing
+            self._documents[key] = document
+            return document
+
+    def set(self, db, document):
+        key = self._get_key(db, document._id)
+        with self._lock:
+            self._documents[key] = document
+
+    def remove(self, db, document_id):
+        key = self._get_key(db, document_id)
+        with self._lock:
+            self._documents.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+
+
+def get_identity_map():
+    return _identity_map.get()
+
+
+@contextmanager
+def identity_map():
+    # Nested blocks share the outer map, it is dropped when the outer one exits.
+    current = _identity_map.get()
+    if current is not None:
+        yield current
+        return
+    token = _identity_map.set(IdentityMap())
+    try:
+        yield _identity_map.get()
+    finally:
+        _identity_map.get().clear()
+        _identity_map.reset(token)
@@ -0,0 +1,187 @@
+import os
+import threading
+from django.conf import settings
+from django.dispatch import receiver
+from django.dispatch import Signal
+from . import documents
+from . import exceptions
+from .changes import get_retry_delay
+from .changes import is_reconnect_error
+from .registry import registry
+
+# Sent for every row of the changes feed followed by a listener, with the
+# db and the change row as arguments.
+document_changed = Signal()
+# Milliseconds between heartbeats, the longest a stop request waits.
+LISTENER_HEARTBEAT = 1000
+# Seconds before the first reconnection attempt of a failed feed.
+LISTENER_RETRY_DELAY = 1
+
+_generations = dict()
+_generations_lock = threading.Lock()
+_listeners = []
+_listeners_lock = threading.Lock()
+# Generation keys of the databases with a running listener.
+_listened = set()
+
+
+def _get_generation_key(db):
+    return (db.server.alias, db._get_database_name())
+
+
+def get_generation(db):
+    # Bumped on every change seen by a listener: values derived from the
+    # database and stored with the generation are stale once it differs.
+    return _generations.get(_get_generation_key(db), 0)
+
+
+def is_listened(db):
+    return _get_generation_key(db) in _listened
+
+
+def bump_generation(db):
+    key = _get_generation_key(db)
+    with _generations_lock:
+        _generations[key] = _generations.get(key, 0) + 1
+        return _generations[key]
+
+
+def get_document_classes(db, base=documents.Document):
+    # Document classes stored in db, subclasses included.
+    for document_class in base.__subclasses__():
+        meta = getattr(document_class, '_meta', None)
+        if meta and meta.database_name and meta.server_alias == db.server.alias:
+            if db.server._get_database_name(meta.database_name) == db._get_database_name():
+                yield document_class
+        for subclass in get_document_classes(db, document_class):
+            yield subclass
+
+
+@receiver(document_changed)
+def evict_documents(sender, db, change, **kwargs):
+    # Cached documents are kept only if they have the changed revision.
+    document_id = change['id']
+    revs = [row['rev'] for row in change.get('changes', [])]
+    if change.get('deleted'):
+        revs = []
+    for document_class in set(get_document_classes(db)):
+        meta = document_class._meta
+        if meta.etag_cache is not None:
+            key = (db._get_database_name(), document_id)
+            etag, data = meta.etag_cache.get(key, (None, None))
+            if data is not None and data.get('_rev') not in revs:
+                meta.etag_cache.delete(key)
+        if meta.cache is not None:
+            data = meta.cache.get(db, document_id)
+            if data is not None and data.get('_rev') not in revs:
+                meta.cache.delete(db, document_id)
+
+
+def invalidate(db, change):
+    bump_generation(db)
+    document_changed.send(sender=db.__class__, db=db, change=change)
+
+
+class ChangesListener(threading.Thread):
+    # Follows the continuous changes feed of a database from now on and
+    # invalidates the cached data of every changed document.
+    def __init__(self, name, alias='default', heartbeat=LISTENER_HEARTBEAT):
+        super(ChangesListener, self).__init__(name='couch-changes-{}-{}'.format(alias, name))
+        self.daemon = True
+        self.database_name = name
+        self.alias = alias
+        self.heartbeat = heartbeat
+        self._stop_event = threading.Event()
+
+    def run(self):
+        db = registry.get_database(self.database_name, alias=self.alias)
+        key = _get_generation_key(db)
+        since = 'now'
+        retries = 0
+        try:
+            while not self._stop_event.is_set():
+                # Heartbeats wake the loop up to check for stop requests.
+                changes = db.changes(since=since, feed='continuous', heartbeat=self.heartbeat,
+                                     yield_heartbeats=True, max_retries=0)
+                try:
+                    for change in changes:
+                        if self._stop_event.is_set():
+                            return
+                        retries = 0
+                        if change is None:
+                            # The feed is established, its generation can be relied on.
+                            _listened.add(key)
+                        else:
+                            invalidate(db, change)
+                            since = change['seq']
+                    # Continuous feeds end only once closed.
+                    return
+                except exceptions.CouchError as exception:
+                    if not is_reconnect_error(exception, 0, None):
+                        raise
+                    # Reconnecting from the last change seen, meanwhile
+                    # generation based values are revalidated.
+                    _listened.discard(key)
+                    bump_generation(db)
+                    retries += 1
+                    self._stop_event.wait(get_retry_delay(LISTENER_RETRY_DELAY, retries))
+                finally:
+                    changes.close()
+        finally:
+            _listened.discard(key)
+            # Changes are not seen anymore, generation based values get stale.
+            bump_generation(db)
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        self.join(timeout)
+
+
+def get_listened_databases():
+    # COUCH_SERVERS[alias]['INVALIDATION'] is True for the databases of the
+    # couchschema modules or a list of database names.
+    from .utils import collect_schema
+    from .utils import merge_schema
+    databases = []
+    schema = None
+    for alias, config in settings.COUCH_SERVERS.items():
+        names = config.get('INVALIDATION')
+        if names is True:
+            if schema is None:
+                schema = merge_schema(collect_schema())
+            names = sorted(schema.get(alias, dict()))
+        for name in names or []:
+            databases.append((alias, name))
+    return databases
+
+
+def _reset_listeners():
+    # Threads do not survive a fork: the workers of pre-fork servers start
+    # their own listeners.
+    global _listeners_lock
+    _listeners_lock = threading.Lock()
+    del _listeners[:]
+    _listened.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_listeners)
+
+
+def start_listeners():
+    with _listeners_lock:
+        if _listeners:
+            return list(_listeners)
+        for alias, name in get_listened_databases():
+            listener = ChangesListener(name, alias=alias)
+            listener.start()
+            _listeners.append(listener)
+        return list(_listeners)
+
+
+def stop_listeners(timeout=None):
+    with _listeners_lock:
+        listeners = list(_listeners)
+        del _listeners[:]
+    for listener in listeners:
+        listener.stop(timeout)
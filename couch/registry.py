@@ -0,0 +1,115 @@
+import asyncio
+import threading
+import weakref
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from .server import Server
+
+
+class Registry(object):
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._servers = dict()
+        self._databases = dict()
+        # Async clients are bound to the event loop they were created in.
+        self._async_servers = weakref.WeakKeyDictionary()
+        # Bumped on every clear, lets holders of cached handles detect staleness.
+        self.generation = 0
+
+    def _get_server_key(self, alias):
+        config = settings.COUCH_SERVERS[alias]
+        return (alias, config.get('DATABASE_PREFIX', ''))
+
+    def get_server(self, alias='default'):
+        key = self._get_server_key(alias)
+        with self._lock:
+            server = self._servers.get(key)
+            if server is None:
+                server = Server(alias=alias)
+                self._servers[key] = server
+            return server
+
+    def get_database(self, name, alias='default'):
+        from .database import Database
+        key = self._get_server_key(alias) + (name,)
+        with self._lock:
+            database = self._databases.get(key)
+            if database is None:
+                database = Database(name, server=self.get_server(alias))
+                self._databases[key] = database
+            return database
+
+    def get_async_server(self, alias='default'):
+        from .aio import AsyncServer
+        key = self._get_server_key(alias)
+        # Only from coroutines: a client bound to a loop that is not running
+        # would be unusable.
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            servers = self._async_servers.setdefault(loop, dict())
+            server = servers.get(key)
+            if server is None:
+                server = AsyncServer(alias=alias)
+                servers[key] = server
+            return server
+
+    def get_async_database(self, name, alias='default'):
+        from .aio import AsyncDatabase
+        return AsyncDatabase(name, server=self.get_async_server(alias))
+
+    def clear(self):
+        with self._lock:
+            servers = list(self._servers.values())
+            async_servers = [
+                (loop, server)
+                for loop, loop_servers in self._async_servers.items()
+                for server in loop_servers.values()
+            ]
+            self._servers = dict()
+            self._databases = dict()
+            self._async_servers = weakref.WeakKeyDictionary()
+            self.generation += 1
+        for server in servers:
+            server.close()
+        for loop, server in async_servers:
+            self._close_async_server(loop, server)
+
+    def _close_async_server(self, loop, server):
+        # Clients must be closed in their own loop.
+        if loop.is_closed():
+            return
+        if loop.is_running():
+            asyncio.run_coroutine_threadsafe(server.aclose(), loop)
+            return
+        coroutine = server.aclose()
+        try:
+            loop.run_until_complete(coroutine)
+        except RuntimeError:
+            # Another loop is running in this thread.
+            coroutine.close()
+
+
+registry = Registry()
+
+
+def get_server(alias='default'):
+    return registry.get_server(alias=alias)
+
+
+def get_database(name, alias='default'):
+    return registry.get_database(name, alias=alias)
+
+
+def get_async_server(alias='default'):
+    return registry.get_async_server(alias=alias)
+
+
+def get_async_database(name, alias='default'):
+    return registry.get_async_database(name, alias=alias)
+
+
+@receiver(setting_changed)
+def clear_registry(setting, **kwargs):
+    if setting == 'COUCH_SERVERS':
+        registry.clear()
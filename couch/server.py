@@ -1,14 +1,36 @@
-import json
+import threading
+import time
 import requests
+import requests.adapters
 from functools import wraps
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from . import exceptions
+from .cache import ResultCache
+from .codec import get_codec
+from .streaming import RowParser
 
 STATUS_CODES_2XX = (200, 201)
+AUTHENTICATION_METHODS = ('basic', 'cookie')
+# Fraction of the couchdb session timeout after which we log in again.
+SESSION_REFRESH_RATIO = 0.9
+STREAM_CHUNK_SIZE = 64 * 1024
+# Error names for responses without a body to read them from.
+STATUS_CODE_ERRORS = {
+    401: 'unauthorized',
+    403: 'forbidden',
+    404: 'not_found',
+    412: 'precondition_failed',
+}
 
 
 class Server(object):
-    def __init__(self, alias='default', protocol=None, host=None, port=None, username=None, password=None, database_prefix=None):
+    # Name of the session argument taking a raw request body.
+    body_argument = 'data'
+
+    def __init__(self, alias='default', protocol=None, host=None, port=None, username=None, password=None, database_prefix=None,
+                 pool_connections=None, pool_maxsize=None, pool_block=None, authentication=None, session_timeout=None,
+                 json_codec=None, result_cache=None):
         config = settings.COUCH_SERVERS[alias]
         self.alias = alias
         self.protocol = config.get('PROTOCOL', 'http')
@@ -17,6 +39,14 @@ class Server(object):
         self.username = config.get('USERNAME', None)
         self.password = config.get('PASSWORD', None)
         self.database_prefix = config.get('DATABASE_PREFIX', '')
+        self.pool_connections = config.get('POOL_CONNECTIONS', requests.adapters.DEFAULT_POOLSIZE)
+        self.pool_maxsize = config.get('POOL_MAXSIZE', requests.adapters.DEFAULT_POOLSIZE)
+        self.pool_block = config.get('POOL_BLOCK', requests.adapters.DEFAULT_POOLBLOCK)
+        self.authentication = config.get('AUTHENTICATION', 'basic')
+        self.session_timeout = config.get('SESSION_TIMEOUT', 600)
+        self.json_codec = config.get('JSON_CODEC', 'json')
+        # Opt-in cache of view and Mango results: True or ResultCache arguments.
+        self.result_cache = config.get('RESULT_CACHE', None)
         if protocol is not None:
             self.protocol = protocol
         if host is not None:
@@ -29,18 +59,90 @@ class Server(object):
             self.password = password
         if database_prefix is not None:
             self.database_prefix = database_prefix
+        if pool_connections is not None:
+            self.pool_connections = pool_connections
+        if pool_maxsize is not None:
+            self.pool_maxsize = pool_maxsize
+        if pool_block is not None:
+            self.pool_block = pool_block
+        if authentication is not None:
+            self.authentication = authentication
+        if session_timeout is not None:
+            self.session_timeout = session_timeout
+        if json_codec is not None:
+            self.json_codec = json_codec
+        if result_cache is not None:
+            self.result_cache = result_cache
+        if self.result_cache is True:
+            self.result_cache = ResultCache()
+        elif isinstance(self.result_cache, dict):
+            self.result_cache = ResultCache(**self.result_cache)
+        elif not self.result_cache:
+            self.result_cache = None
+        self.codec = get_codec(self.json_codec)
+        if self.authentication not in AUTHENTICATION_METHODS:
+            raise ImproperlyConfigured("Unknown couch authentication '{}'.".format(self.authentication))
         if self.username and self.password:
             self.auth = (self.username, self.password)
         else:
             self.auth = None
+            self.authentication = 'basic'
+        self._session_lock = threading.RLock()
+        self._session_started = None
         self.url = '{protocol}://{host}:{port}'.format(protocol=self.protocol, host=self.host, port=self.port)
+        self.session = self._create_session()
+
+    def _create_session(self):
+        # One keep-alive connection pool per server, shared by every request.
+        session = requests.Session()
+        if self.authentication == 'basic':
+            session.auth = self.auth
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def close(self):
+        self.session.close()
 
     def _check_response(self, response, acceptable_status_codes):
         if not response.status_code in acceptable_status_codes:
-            result = response.json()
+            result = self.codec.loads(response.content)
             result['status_code'] = response.status_code
             raise exceptions.CouchError(result)
-        return json.loads(response.text)
+        return self.codec.loads(response.content)
+
+    def _check_head_response(self, response, acceptable_status_codes):
+        if not response.status_code in acceptable_status_codes:
+            error = STATUS_CODE_ERRORS.get(response.status_code, 'unknown_error')
+            raise exceptions.CouchError(dict(error=error, status_code=response.status_code))
+        return response.headers
+
+    def _set_if_none_match(self, kwargs, etag):
+        if etag:
+            headers = dict(kwargs.get('headers') or dict())
+            headers['If-None-Match'] = etag
+            kwargs['headers'] = headers
+        return kwargs
+
+    def _check_conditional_response(self, response, etag, acceptable_status_codes):
+        # Returns (etag, data), data is None if the resource still matches etag.
+        if response.status_code == 304:
+            return etag, None
+        return response.headers.get('ETag'), self._check_response(response, acceptable_status_codes)
+
+    def _encode_body(self, kwargs):
+        # Serialize json= bodies with the configured codec.
+        if 'json' in kwargs:
+            kwargs[self.body_argument] = self.codec.dumps(kwargs.pop('json'))
+            headers = dict(kwargs.get('headers') or dict())
+            headers.setdefault('Content-Type', 'application/json')
+            kwargs['headers'] = headers
+        return kwargs
 
     def check_connection_error(f):
         @wraps(f)
@@ -50,31 +152,124 @@ class Server(object):
             except requests.exceptions.ConnectionError as exception:
                 data = dict(error='requests.exceptions.ConnectionError', reason=str(exception.args[0]))
                 raise exceptions.CouchError(data)
+            except requests.exceptions.Timeout as exception:
+                data = dict(error='requests.exceptions.Timeout', reason=str(exception))
+                raise exceptions.CouchError(data)
         return wrapped
 
-    @check_connection_error
-    def get(self, url, acceptable_status_codes=STATUS_CODES_2XX, **kwargs):
+    def _login(self):
+        url = '{}/_session'.format(self.url)
+        kwargs = self._encode_body(dict(json=dict(name=self.username, password=self.password)))
+        response = self.session.post(url, **kwargs)
+        self._check_response(response, STATUS_CODES_2XX)
+        self._session_started = time.time()
+
+    def _session_expired(self):
+        if self._session_started is None:
+            return True
+        # Log in again before couchdb lets the AuthSession cookie expire.
+        return time.time() - self._session_started > self.session_timeout * SESSION_REFRESH_RATIO
+
+    def _ensure_session(self):
+        if self._session_expired():
+            with self._session_lock:
+                if self._session_expired():
+                    self._login()
+
+    def _send(self, method, url, acceptable_status_codes, **kwargs):
         url = '{}/{}'.format(self.url, url)
-        response = requests.get(url, auth=self.auth, **kwargs)
+        kwargs = self._encode_body(kwargs)
+        if self.authentication == 'cookie':
+            self._ensure_session()
+        session_started = self._session_started
+        response = self.session.request(method, url, **kwargs)
+        if self.authentication == 'cookie':
+            if response.status_code == 401 and 401 not in acceptable_status_codes:
+                # Expired or revoked session: log in again, unless another
+                # thread already did, and retry once.
+                response.close()
+                with self._session_lock:
+                    if self._session_started == session_started:
+                        self._login()
+                response = self.session.request(method, url, **kwargs)
+            elif 'AuthSession' in response.cookies:
+                # Couchdb refreshed the cookie on its own.
+                self._session_started = time.time()
+        return response
+
+    def _request(self, method, url, acceptable_status_codes, **kwargs):
+        response = self._send(method, url, acceptable_status_codes, **kwargs)
         return self._check_response(response, acceptable_status_codes)
 
+    def stream_rows(self, url, method='GET', key='rows', acceptable_status_codes=STATUS_CODES_2XX, **kwargs):
+        # Yields the items of the `key` array as they are received.
+        try:
+            response = self._send(method, url, acceptable_status_codes, stream=True, **kwargs)
+            try:
+                if response.status_code not in acceptable_status_codes:
+                    self._check_response(response, acceptable_status_codes)
+                parser = RowParser(key=key)
+                for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                    for row in parser.feed(chunk):
+                        yield row
+                parser.close()
+            finally:
+                response.close()
+        except requests.exceptions.ConnectionError as exception:
+            data = dict(error='requests.exceptions.ConnectionError', reason=str(exception.args[0]))
+            raise exceptions.CouchError(data)
+        except requests.exceptions.Timeout as exception:
+            data = dict(error='requests.exceptions.Timeout', reason=str(exception))
+            raise exceptions.CouchError(data)
+
+    def stream_lines(self, url, method='GET', acceptable_status_codes=STATUS_CODES_2XX, **kwargs):
+        # Yields the json lines of a continuous feed as they are received,
+        # None for the empty lines couchdb sends as heartbeat.
+        try:
+            response = self._send(method, url, acceptable_status_codes, stream=True, **kwargs)
+            try:
+                if response.status_code not in acceptable_status_codes:
+                    self._check_response(response, acceptable_status_codes)
+                for line in response.iter_lines():
+                    if line:
+                        yield self.codec.loads(line)
+                    else:
+                        yield None
+            finally:
+                response.close()
+        except requests.exceptions.ConnectionError as exception:
+            data = dict(error='requests.exceptions.ConnectionError', reason=str(exception.args[0]))
+            raise exceptions.CouchError(data)
+        except requests.exceptions.Timeout as exception:
+            data = dict(error='requests.exceptions.Timeout', reason=str(exception))
+            raise exceptions.CouchError(data)
+
+    @check_connection_error
+    def get(self, url, acceptable_status_codes=STATUS_CODES_2XX, **kwargs):
+        return self._request('GET', url, acceptable_status_codes, **kwargs)
+
+    @check_connection_error
+    def head(self, url, acceptable_status_codes=STATUS_CODES_2XX, **kwargs):
+        response = self._send('HEAD', url, acceptable_status_codes, **kwargs)
+        return self._check_head_response(response, acceptable_status_codes)
+
+    @check_connection_error
+    def conditional_get(self, url, etag=None, acceptable_status_codes=STATUS_CODES_2XX, **kwargs):
+        kwargs = self._set_if_none_match(kwargs, etag)
+        response = self._send('GET', url, acceptable_status_codes, **kwargs)
+        return self._check_conditional_response(response, etag, acceptable_status_codes)
+
     @check_connection_error
     def post(self, url, acceptable_status_codes=STATUS_CODES_2XX, **kwargs):
-        url = '{}/{}'.format(self.url, url)
-        response = requests.post(url, auth=self.auth, **kwargs)
-        return self._check_response(response, acceptable_status_codes)
+        return self._request('POST', url, acceptable_status_codes, **kwargs)
 
     @check_connection_error
     def put(self, url, acceptable_status_codes=STATUS_CODES_2XX, **kwargs):
-        url = '{}/{}'.format(self.url, url)
-        response = requests.put(url, auth=self.auth, **kwargs)
-        return self._check_response(response, acceptable_status_codes)
+        return self._request('PUT', url, acceptable_status_codes, **kwargs)
 
     @check_connection_error
     def delete(self, url, acceptable_status_codes=STATUS_CODES_2XX, **kwargs):
-        url = '{}/{}'.format(self.url, url)
-        response = requests.delete(url, auth=self.auth, **kwargs)
-        return self._check_response(response, acceptable_status_codes)
+        return self._request('DELETE', url, acceptable_status_codes, **kwargs)
 
     def _cluster_setup(self):
         return self.post('/_cluster_setup', json=dict(action='finish_cluster'))
@@ -0,0 +1,53 @@
+import codecs
+import json
+import re
+from . import exceptions
+
+WHITESPACE_AND_COMMAS = re.compile(r'[\s,]*')
+
+
+class RowParser(object):
+    # Incrementally extracts the items of a top level array, e.g. the "rows"
+    # of a view response, from a response body fed in arbitrary chunks. Only
+    # the current, not yet complete item is kept in memory.
+    def __init__(self, key='rows'):
+        self.start = re.compile(r'"{}"\s*:\s*\['.format(re.escape(key)))
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.started = False
+        self.finished = False
+
+    def feed(self, data):
+        if self.finished:
+            return []
+        self.buffer += self.text_decoder.decode(data)
+        if not self.started:
+            match = self.start.search(self.buffer)
+            if not match:
+                return []
+            self.buffer = self.buffer[match.end():]
+            self.started = True
+        rows = []
+        position = 0
+        while True:
+            position = WHITESPACE_AND_COMMAS.match(self.buffer, position).end()
+            if position == len(self.buffer):
+                break
+            if self.buffer[position] == ']':
+                self.finished = True
+                break
+            try:
+                row, position = self.decoder.raw_decode(self.buffer, position)
+            except ValueError:
+                # Incomplete row, wait for more data.
+                break
+            rows.append(row)
+        self.buffer = self.buffer[position:]
+        if self.finished:
+            self.buffer = ''
+        return rows
+
+    def close(self):
+        if not self.finished:
+            raise exceptions.CouchError(dict(error='stream_error', reason='Incomplete response body.'))
@@ -1,6 +1,7 @@
 from django.conf import settings
 from django.test import SimpleTestCase
-from .. import Server
+from ..registry import get_server
+from ..registry import registry
 from ..utils import migrate
 
 TEST_DATABASE_PREFIX = 't_e_s_t__'
@@ -23,15 +24,17 @@ class CouchTestCase(SimpleTestCase):
             prefix = config.get('DATABASE_PREFIX', '')
             if not prefix.startswith(TEST_DATABASE_PREFIX):
                 config['DATABASE_PREFIX'] = '{}{}'.format(TEST_DATABASE_PREFIX, prefix)
+        registry.clear()
 
     def revert_test_prefix(self):
         for config in settings.COUCH_SERVERS.values():
             prefix = config.get('DATABASE_PREFIX', '')
             if prefix.startswith(TEST_DATABASE_PREFIX):
                 config['DATABASE_PREFIX'] = prefix.replace(TEST_DATABASE_PREFIX, '', 1)
+        registry.clear()
 
     def delete_test_databases(self):
         for alias in settings.COUCH_SERVERS.keys():
-            server = Server(alias=alias)
+            server = get_server(alias)
             for db_name in server.list_databases():
                 server.delete_database(db_name)
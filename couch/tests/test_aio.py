@@ -0,0 +1,179 @@
+import asyncio
+import itertools
+from django.test import override_settings
+from django.test import SimpleTestCase
+from ..test import CouchTestCase
+from .. import AsyncDatabase
+from .. import AsyncServer
+from .. import documents
+from .. import exceptions
+from ..aio import prefetch_batches
+from ..registry import get_async_server
+
+
+class Book(documents.Document):
+    title = documents.TextField()
+    pages = documents.IntegerField()
+
+    class Meta:
+        database_name = 'db'
+        document_type = 'book'
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+async def collect(generator, count=None):
+    result = []
+    async for item in generator:
+        result.append(item)
+        if count is not None and len(result) == count:
+            await generator.aclose()
+            break
+    return result
+
+
+class AsyncServerNoCouchTest(SimpleTestCase):
+    @override_settings(COUCH_SERVERS=dict(default=dict(USERNAME='user', PASSWORD='pass', POOL_MAXSIZE=20)))
+    def test_config(self):
+        server = AsyncServer()
+        self.assertEqual(server.auth, ('user', 'pass'))
+        self.assertEqual(server.pool_maxsize, 20)
+        run(server.aclose())
+
+    @override_settings(COUCH_SERVERS=dict(default=dict()))
+    def test_registry(self):
+        async def get_servers():
+            return get_async_server(), get_async_server()
+
+        server1, server2 = run(get_servers())
+        self.assertIs(server1, server2)
+        self.assertIsInstance(server1, AsyncServer)
+        with self.assertRaises(RuntimeError):
+            get_async_server()
+
+    @override_settings(COUCH_SERVERS=dict(default=dict(HOST='nowhere.example.com')))
+    def test_connection_error(self):
+        server = AsyncServer()
+        with self.assertRaises(exceptions.CouchError) as context:
+            run(server.list_databases())
+        self.assertEqual(context.exception.args[0]['error'], 'httpx.TransportError')
+
+    def test_prefetch_close(self):
+        closed = []
+
+        async def rows():
+            try:
+                for number in itertools.count():
+                    yield number
+            finally:
+                closed.append(True)
+
+        async def consume():
+            result = await collect(prefetch_batches(rows(), 2, 1), 1)
+            current = asyncio.current_task()
+            return result, [task for task in asyncio.all_tasks() if task is not current]
+
+        result, pending = run(consume())
+        self.assertEqual(result, [0])
+        self.assertEqual(pending, [])
+        self.assertEqual(closed, [True])
+
+
+class AsyncServerTest(CouchTestCase):
+    def test_database(self):
+        server = AsyncServer()
+        self.assertNotIn('mydb', run(server.list_databases()))
+        db = run(server.create_database('mydb'))
+        self.assertIsInstance(db, AsyncDatabase)
+        self.assertIn('mydb', run(server.list_databases()))
+        db, created = run(server.get_or_create_database('mydb'))
+        self.assertFalse(created)
+        run(server.delete_database('mydb'))
+        self.assertNotIn('mydb', run(server.list_databases()))
+
+    def test_cookie_authentication(self):
+        server = AsyncServer(authentication='cookie')
+        data = run(server.get('/_session'))
+        self.assertEqual(data['userCtx']['name'], 'admin')
+
+
+class AsyncDatabaseTest(CouchTestCase):
+    def setUp(self):
+        self.server = AsyncServer()
+        self.db, created = run(self.server.get_or_create_database('db'))
+        for _id in ('a', 'b', 'c'):
+            run(self.db.put(_id, json=dict(document_type='book', title=_id.upper())))
+
+    def test_view(self):
+        run(self.db.put('_design/viewdocid', json=dict(views=dict(view=dict(map='function(doc) { emit(doc._id, doc); }')))))
+        result = run(collect(self.db.view('viewdocid', batch_size=2)))
+        self.assertEqual([row['id'] for row in result], ['a', 'b', 'c'])
+        result = run(collect(self.db.view('viewdocid', document_class=Book)))
+        self.assertIsInstance(result[0], Book)
+        result = run(collect(self.db.view('viewdocid', batch_size=1, prefetch=1), 2))
+        self.assertEqual([row['id'] for row in result], ['a', 'b'])
+        row = run(self.db.view_one('viewdocid', 'b'))
+        self.assertEqual(row['id'], 'b')
+
+    def test_find(self):
+        result = run(collect(self.db.find(selector=dict(document_type='book'), batch_size=2, warning=False)))
+        self.assertEqual([doc['_id'] for doc in result], ['a', 'b', 'c'])
+        result = run(collect(self.db.find(selector=dict(document_type='book'), batch_size=1, prefetch=2, warning=False)))
+        self.assertEqual([doc['_id'] for doc in result], ['a', 'b', 'c'])
+        doc = run(self.db.find_one(selector=dict(title='C'), warning=False))
+        self.assertEqual(doc['_id'], 'c')
+        with self.assertRaises(exceptions.MultipleObjectsReturned):
+            run(self.db.find_one(selector=dict(document_type='book'), warning=False))
+
+    def test_index(self):
+        result = run(self.db.create_index('ddoc', 'name', dict(fields=['title'])))
+        self.assertEqual(result['result'], 'created')
+        index = run(self.db.get_index('ddoc', 'name'))
+        self.assertEqual(index['def'], dict(fields=[dict(title='asc')]))
+        run(self.db.delete_index('ddoc', 'name'))
+        self.assertEqual(run(self.db.get_index('ddoc', 'name')), None)
+
+
+class AsyncManagerTest(CouchTestCase):
+    def setUp(self):
+        run(AsyncServer().get_or_create_database('db'))
+
+    def test_save_get_delete(self):
+        book = Book(_id='python_cookbook', title='Python Cookbook', pages=806)
+        self.assertEqual(run(book.asave()), 'saved')
+        self.assertEqual(run(book.asave(only_if_changed=True)), 'unchanged')
+        document = run(Book.objects.aget('python_cookbook'))
+        self.assertEqual(document.title, 'Python Cookbook')
+        self.assertEqual(document.pages, 806)
+        self.assertEqual(document._rev, book._rev)
+        run(document.adelete())
+        with self.assertRaises(Book.DoesNotExist):
+            run(Book.objects.aget('python_cookbook'))
+
+    def test_revision_mismatch(self):
+        run(Book(_id='python_cookbook').asave())
+        book = Book(_id='python_cookbook')
+        with self.assertRaises(exceptions.RevisionMismatch):
+            run(book.asave())
+        self.assertEqual(run(book.asave(revision_mismatch_override=True)), 'saved')
+
+    def test_find(self):
+        run(Book(_id='python_cookbook', title='Python Cookbook').asave())
+        run(Book(_id='django_guide', title='The Definitive Guide to Django').asave())
+        result = run(collect(Book.objects.afind(selector=dict(document_type='book'), warning=False), 5))
+        self.assertEqual([book._id for book in result], ['django_guide', 'python_cookbook'])
+        book = run(Book.objects.afind_one(selector=dict(title='Python Cookbook'), warning=False))
+        self.assertEqual(book._id, 'python_cookbook')
+
+    def test_view(self):
+        run(Book(_id='python_cookbook', title='Python Cookbook').asave())
+
+        async def view():
+            db = Book._meta.get_async_database()
+            await db.put('_design/viewdocid', json=dict(views=dict(view=dict(map='function(doc) { emit(doc._id, doc); }'))))
+            return await collect(Book.objects.aview('viewdocid'))
+
+        result = list(itertools.islice(run(view()), 5))
+        self.assertEqual([book._id for book in result], ['python_cookbook'])
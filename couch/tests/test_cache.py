@@ -0,0 +1,210 @@
+from unittest import mock
+from django.core.cache import caches
+from django.test import override_settings
+from django.test import SimpleTestCase
+from .. import documents
+from .. import exceptions
+from .. import Server
+from ..cache import DocumentCache
+from ..cache import LRUCache
+from ..cache import ResultCache
+from ..cache import SizedLRUCache
+
+
+class LRUCacheTest(SimpleTestCase):
+    def test_get_set(self):
+        cache = LRUCache(2)
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.get('a', 0), 0)
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIn('a', cache)
+        self.assertEqual(len(cache), 1)
+
+    def test_eviction(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        cache.set('a', 4)
+        cache.set('d', 5)
+        self.assertNotIn('c', cache)
+
+    def test_delete_clear(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.delete('a')
+        cache.delete('a')
+        self.assertNotIn('a', cache)
+        cache.set('b', 2)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_ko_max_size(self):
+        with self.assertRaises(ValueError):
+            LRUCache(0)
+
+
+class SizedLRUCacheTest(SimpleTestCase):
+    def test_eviction(self):
+        cache = SizedLRUCache(10)
+        cache.set('a', 1, 4)
+        cache.set('b', 2, 4)
+        cache.get('a')
+        cache.set('c', 3, 4)
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.size, 8)
+        cache.set('a', 4, 2)
+        self.assertEqual(cache.size, 6)
+        self.assertEqual(cache.get('a'), 4)
+
+    def test_too_large(self):
+        cache = SizedLRUCache(10)
+        cache.set('a', 1, 4)
+        cache.set('a', 2, 11)
+        self.assertNotIn('a', cache)
+        self.assertEqual(cache.size, 0)
+
+    def test_delete_clear(self):
+        cache = SizedLRUCache(10)
+        cache.set('a', 1, 4)
+        cache.delete('a')
+        cache.delete('a')
+        self.assertEqual(cache.size, 0)
+        cache.set('b', 2, 4)
+        cache.clear()
+        self.assertEqual((len(cache), cache.size), (0, 0))
+        with self.assertRaises(ValueError):
+            SizedLRUCache(0)
+
+
+class FakeDatabase(object):
+    def __init__(self):
+        self.server = Server()
+
+    def _get_database_name(self):
+        return 'db'
+
+
+@override_settings(COUCH_SERVERS=dict(default=dict()))
+class DocumentCacheTest(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.db = FakeDatabase()
+
+    def test_get_set_delete(self):
+        cache = DocumentCache()
+        self.assertEqual(cache.get(self.db, 'a b'), None)
+        cache.set(self.db, dict(_id='a b', _rev='1-a', title='A'))
+        self.assertEqual(cache.make_key(self.db, 'a b'), 'couch:db:a%20b')
+        self.assertEqual(cache.get(self.db, 'a b'), dict(_id='a b', _rev='1-a', title='A'))
+        cache.delete(self.db, 'a b')
+        self.assertEqual(cache.get(self.db, 'a b'), None)
+
+    def test_max_size(self):
+        cache = DocumentCache(max_size=50)
+        cache.set(self.db, dict(_id='a', _rev='1-a', title='A'))
+        self.assertNotEqual(cache.get(self.db, 'a'), None)
+        cache.set(self.db, dict(_id='a', _rev='2-a', title='A' * 50))
+        self.assertEqual(cache.get(self.db, 'a'), None)
+
+    def test_stats(self):
+        cache = DocumentCache()
+        self.assertEqual(cache.stats(), dict(hits=0, misses=0, stale=0, hit_ratio=0.0))
+        cache.hit()
+        cache.hit()
+        cache.hit()
+        cache.miss(stale=True)
+        self.assertEqual(cache.stats(), dict(hits=3, misses=1, stale=1, hit_ratio=0.75))
+        cache.reset_stats()
+        self.assertEqual(cache.stats()['hits'], 0)
+
+
+@override_settings(COUCH_SERVERS=dict(default=dict()))
+class ResultCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.db = FakeDatabase()
+
+    def test_get_set(self):
+        cache = ResultCache()
+        key = cache.make_key(self.db, '_find', dict(json=dict(selector=dict(a=1), limit=2)))
+        self.assertEqual(key, cache.make_key(self.db, '_find', dict(json=dict(limit=2, selector=dict(a=1)))))
+        self.assertEqual(cache.get(self.db, key, 1), None)
+        cache.set(self.db, key, 1, dict(docs=[dict(_id='a')]))
+        result = cache.get(self.db, key, 1)
+        self.assertEqual(result, dict(docs=[dict(_id='a')]))
+        result['docs'].pop()
+        self.assertEqual(cache.get(self.db, key, 1), dict(docs=[dict(_id='a')]))
+        self.assertEqual(cache.get(self.db, key, 2), None)
+        self.assertEqual(cache.get(self.db, key, 1), None)
+        self.assertEqual(cache.stats(), dict(hits=2, misses=3, stale=1, hit_ratio=0.4))
+
+    def test_max_size(self):
+        cache = ResultCache(max_size=30)
+        cache.set(self.db, 'a', 1, dict(rows=[1, 2, 3]))
+        cache.set(self.db, 'b', 1, dict(rows=[4, 5, 6]))
+        self.assertEqual(cache.get(self.db, 'a', 1), None)
+        self.assertEqual(cache.get(self.db, 'b', 1), dict(rows=[4, 5, 6]))
+        self.assertLessEqual(cache.cache.size, 30)
+
+    def test_freshness(self):
+        self.assertEqual(ResultCache(freshness='changes').freshness, 'changes')
+        with self.assertRaises(ValueError):
+            ResultCache(freshness='ttl')
+
+
+class Book(documents.Document):
+    title = documents.TextField()
+
+    class Meta:
+        database_name = 'db'
+        document_type = 'book'
+        cache = dict(validate=True)
+
+
+@override_settings(COUCH_SERVERS=dict(default=dict()))
+class ManagerDocumentCacheTest(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        Book._meta.cache.reset_stats()
+        self.data = dict(_id='a', _rev='1-a', document_type='book', title='A')
+
+    def test_options(self):
+        self.assertEqual(documents.Options(object).cache, None)
+
+        class Meta:
+            cache = True
+
+        self.assertEqual(documents.Options(Meta).cache.alias, 'default')
+        Meta.cache = 'other'
+        self.assertEqual(documents.Options(Meta).cache.alias, 'other')
+        Meta.cache = dict(alias='other', timeout=60)
+        self.assertEqual(documents.Options(Meta).cache.timeout, 60)
+
+    def test_get(self):
+        with mock.patch.object(Book.objects, '_fetch', return_value=dict(self.data)) as fetch:
+            with mock.patch.object(Book.objects, 'get_rev', return_value='1-a'):
+                self.assertEqual(Book.objects.get('a').title, 'A')
+                self.assertEqual(Book.objects.get('a').title, 'A')
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(Book._meta.cache.stats(), dict(hits=1, misses=1, stale=0, hit_ratio=0.5))
+
+    def test_get_stale(self):
+        with mock.patch.object(Book.objects, '_fetch', return_value=dict(self.data)) as fetch:
+            Book.objects.get('a')
+            with mock.patch.object(Book.objects, 'get_rev', return_value='2-a'):
+                Book.objects.get('a')
+        self.assertEqual(fetch.call_count, 2)
+        self.assertEqual(Book._meta.cache.stats()['stale'], 1)
+
+    def test_get_deleted(self):
+        with mock.patch.object(Book.objects, '_fetch', return_value=dict(self.data)):
+            Book.objects.get('a')
+        with mock.patch.object(Book.objects, 'get_rev', side_effect=exceptions.ObjectDoesNotExist):
+            with self.assertRaises(Book.DoesNotExist):
+                Book.objects.get('a')
+        self.assertEqual(Book._meta.cache.get(Book._meta.get_database(), 'a'), None)
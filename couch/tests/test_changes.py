@@ -0,0 +1,234 @@
+import io
+import requests
+from unittest import mock
+from requests.adapters import BaseAdapter
+from django.test import override_settings
+from django.test import SimpleTestCase
+from ..test import CouchTestCase
+from .. import Database
+from .. import exceptions
+from .. import Server
+from ..changes import Checkpoint
+from ..changes import DEFAULT_MAX_RETRIES
+from ..changes import get_changes_request
+from ..changes import get_retry_delay
+
+
+def get_change(seq, _id=None):
+    return dict(seq=seq, id=_id or 'doc{}'.format(seq), changes=[dict(rev='1-a')])
+
+
+class LinesAdapter(BaseAdapter):
+    def __init__(self, body):
+        super(LinesAdapter, self).__init__()
+        self.body = body
+
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        response.status_code = 200
+        response.raw = io.BytesIO(self.body)
+        return response
+
+    def close(self):
+        pass
+
+
+class ChangesRequestTest(SimpleTestCase):
+    def test_normal(self):
+        method, kwargs = get_changes_request('normal', 5, 100, None, True, None, dict(descending=False))
+        self.assertEqual(method, 'GET')
+        self.assertEqual(kwargs, dict(params=dict(
+            feed='normal', since=5, limit=100, include_docs='true', descending='false',
+        )))
+
+    def test_live(self):
+        method, kwargs = get_changes_request('continuous', 'now', 100, 2000, False, dict(type='book'), dict())
+        self.assertEqual(method, 'POST')
+        self.assertEqual(kwargs['params'], dict(feed='continuous', since='now', heartbeat=2000, filter='_selector'))
+        self.assertEqual(kwargs['json'], dict(selector=dict(type='book')))
+        self.assertEqual(kwargs['timeout'], 6)
+        method, kwargs = get_changes_request('longpoll', None, None, None, False, None, dict())
+        self.assertEqual(kwargs['params'], dict(feed='longpoll', heartbeat=10000))
+
+    def test_retry_delay(self):
+        self.assertEqual([get_retry_delay(1, retries) for retries in (1, 2, 3)], [1, 2, 4])
+        self.assertEqual(get_retry_delay(1, 10), 60)
+
+
+@override_settings(COUCH_SERVERS=dict(default=dict()))
+class DatabaseChangesNoCouchTest(SimpleTestCase):
+    def setUp(self):
+        self.db = Database('db')
+        self.db.get = mock.Mock()
+        self.db.put = mock.Mock(return_value=dict(ok=True, id='_local/worker', rev='0-1'))
+
+    def test_options(self):
+        with self.assertRaises(ValueError):
+            self.db.changes(feed='eventsource')
+        with self.assertRaises(ValueError):
+            self.db.changes(batch_size=0)
+        with self.assertRaises(ValueError):
+            self.db.changes(checkpoint='worker', checkpoint_every=0)
+
+    def test_normal_batches(self):
+        self.db.get.side_effect = [
+            dict(results=[get_change(1), get_change(2)], last_seq=2),
+            dict(results=[get_change(3)], last_seq=3),
+        ]
+        result = list(self.db.changes(batch_size=2))
+        self.assertEqual([row['seq'] for row in result], [1, 2, 3])
+        self.assertEqual(self.db.get.call_args_list[1][1]['params']['since'], 2)
+
+    def test_checkpoint(self):
+        self.db.get.side_effect = [
+            dict(_id='_local/worker', _rev='0-1', last_seq=7),
+            dict(results=[get_change(8), get_change(9), get_change(10)], last_seq=10),
+        ]
+        changes = self.db.changes(checkpoint='worker', checkpoint_every=2)
+        self.assertEqual(next(changes)['seq'], 8)
+        self.assertEqual(self.db.get.call_args_list[1][1]['params']['since'], 7)
+        next(changes)
+        self.assertFalse(self.db.put.called)
+        next(changes)
+        self.db.put.assert_called_once_with('_local/worker', json=dict(last_seq=9, _rev='0-1'))
+        self.assertEqual(list(changes), [])
+        self.db.put.assert_called_with('_local/worker', json=dict(last_seq=10, _rev='0-1'))
+
+    def test_checkpoint_missing(self):
+        self.db.get.side_effect = [
+            exceptions.CouchError(dict(error='not_found', reason='missing')),
+            dict(results=[], last_seq=3),
+        ]
+        self.assertEqual(list(self.db.changes(checkpoint='worker')), [])
+        self.assertNotIn('since', self.db.get.call_args_list[1][1]['params'])
+        self.db.put.assert_called_once_with('_local/worker', json=dict(last_seq=3))
+
+    @mock.patch('couch.database.time.sleep')
+    def test_reconnect(self, sleep):
+        self.db.get.side_effect = [
+            dict(results=[get_change(1), get_change(2)], last_seq=2),
+            exceptions.CouchError(dict(error='requests.exceptions.ConnectionError', reason='reset')),
+            exceptions.CouchError(dict(error='requests.exceptions.ConnectionError', reason='reset')),
+            dict(results=[get_change(3)], last_seq=3),
+        ]
+        result = list(self.db.changes(batch_size=2, retry_delay=0.5))
+        self.assertEqual([row['seq'] for row in result], [1, 2, 3])
+        self.assertEqual([call[0][0] for call in sleep.call_args_list], [0.5, 1])
+        self.assertEqual(self.db.get.call_args_list[3][1]['params']['since'], 2)
+
+    @mock.patch('couch.database.time.sleep')
+    def test_reconnect_max_retries(self, sleep):
+        db = Database('db')
+        with mock.patch.object(db.server.session, 'request', side_effect=requests.exceptions.ReadTimeout('timeout')):
+            with self.assertRaises(exceptions.CouchError) as context:
+                list(db.changes(feed='longpoll', max_retries=1))
+        self.assertEqual(context.exception.args[0]['error'], 'requests.exceptions.Timeout')
+        self.assertEqual(sleep.call_count, 1)
+        self.db.get.side_effect = [exceptions.CouchError(dict(error='not_found', reason='missing'))]
+        with self.assertRaises(exceptions.CouchError):
+            list(self.db.changes())
+
+    @mock.patch('couch.database.time.sleep')
+    def test_reconnect_timeout(self, sleep):
+        db = Database('db')
+        response = mock.Mock(status_code=200, content=b'{"results":[{"seq":1,"id":"a"}],"last_seq":1}')
+        side_effect = [requests.exceptions.ReadTimeout('timeout'), response]
+        with mock.patch.object(db.server.session, 'request', side_effect=side_effect):
+            changes = db.changes(feed='longpoll')
+            self.assertEqual(next(changes), dict(seq=1, id='a'))
+            changes.close()
+        self.assertEqual(sleep.call_count, 1)
+
+    @mock.patch('couch.database.time.sleep')
+    def test_reconnect_default_max_retries(self, sleep):
+        error = exceptions.CouchError(dict(error='requests.exceptions.ConnectionError', reason='down'))
+        self.db.get.side_effect = [error] * 10
+        with self.assertRaises(exceptions.CouchError):
+            list(self.db.changes())
+        self.assertEqual(self.db.get.call_count, DEFAULT_MAX_RETRIES + 1)
+        self.assertEqual(sleep.call_count, DEFAULT_MAX_RETRIES)
+
+    def test_selector(self):
+        self.db.post = mock.Mock(return_value=dict(results=[get_change(1)], last_seq=1))
+        result = list(self.db.changes(selector=dict(document_type='book')))
+        self.assertEqual(len(result), 1)
+        self.assertEqual(self.db.post.call_args[1]['json'], dict(selector=dict(document_type='book')))
+
+    def test_longpoll(self):
+        self.db.get.side_effect = [
+            dict(results=[get_change(1)], last_seq=1),
+            dict(results=[], last_seq=1),
+            dict(results=[get_change(2)], last_seq=2),
+        ]
+        changes = self.db.changes(feed='longpoll', yield_heartbeats=True)
+        self.assertEqual([next(changes), next(changes), next(changes)], [get_change(1), None, get_change(2)])
+        self.assertEqual(self.db.get.call_args[1]['params']['since'], 1)
+        changes.close()
+
+    def test_continuous(self):
+        closed = []
+
+        def lines(rows):
+            try:
+                for row in rows:
+                    yield row
+            finally:
+                closed.append(rows)
+
+        self.db.stream_lines = mock.Mock(side_effect=[
+            lines([get_change(1), None, dict(last_seq=1)]),
+            lines([None, get_change(2), None]),
+        ])
+        changes = self.db.changes(feed='continuous', yield_heartbeats=True)
+        self.assertEqual([next(changes) for i in range(4)], [get_change(1), None, None, get_change(2)])
+        self.assertEqual(self.db.stream_lines.call_args[1]['params']['since'], 1)
+        self.assertEqual(len(closed), 1)
+        changes.close()
+        self.assertEqual(len(closed), 2)
+
+    def test_stream_rows_timeout(self):
+        server = Server()
+        with mock.patch.object(server.session, 'request', side_effect=requests.exceptions.ReadTimeout('timeout')):
+            with self.assertRaises(exceptions.CouchError) as context:
+                list(server.stream_rows('/db/_all_docs'))
+        self.assertEqual(context.exception.args[0]['error'], 'requests.exceptions.Timeout')
+
+    def test_stream_lines(self):
+        server = Server()
+        server.session.mount('http://', LinesAdapter(b'{"seq":1,"id":"a"}\n\n{"last_seq":1}\n'))
+        self.assertEqual(list(server.stream_lines('/db/_changes')), [dict(seq=1, id='a'), None, dict(last_seq=1)])
+
+
+class DatabaseChangesTest(CouchTestCase):
+    def setUp(self):
+        self.db, created = Server().get_or_create_database('db')
+        for _id in ('a', 'b', 'c'):
+            self.db.put(_id, json=dict(title=_id.upper()))
+
+    def test_normal(self):
+        result = list(self.db.changes(batch_size=2, include_docs=True))
+        self.assertEqual(sorted(row['id'] for row in result), ['a', 'b', 'c'])
+        self.assertEqual(sorted(row['doc']['title'] for row in result), ['A', 'B', 'C'])
+
+    def test_selector(self):
+        result = list(self.db.changes(selector=dict(title='B')))
+        self.assertEqual([row['id'] for row in result], ['b'])
+
+    def test_checkpoint(self):
+        self.assertEqual(len(list(self.db.changes(checkpoint='worker'))), 3)
+        self.assertIsNotNone(Checkpoint(self.db, 'worker').load())
+        self.db.put('d', json=dict(title='D'))
+        result = list(self.db.changes(checkpoint='worker'))
+        self.assertEqual([row['id'] for row in result], ['d'])
+
+    def test_continuous(self):
+        changes = self.db.changes(feed='continuous', heartbeat=100, yield_heartbeats=True)
+        result = []
+        for row in changes:
+            if row is None:
+                break
+            result.append(row['id'])
+        changes.close()
+        self.assertEqual(sorted(result), ['a', 'b', 'c'])
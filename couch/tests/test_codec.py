@@ -0,0 +1,37 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+from .. import codec
+
+
+class CodecTest(SimpleTestCase):
+    def check_codec(self, instance):
+        data = dict(_id='a', title='è', pages=806, tags=['x', None], price=1.5)
+        encoded = instance.dumps(data)
+        self.assertIsInstance(encoded, bytes)
+        self.assertEqual(instance.loads(encoded), data)
+
+    def test_json(self):
+        self.check_codec(codec.get_codec('json'))
+
+    def test_orjson(self):
+        try:
+            instance = codec.get_codec('orjson')
+        except ImproperlyConfigured:
+            self.skipTest('orjson not installed')
+        self.check_codec(instance)
+
+    def test_ujson(self):
+        try:
+            instance = codec.get_codec('ujson')
+        except ImproperlyConfigured:
+            self.skipTest('ujson not installed')
+        self.check_codec(instance)
+
+    def test_dotted_path(self):
+        self.assertIsInstance(codec.get_codec('couch.codec.JsonCodec'), codec.JsonCodec)
+
+    def test_unknown(self):
+        with self.assertRaises(ImproperlyConfigured):
+            codec.get_codec('nowhere')
+        with self.assertRaises(ImproperlyConfigured):
+            codec.get_codec('couch.codec.Nothing')
@@ -0,0 +1,97 @@
+import array
+import datetime
+import math
+from django.test import SimpleTestCase
+from ..test import CouchTestCase
+from .. import columns
+from .. import documents
+from .. import Server
+
+
+class Book(documents.Document):
+    title = documents.TextField()
+    pages = documents.IntegerField()
+    weight = documents.FloatField()
+    published = documents.BooleanField()
+    date = documents.DateField()
+    datetime = documents.DateTimeField()
+    price = documents.DecimalField()
+
+    class Meta:
+        database_name = 'db'
+        document_type = 'book'
+
+
+FIELDS = ['title', 'pages', 'weight', 'published', 'date', 'datetime', 'isbn']
+
+
+class ToColumnsTest(SimpleTestCase):
+    def setUp(self):
+        self.docs = [
+            dict(title='A', pages=100, weight=0.5, published=True, date='1970-01-02',
+                 datetime='1970-01-01T00:00:01+00:00', isbn='1'),
+            dict(title='B', pages=200, weight=None, published=False, date=None,
+                 datetime='1970-01-01T02:00:00+02:00'),
+        ]
+
+    def test_array(self):
+        result = columns.to_columns(self.docs, FIELDS, document_class=Book, use_numpy=False)
+        self.assertEqual(list(result.keys()), FIELDS)
+        self.assertEqual(result['title'], ['A', 'B'])
+        self.assertEqual(result['pages'], array.array('q', [100, 200]))
+        self.assertEqual(result['weight'][0], 0.5)
+        self.assertTrue(math.isnan(result['weight'][1]))
+        self.assertEqual(result['published'], array.array('b', [1, 0]))
+        self.assertEqual(result['date'], array.array('q', [1, columns.NAT]))
+        self.assertEqual(result['datetime'], array.array('q', [1000000, 0]))
+        self.assertEqual(result['isbn'], ['1', None])
+
+    def test_missing_integer(self):
+        result = columns.to_columns([dict(pages=1), dict(), dict(pages='3')], ['pages', 'published'],
+                                    document_class=Book, use_numpy=False)
+        self.assertEqual(result['pages'], [1, None, 3])
+        self.assertEqual(result['published'], [None, None, None])
+
+    def test_no_document_class(self):
+        result = columns.to_columns(self.docs, ['pages', 'date'], use_numpy=False)
+        self.assertEqual(result['pages'], [100, 200])
+        self.assertEqual(result['date'], ['1970-01-02', None])
+
+    def test_object_field(self):
+        result = columns.to_columns([dict(price='9.99')], ['price'], document_class=Book, use_numpy=False)
+        self.assertEqual(str(result['price'][0]), '9.99')
+
+    def test_numpy(self):
+        if columns.numpy is None:
+            with self.assertRaises(ImportError):
+                columns.to_columns(self.docs, FIELDS, use_numpy=True)
+            self.skipTest('numpy not installed')
+        numpy = columns.numpy
+        result = columns.to_columns(self.docs, FIELDS, document_class=Book)
+        self.assertEqual(result['pages'].dtype, numpy.dtype('int64'))
+        self.assertEqual(result['weight'].dtype, numpy.dtype('float64'))
+        self.assertEqual(result['published'].tolist(), [True, False])
+        self.assertEqual(result['date'][0], numpy.datetime64('1970-01-02'))
+        self.assertTrue(numpy.isnat(result['date'][1]))
+        self.assertEqual(result['datetime'].tolist(), [datetime.datetime(1970, 1, 1, 0, 0, 1), datetime.datetime(1970, 1, 1)])
+        self.assertEqual(result['title'].tolist(), ['A', 'B'])
+
+
+class ColumnsTest(CouchTestCase):
+    def setUp(self):
+        self.db, created = Server().get_or_create_database('db')
+        Book(_id='a', title='A', pages=100).save()
+        Book(_id='b', title='B', pages=200).save()
+
+    def test_find_columns(self):
+        result = Book.objects.find_columns(['title', 'pages'], selector=dict(document_type='book'),
+                                           batch_size=1, warning=False, use_numpy=False)
+        self.assertEqual(result['title'], ['A', 'B'])
+        self.assertEqual(result['pages'], array.array('q', [100, 200]))
+
+    def test_view_columns(self):
+        self.db.put('_design/viewdocid', json=dict(views=dict(view=dict(map='function(doc) { emit(doc._id, doc); }'))))
+        result = Book.objects.view_columns('viewdocid', ['pages'], batch_size=1, use_numpy=False)
+        self.assertEqual(result['pages'], array.array('q', [100, 200]))
+        result = self.db.view_columns('viewdocid', ['_id'], include_docs=True, use_numpy=False)
+        self.assertEqual(result['_id'], ['a', 'b'])
@@ -1,12 +1,21 @@
+import datetime
 import itertools
+import pytz
+import time
 import warnings
+from unittest import mock
 from django.test import override_settings
 from django.test import SimpleTestCase
 from couch.test import CouchTestCase
 from .. import Database
+from ..database import chunks
+from ..database import prefetch_batches
 from .. import documents
 from .. import exceptions
+from .. import invalidation
 from .. import Server
+from ..cache import ResultCache
+from ..identity import identity_map
 
 
 class Book(documents.Document):
@@ -60,6 +69,156 @@ class DatabaseNoCouchTest(SimpleTestCase):
         self.assertEqual(db.server.password, None)
 
 
+class Event(documents.Document):
+    name = documents.TextField()
+    datetime = documents.DateTimeField()
+
+    class Meta:
+        database_name = 'mydb'
+        document_type = 'event'
+
+
+@override_settings(COUCH_SERVERS=dict(default=dict()), TIME_ZONE='UTC')
+class DatabaseHydrationTest(SimpleTestCase):
+    def setUp(self):
+        self.db = Database('mydb')
+        self.docs = [
+            dict(_id='a', _rev='1-a', document_type='event', name='A', datetime='2013-05-01T09:00:00Z'),
+            dict(_id='b', _rev='1-b', document_type='event', name='B', datetime=None),
+        ]
+        self.expected = [datetime.datetime(2013, 5, 1, 9, 0, tzinfo=pytz.utc), None]
+
+    def test_find(self):
+        self.db.post = mock.Mock(return_value=dict(docs=self.docs))
+        result = list(self.db.find(selector=dict(), document_class=Event, warning=False))
+        self.assertEqual([document.datetime for document in result], self.expected)
+        self.assertFalse(result[0].is_dirty())
+
+    def test_view(self):
+        rows = [dict(id=doc['_id'], key=doc['_id'], value=doc) for doc in self.docs]
+        self.db.raw_view = mock.Mock(return_value=dict(rows=rows))
+        result = list(self.db.view('event', document_class=Event))
+        self.assertEqual([document.datetime for document in result], self.expected)
+        self.assertEqual(result[0]._rev, '1-a')
+
+    def test_type_mismatch(self):
+        self.db.post = mock.Mock(return_value=dict(docs=[dict(_id='c', document_type='book')]))
+        with self.assertRaises(exceptions.CouchError):
+            list(self.db.find(selector=dict(), document_class=Event, warning=False))
+
+
+@override_settings(COUCH_SERVERS=dict(default=dict()))
+class DatabaseResultCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.db = Database('mydb', server=Server(result_cache=True))
+        self.update_seq = '1-a'
+        self.requests = []
+
+        def get(url, **kwargs):
+            self.requests.append(url)
+            if url == '':
+                return dict(db_name='mydb', update_seq=self.update_seq)
+            return dict(rows=[dict(id='a', key='a', value=dict(_id='a', document_type='book', title='A'))])
+
+        self.db.get = get
+
+    def test_view(self):
+        for i in range(3):
+            result = list(self.db.view('book', document_class=Book))
+            self.assertEqual(result[0].title, 'A')
+        self.assertEqual(self.requests, ['', '_design/book/_view/view', '', ''])
+        self.db.view_one('book', 'a')
+        self.assertEqual(self.requests[-1], '_design/book/_view/view')
+        self.update_seq = '2-a'
+        list(self.db.view('book'))
+        self.assertEqual(self.requests[-2:], ['', '_design/book/_view/view'])
+        self.assertEqual(self.db.server.result_cache.stats()['stale'], 1)
+
+    def test_stream(self):
+        self.db.stream_rows = mock.Mock(return_value=(row for row in []))
+        list(self.db.view('book', stream=True))
+        self.assertEqual(self.requests, [])
+
+    def test_find(self):
+        self.db.post = mock.Mock(return_value=dict(docs=[dict(_id='a', document_type='book', title='A')]))
+        for i in range(2):
+            result = self.db.find_one(selector=dict(title='A'), document_class=Book)
+            self.assertEqual(result.title, 'A')
+        self.assertEqual(self.db.post.call_count, 1)
+        self.db.find_one(selector=dict(title='B'))
+        self.assertEqual(self.db.post.call_count, 2)
+
+    def test_changes_freshness(self):
+        self.db.server.result_cache = ResultCache(freshness='changes')
+        with mock.patch('couch.invalidation.is_listened', return_value=True):
+            list(self.db.view('book'))
+            list(self.db.view('book'))
+            self.assertEqual(self.requests, ['_design/book/_view/view'])
+            invalidation.bump_generation(self.db)
+            list(self.db.view('book'))
+            self.assertEqual(len(self.requests), 2)
+
+
+class DatabaseResultCacheLiveTest(CouchTestCase):
+    def test_view(self):
+        server = Server(result_cache=True)
+        db, created = server.get_or_create_database('mydb')
+        db.put('_design/book', json=dict(views=dict(view=dict(map='function(doc) { emit(doc._id, doc); }'))))
+        db.put('a', json=dict(document_type='book', title='A'))
+        self.assertEqual([row['id'] for row in db.view('book')], ['a'])
+        self.assertEqual([row['id'] for row in db.view('book')], ['a'])
+        self.assertEqual(server.result_cache.stats()['hits'], 1)
+        db.put('b', json=dict(document_type='book', title='B'))
+        self.assertEqual([row['id'] for row in db.view('book')], ['a', 'b'])
+        self.assertEqual(server.result_cache.stats()['stale'], 1)
+
+
+@override_settings(COUCH_SERVERS=dict(default=dict()))
+class DatabaseViewKeysTest(SimpleTestCase):
+    def setUp(self):
+        self.db = Database('mydb')
+
+        def post(url, params=None, json=None):
+            rows = [dict(id=key, key=key, value=dict(_id=key, document_type='book', title=key.upper())) for key in json['keys']]
+            return dict(rows=rows[:params.get('limit')])
+
+        self.db.post = mock.Mock(side_effect=post)
+
+    def test_keys(self):
+        keys = ['c', 'a', 'b', 'a', 'd']
+        result = list(self.db.view('book', keys=keys, batch_size=2))
+        self.assertEqual([row['key'] for row in result], keys)
+        self.assertEqual([call[1]['json']['keys'] for call in self.db.post.call_args_list], [['c', 'a'], ['b', 'a'], ['d']])
+        self.assertEqual(self.db.post.call_args[0][0], '_design/book/_view/view')
+
+    def test_document_class(self):
+        result = list(self.db.view('book', keys=['b', 'a'], document_class=Book, include_docs=False))
+        self.assertEqual([book.title for book in result], ['B', 'A'])
+        self.assertIsInstance(result[0], Book)
+        self.assertEqual(self.db.post.call_args[1]['params'], dict(include_docs=False))
+
+    def test_limit_skip(self):
+        keys = ['a', 'b', 'c', 'd', 'e']
+        result = list(self.db.view('book', keys=keys, batch_size=2, skip=1, limit=3))
+        self.assertEqual([row['key'] for row in result], ['b', 'c', 'd'])
+        self.assertEqual(self.db.post.call_count, 2)
+        with self.assertRaises(ValueError):
+            list(self.db.view('book', keys=keys, limit=0))
+        with self.assertRaises(ValueError):
+            list(self.db.view('book', keys=keys, batch_size=0))
+
+    def test_prefetch_identity_map(self):
+        with identity_map() as mapped:
+            book = mapped.add(self.db, Book._decode(dict(_id='a', document_type='book', title='A')))
+            result = list(self.db.view('book', keys=['a', 'b'], document_class=Book, prefetch=1))
+            self.assertIs(result[0], book)
+            self.assertIs(mapped.get(self.db, Book, 'b'), result[1])
+
+    def test_generator_keys(self):
+        result = list(self.db.view('book', keys=(key for key in 'abc'), batch_size=2, prefetch=1))
+        self.assertEqual([row['key'] for row in result], ['a', 'b', 'c'])
+
+
 class DatabaseTest(CouchTestCase):
     def setUp(self):
         self.server = Server()
@@ -162,6 +321,89 @@ class DatabaseTest(CouchTestCase):
             self.db1.delete('docid?rev={}'.format(data['rev']), acceptable_status_codes=[202])
 
 
+class DatabaseBulkDocsTest(CouchTestCase):
+    def setUp(self):
+        self.db = Server().create_database('mydb')
+
+    def test_bulk_docs(self):
+        result = self.db.bulk_docs([dict(_id='docid1', title='One'), dict(_id='docid2')])
+        self.assertEqual([row['id'] for row in result], ['docid1', 'docid2'])
+        self.assertTrue(all(row['ok'] for row in result))
+        self.assertEqual(self.db.get('docid1')['title'], 'One')
+
+    def test_bulk_docs_conflict(self):
+        self.db.put('docid1', json=dict())
+        result = self.db.bulk_docs([dict(_id='docid1'), dict(_id='docid2')])
+        self.assertEqual(result[0], dict(id='docid1', error='conflict', reason='Document update conflict.'))
+        self.assertTrue(result[1]['ok'])
+
+
+class DatabaseAllDocsTest(CouchTestCase):
+    def setUp(self):
+        self.db = Server().create_database('mydb')
+        self.db.put('docid1', json=dict(title='One'))
+        self.db.put('docid2', json=dict(title='Two'))
+
+    def test_all_docs(self):
+        rows = self.db.all_docs(['docid2', 'missing', 'docid1'])['rows']
+        self.assertEqual([row['key'] for row in rows], ['docid2', 'missing', 'docid1'])
+        self.assertEqual(rows[0]['doc']['title'], 'Two')
+        self.assertEqual(rows[1]['error'], 'not_found')
+        self.assertEqual(rows[2]['doc']['title'], 'One')
+
+    def test_all_docs_no_include_docs(self):
+        rows = self.db.all_docs(['docid1'], include_docs=False)['rows']
+        self.assertNotIn('doc', rows[0])
+        self.assertEqual(rows[0]['id'], 'docid1')
+
+
+class DatabaseChunksTest(SimpleTestCase):
+    def test_chunks(self):
+        self.assertEqual(list(chunks(range(5), 2)), [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(chunks(range(4), 2)), [[0, 1], [2, 3]])
+        self.assertEqual(list(chunks([], 2)), [])
+
+
+class DatabasePrefetchTest(SimpleTestCase):
+    def generate(self, count, fetched, error_at=None):
+        try:
+            for i in range(count):
+                if i == error_at:
+                    raise KeyError(i)
+                fetched.append(i)
+                yield i
+        finally:
+            fetched.append('closed')
+
+    def test_prefetch(self):
+        fetched = []
+        result = prefetch_batches(self.generate(25, fetched), 10, 2)
+        self.assertEqual(list(result), list(range(25)))
+        self.assertEqual(fetched[-1], 'closed')
+
+    def test_prefetch_bounded(self):
+        fetched = []
+        result = prefetch_batches(self.generate(1000, fetched), 10, 2)
+        self.assertEqual(next(result), 0)
+        time.sleep(0.2)
+        # Current batch, two queued batches and the one waiting to be queued.
+        self.assertEqual(len(fetched), 40)
+        result.close()
+        time.sleep(0.3)
+        self.assertEqual(fetched[-1], 'closed')
+
+    def test_prefetch_error(self):
+        fetched = []
+        result = prefetch_batches(self.generate(50, fetched, error_at=23), 10, 2)
+        with self.assertRaises(KeyError):
+            list(result)
+
+    def test_ko_prefetch(self):
+        with self.assertRaises(ValueError) as context:
+            Database('mydb', server=Server()).view('viewdocid', prefetch=0)
+        self.assertEqual(context.exception.args, ('prefetch must be greater than 0',))
+
+
 class DatabaseListDocumentsTest(CouchTestCase):
     def test_list_design_documents(self):
         db = Server().create_database('mydb')
@@ -174,6 +416,13 @@ class DatabaseListDocumentsTest(CouchTestCase):
         self.assertEqual(row['key'], '_design/docid')
         self.assertNotEqual(row['value']['rev'], '')
 
+    def test_list_design_documents_stream(self):
+        db = Server().create_database('mydb')
+        db.put('_design/docid', json=dict(views=dict(view=dict(map='function (doc) {\n  emit(doc._id, 1);\n}'))))
+        db.put('docid', json=dict())
+        rows = list(db.list_design_documents(stream=True))
+        self.assertEqual([row['id'] for row in rows], ['_design/docid'])
+
 
 class DatabaseViewTest(CouchTestCase):
     def setUp(self):
@@ -183,6 +432,17 @@ class DatabaseViewTest(CouchTestCase):
         Author(_id='alex', name='Alex Martelli').save()
         Author(_id='adrian', name='Adrian Holovaty').save()
 
+    def test_keys(self):
+        self.db.put('_design/viewdocid', json=dict(views=dict(view=dict(map='function(doc) { emit(doc._id, doc); }'))))
+        keys = ['python_cookbook', 'missing', 'django_guide']
+        result = list(self.db.view('viewdocid', keys=keys, batch_size=2, document_class=Book))
+        self.assertEqual([book._id for book in result], ['python_cookbook', 'django_guide'])
+        self.assertEqual(result[0].pages, 806)
+        result = list(self.db.view('viewdocid', keys=['alex', 'adrian'], stream=True))
+        self.assertEqual([row['id'] for row in result], ['alex', 'adrian'])
+        result = self.db.raw_view('viewdocid', 'view', keys=['alex'])
+        self.assertEqual(result['rows'][0]['id'], 'alex')
+
     def test_raw_empy_emit(self):
         self.db.put('_design/viewdocid', json=dict(views=dict(view=dict(map='function(doc) { emit(); }'))))
         result = self.db.raw_view('viewdocid', 'view')
@@ -282,6 +542,44 @@ class DatabaseViewTest(CouchTestCase):
         self.assertEqual(result[2]['id'], 'django_guide')
         self.assertEqual(result[3]['id'], 'python_cookbook')
 
+    def test_raw_stream(self):
+        self.db.put('_design/viewdocid', json=dict(views=dict(view=dict(map='function(doc) { emit(doc._id); }'))))
+        result = self.db.raw_view('viewdocid', 'view', stream=True, limit=3)
+        self.assertEqual([row['id'] for row in result], ['adrian', 'alex', 'django_guide'])
+
+    def test_stream(self):
+        self.db.put('_design/viewdocid', json=dict(views=dict(view=dict(map='function(doc) { emit(doc._id, doc); }'))))
+        result = list(self.db.view('viewdocid', batch_size=3, stream=True))
+        self.assertEqual([row['id'] for row in result], ['adrian', 'alex', 'django_guide', 'python_cookbook'])
+        result = list(self.db.view('viewdocid', batch_size=1, limit=2, stream=True))
+        self.assertEqual([row['id'] for row in result], ['adrian', 'alex'])
+        result = self.db.view('viewdocid', stream=True, document_class=Author)
+        self.assertEqual(next(result).name, 'Adrian Holovaty')
+        result.close()
+
+    def test_stream_not_found(self):
+        with self.assertRaises(exceptions.CouchError) as context:
+            list(self.db.view('notfound', stream=True))
+        self.assertEqual(context.exception.args[0]['error'], 'not_found')
+
+    def test_prefetch(self):
+        self.db.put('_design/viewdocid', json=dict(views=dict(view=dict(map='function(doc) { emit(doc._id); }'))))
+        result = list(self.db.view('viewdocid', batch_size=1, prefetch=2))
+        self.assertEqual([row['id'] for row in result], ['adrian', 'alex', 'django_guide', 'python_cookbook'])
+        result = list(self.db.view('viewdocid', batch_size=1, limit=3, prefetch=1))
+        self.assertEqual([row['id'] for row in result], ['adrian', 'alex', 'django_guide'])
+
+    def test_prefetch_close(self):
+        self.db.put('_design/viewdocid', json=dict(views=dict(view=dict(map='function(doc) { emit(doc._id); }'))))
+        result = self.db.view('viewdocid', batch_size=1, prefetch=1)
+        self.assertEqual(next(result)['id'], 'adrian')
+        result.close()
+
+    def test_prefetch_document_class_type_mismatch(self):
+        self.db.put('_design/viewdocid', json=dict(views=dict(view=dict(map='function(doc) { if(doc.document_type && doc.document_type=="author") { emit(doc._id, doc); }}'))))
+        with self.assertRaises(exceptions.CouchError):
+            list(self.db.view('viewdocid', document_class=Book, prefetch=1))
+
     def test_batch_limit(self):
         self.db.put('_design/viewdocid', json=dict(views=dict(view=dict(map='function(doc) { emit(doc._id); }'))))
         result = self.db.view('viewdocid', batch_size=2, limit=3)
@@ -396,6 +694,38 @@ class DatabaseFindTest(CouchTestCase):
         self.assertEqual(result[2]['_id'], 'django_guide')
         self.assertEqual(result[3]['_id'], 'python_cookbook')
 
+    def test_batch_bookmark(self):
+        requests = []
+        post = self.db.post
+
+        def spy(url, **kwargs):
+            requests.append(dict(kwargs['json']))
+            return post(url, **kwargs)
+
+        self.db.post = spy
+        result = list(self.db.find(selector=dict(), batch_size=1, warning=False))
+        self.assertEqual([doc['_id'] for doc in result], ['adrian', 'alex', 'django_guide', 'python_cookbook'])
+        self.assertNotIn('bookmark', requests[0])
+        for request in requests[1:]:
+            self.assertIn('bookmark', request)
+            self.assertNotIn('skip', request)
+
+    def test_batch_skip(self):
+        result = self.db.find(selector=dict(), skip=1, batch_size=2, warning=False)
+        result = list(itertools.islice(result, 5))
+        self.assertEqual(len(result), 3)
+        self.assertEqual(result[0]['_id'], 'alex')
+        self.assertEqual(result[1]['_id'], 'django_guide')
+        self.assertEqual(result[2]['_id'], 'python_cookbook')
+
+    def test_batch_skip_limit(self):
+        result = list(self.db.find(selector=dict(), skip=1, limit=2, batch_size=1, warning=False))
+        self.assertEqual([doc['_id'] for doc in result], ['alex', 'django_guide'])
+
+    def test_prefetch(self):
+        result = list(self.db.find(selector=dict(), batch_size=1, prefetch=2, warning=False))
+        self.assertEqual([doc['_id'] for doc in result], ['adrian', 'alex', 'django_guide', 'python_cookbook'])
+
     def test_batch_ko_limit(self):
         with self.assertRaises(ValueError) as context:
             list(self.db.find(selector=dict(), limit=0))
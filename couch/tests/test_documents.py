@@ -1,8 +1,14 @@
+import asyncio
+import copy
 import datetime
 import pytz
 from decimal import Decimal
+from django.core.exceptions import ImproperlyConfigured
 from django.test import override_settings
+from django.test import SimpleTestCase
+from unittest import mock
 from ..test import CouchTestCase
+from .. import database
 from .. import documents
 from .. import exceptions
 from .. import Server
@@ -222,6 +228,416 @@ class DocumentNoDbTest(CouchTestCase):
 
 
 @override_settings(TIME_ZONE='UTC')
+class DocumentDirtyTest(SimpleTestCase):
+    def test_new_document(self):
+        document = Book(_id='python_cookbook', title='Python cookbook')
+        self.assertTrue(document.is_dirty())
+        self.assertEqual(document.changed_fields(), ['_id', 'document_type', 'title'])
+
+    def test_loaded_document(self):
+        document = database.to_document(Book, dict(_id='python_cookbook', _rev='1-a', title='Python cookbook', pages=806))
+        self.assertFalse(document.is_dirty())
+        self.assertEqual(document.changed_fields(), [])
+        document.pages = 807
+        document.extra = dict(a=1)
+        self.assertTrue(document.is_dirty())
+        self.assertEqual(document.changed_fields(), ['extra', 'pages'])
+        document._take_snapshot()
+        document.extra['a'] = 2
+        self.assertEqual(document.changed_fields(), ['extra'])
+        del document.extra
+        self.assertEqual(document.changed_fields(), ['extra'])
+
+    def test_revision_is_ignored(self):
+        document = database.to_document(Book, dict(_id='python_cookbook', _rev='1-a', title='Python cookbook'))
+        document._rev = '2-b'
+        self.assertFalse(document.is_dirty())
+
+
+@override_settings(TIME_ZONE='UTC')
+class DocumentLazyTest(SimpleTestCase):
+    def setUp(self):
+        self.data = dict(
+            _id='python_cookbook',
+            _rev='1-a',
+            document_type='book',
+            title='Python cookbook',
+            pages=806,
+            weight=0.45,
+            date='2013-05-01',
+            datetime='2013-05-01T09:00:00Z',
+            price='49.99',
+            published=True,
+        )
+
+    def test_decoded_on_access(self):
+        with mock.patch.object(documents.DateTimeField, 'to_python', wraps=documents.DateTimeField().to_python) as to_python:
+            document = database.to_document(Book, dict(self.data))
+            self.assertEqual(to_python.call_count, 0)
+            self.assertEqual(document.datetime, datetime.datetime(2013, 5, 1, 9, 0, tzinfo=pytz.utc))
+            self.assertEqual(document.datetime, datetime.datetime(2013, 5, 1, 9, 0, tzinfo=pytz.utc))
+            self.assertEqual(to_python.call_count, 1)
+        self.assertEqual(document.price, Decimal('49.99'))
+        self.assertEqual(document.date, datetime.date(2013, 5, 1))
+
+    def test_get_data(self):
+        document = database.to_document(Book, dict(self.data))
+        expected = dict(self.data, datetime='2013-05-01T09:00:00+00:00')
+        self.assertEqual(document._get_data(), expected)
+        document.pages
+        document.datetime
+        self.assertEqual(document._get_data(), expected)
+        self.assertFalse(document.is_dirty())
+
+    def test_set_before_access(self):
+        document = database.to_document(Book, dict(self.data))
+        document.title = 'Php cookbook'
+        self.assertEqual(document.title, 'Php cookbook')
+        self.assertEqual(document.changed_fields(), ['title'])
+        del document.pages
+        self.assertEqual(document.pages, None)
+        self.assertEqual(document.changed_fields(), ['pages', 'title'])
+        with self.assertRaises(AttributeError):
+            del document.pages
+
+    def test_copy(self):
+        for function in (copy.copy, copy.deepcopy):
+            document = database.to_document(Book, dict(self.data))
+            document.pages
+            duplicate = function(document)
+            self.assertEqual(duplicate.title, 'Python cookbook')
+            self.assertEqual(duplicate.pages, 806)
+            self.assertEqual(document.title, 'Python cookbook')
+            self.assertFalse(document.is_dirty())
+            db = mock.Mock()
+            db.post.return_value = dict(id='python_cookbook', rev='2-a')
+            with mock.patch.object(Book._meta, 'get_database', return_value=db):
+                document.save()
+            self.assertEqual(db.post.call_args[1]['json'], dict(self.data, datetime='2013-05-01T09:00:00+00:00'))
+
+    def test_class_attribute(self):
+        self.assertEqual(Book.title, None)
+        self.assertEqual(documents.DesignDocument.language, 'javascript')
+        self.assertEqual(documents.DesignDocument().language, 'javascript')
+
+
+class DocumentSerializerTest(SimpleTestCase):
+    def test_decode(self):
+        data = dict(_id='a', _rev='1-a', _conflicts=['1-b'], document_type='book', title='A', isbn='123')
+        document = Book._decode(data)
+        self.assertEqual(data['document_type'], 'book')
+        self.assertEqual(document._id, 'a')
+        self.assertEqual(document._conflicts, ['1-b'])
+        self.assertEqual(document.isbn, '123')
+        self.assertEqual(document._lazy, dict(title='A'))
+        self.assertEqual(document._snapshot, database.to_document(Book, dict(data))._snapshot)
+        self.assertEqual(document._get_data(), dict(_id='a', _rev='1-a', document_type='book', title='A', isbn='123'))
+        self.assertFalse(document.is_dirty())
+
+    def test_decode_type_mismatch(self):
+        with self.assertRaises(exceptions.CouchError):
+            Book._decode(dict(_id='a', document_type='author'))
+
+    def test_decode_no_document_type(self):
+        class Note(documents.Document):
+            text = documents.TextField()
+
+        document = Note._decode(dict(_id='a', document_type='note', text='A'))
+        self.assertEqual(document.document_type, 'note')
+        self.assertEqual(document._get_data(), dict(_id='a', document_type='note', text='A'))
+        self.assertFalse(document.is_dirty())
+
+    def test_decode_custom_init(self):
+        class Note(documents.Document):
+            text = documents.TextField()
+
+            def __init__(self, **kwargs):
+                super(Note, self).__init__(**kwargs)
+                self.initialized = True
+
+        document = Note._decode(dict(_id='a', text='A'))
+        self.assertTrue(document.initialized)
+        self.assertEqual(document.text, 'A')
+
+    def test_decode_custom_init_default(self):
+        class Note(documents.Document):
+            text = documents.TextField()
+            pages = documents.IntegerField()
+
+            def __init__(self, **kwargs):
+                kwargs.setdefault('pages', 0)
+                super(Note, self).__init__(**kwargs)
+
+        document = Note._decode(dict(_id='a', text='A', pages=12))
+        self.assertEqual(document.pages, 12)
+        self.assertEqual(document._get_data()['pages'], 12)
+        self.assertFalse(document.is_dirty())
+        self.assertEqual(Note._decode(dict(_id='b')).pages, 0)
+
+    def test_encode(self):
+        document = Book(_id='a', title='A', pages='806', price=None)
+        self.assertEqual(document._get_data(), dict(_id='a', document_type='book', title='A', pages=806, price=None))
+        self.assertEqual(document._get_data(include_lazy=False), document._get_data())
+
+
+class CompactBook(documents.Document):
+    title = documents.TextField()
+    pages = documents.IntegerField()
+    datetime = documents.DateTimeField()
+
+    class Meta:
+        database_name = 'db'
+        document_type = 'book'
+        compact = True
+
+
+@override_settings(TIME_ZONE='UTC')
+class CompactDocumentTest(SimpleTestCase):
+    def setUp(self):
+        self.data = dict(
+            _id='python_cookbook',
+            _rev='1-a',
+            _conflicts=['1-b'],
+            document_type='book',
+            title='Python cookbook',
+            datetime='2013-05-01T09:00:00Z',
+            isbn='978-1449340377',
+        )
+
+    def test_slots(self):
+        document = CompactBook(_id='a', title='A')
+        self.assertFalse(hasattr(document, '__dict__'))
+        self.assertNotIsInstance(document, dict)
+        self.assertTrue(CompactBook._meta.compact)
+        self.assertFalse(Book._meta.compact)
+
+    def test_init(self):
+        document = CompactBook(_id='a', title='A', isbn='123')
+        self.assertEqual(document.title, 'A')
+        self.assertEqual(document.pages, None)
+        self.assertEqual(document.isbn, '123')
+        self.assertEqual(document.document_type, 'book')
+        self.assertEqual(document._get_data(), dict(_id='a', document_type='book', title='A', isbn='123'))
+        with self.assertRaises(AttributeError):
+            document.missing
+        with self.assertRaises(exceptions.CouchError):
+            CompactBook(document_type='author')
+
+    def test_decode(self):
+        document = database.to_document(CompactBook, dict(self.data), raw=True)
+        self.assertEqual(document._id, 'python_cookbook')
+        self.assertEqual(document._rev, '1-a')
+        self.assertEqual(document._conflicts, ['1-b'])
+        self.assertEqual(document.isbn, '978-1449340377')
+        self.assertEqual(document._raw, self.data)
+        self.assertEqual(document._lazy_mask, 5)
+        self.assertEqual(document.datetime, datetime.datetime(2013, 5, 1, 9, 0, tzinfo=pytz.utc))
+        self.assertEqual(document._lazy_mask, 1)
+        expected = dict(self.data, datetime='2013-05-01T09:00:00+00:00')
+        del expected['_conflicts']
+        self.assertEqual(document._get_data(), expected)
+        self.assertTrue(document.is_dirty())
+
+    def test_set_delete(self):
+        document = database.to_document(CompactBook, dict(self.data))
+        document.title = 'Php cookbook'
+        document.extra = 1
+        self.assertEqual(document._get_data()['title'], 'Php cookbook')
+        self.assertEqual(document._get_data()['extra'], 1)
+        del document.title
+        del document.extra
+        self.assertEqual(document.title, None)
+        self.assertNotIn('extra', document._get_data())
+        with self.assertRaises(AttributeError):
+            del document.title
+        with self.assertRaises(AttributeError):
+            del document.extra
+
+    def test_subclass_not_compact(self):
+        with self.assertRaises(ImproperlyConfigured) as context:
+            class Novel(CompactBook):
+                class Meta:
+                    compact = False
+        self.assertIn("'Novel'", str(context.exception))
+
+    def test_subclass(self):
+        class Novel(CompactBook):
+            genre = documents.TextField()
+
+            class Meta:
+                database_name = 'db'
+                document_type = 'novel'
+
+        document = Novel(genre='Noir')
+        self.assertTrue(Novel._meta.compact)
+        self.assertFalse(hasattr(document, '__dict__'))
+        self.assertEqual(document.genre, 'Noir')
+        self.assertEqual(list(Novel._fields), ['title', 'pages', 'datetime', 'genre'])
+        document = Novel(title='T2', pages=3, genre='g')
+        self.assertEqual(document._get_data(), dict(document_type='novel', title='T2', pages=3, genre='g'))
+        data = dict(self.data, document_type='novel', pages=806, genre='Cookbook')
+        document = Novel._decode(data)
+        self.assertEqual(document._extra, dict(_conflicts=['1-b'], isbn='978-1449340377'))
+        self.assertEqual(document._lazy_mask, 15)
+        self.assertEqual(document.title, 'Python cookbook')
+        self.assertEqual(document.pages, 806)
+        document.title = 'Php cookbook'
+        self.assertEqual(document._lazy_mask, 12)
+        self.assertEqual(document.genre, 'Cookbook')
+        self.assertEqual(document.datetime, datetime.datetime(2013, 5, 1, 9, 0, tzinfo=pytz.utc))
+        db = mock.Mock()
+        db.post.return_value = dict(id='python_cookbook', rev='2-a')
+        with mock.patch.object(Novel._meta, 'get_database', return_value=db):
+            document.save()
+        self.assertEqual(db.post.call_args[1]['json'], dict(
+            _id='python_cookbook', _rev='1-a', document_type='novel', title='Php cookbook', pages=806,
+            datetime='2013-05-01T09:00:00+00:00', genre='Cookbook', isbn='978-1449340377',
+        ))
+
+
+@override_settings(TIME_ZONE='UTC')
+class DocumentPartialTest(SimpleTestCase):
+    def setUp(self):
+        self.data = dict(
+            _id='python_cookbook',
+            _rev='1-a',
+            document_type='book',
+            title='Python cookbook',
+            pages=806,
+            datetime='2013-05-01T09:00:00Z',
+            isbn='978-1449340377',
+        )
+
+    def get_partial(self, document_class, *fields):
+        options = dict(fields=list(fields))
+        loaded_fields = database.get_loaded_fields(document_class, options)
+        data = dict((key, value) for key, value in self.data.items() if key in options['fields'])
+        return database.to_document(document_class, data, loaded_fields=loaded_fields)
+
+    def test_loaded_fields(self):
+        options = dict(fields=['title'])
+        self.assertEqual(database.get_loaded_fields(Book, options), {'title', '_id', '_rev', 'document_type'})
+        self.assertEqual(options['fields'], ['title', '_id', '_rev', 'document_type'])
+        self.assertEqual(database.get_loaded_fields(Book, dict()), None)
+        self.assertEqual(database.get_loaded_fields(None, dict(fields=['title'])), None)
+
+    def test_load_on_access(self):
+        document = self.get_partial(Book, 'title')
+        self.assertEqual(document._get_data(), dict(
+            _id='python_cookbook', _rev='1-a', document_type='book', title='Python cookbook',
+        ))
+        with mock.patch.object(Book.objects, '_fetch', return_value=dict(self.data)) as fetch:
+            self.assertEqual(document.title, 'Python cookbook')
+            self.assertFalse(fetch.called)
+            self.assertEqual(document.pages, 806)
+            self.assertEqual(document.isbn, '978-1449340377')
+            self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(document._loaded_fields, None)
+        self.assertFalse(document.is_dirty())
+        with self.assertRaises(AttributeError):
+            document.missing
+
+    def test_load_keeps_changes(self):
+        document = self.get_partial(Book, 'title')
+        document.title = 'Php cookbook'
+        document.pages = 1
+        document.isbn = None
+        with mock.patch.object(Book.objects, '_fetch', return_value=dict(self.data)):
+            document._load_deferred()
+        self.assertEqual(document._get_data(), dict(
+            self.data, title='Php cookbook', pages=1, isbn=None, datetime='2013-05-01T09:00:00+00:00',
+        ))
+        self.assertEqual(document.changed_fields(), ['isbn', 'pages', 'title'])
+
+    def test_load_revision_mismatch(self):
+        document = self.get_partial(Book, 'title')
+        with mock.patch.object(Book.objects, '_fetch', return_value=dict(self.data, _rev='2-b')):
+            with self.assertRaises(exceptions.RevisionMismatch):
+                document.pages
+
+    def test_async(self):
+        options = dict(fields=['title'])
+        loaded_fields = database.get_loaded_fields(Book, options, asynchronous=True)
+        data = dict((key, value) for key, value in self.data.items() if key in options['fields'])
+        document = database.to_document(Book, data, loaded_fields=loaded_fields)
+        with mock.patch.object(Book.objects, '_fetch') as fetch:
+            with self.assertRaises(exceptions.CouchError) as context:
+                document.pages
+        self.assertFalse(fetch.called)
+        self.assertIn('aload_deferred', context.exception.args[0])
+
+        async def afetch(db, document_id):
+            return dict(self.data)
+
+        with mock.patch.object(Book._meta, 'get_async_database'):
+            with mock.patch.object(Book.objects, '_afetch', side_effect=afetch):
+                loop = asyncio.get_event_loop()
+                loop.run_until_complete(document.aload_deferred())
+                loop.run_until_complete(document.aload_deferred())
+        self.assertEqual(document.pages, 806)
+        self.assertEqual(document._loaded_fields, None)
+
+    def test_save(self):
+        document = self.get_partial(Book, 'title')
+        document.title = 'Php cookbook'
+        db = mock.Mock()
+        db.post.return_value = dict(id='python_cookbook', rev='2-b')
+        with mock.patch.object(Book._meta, 'get_database', return_value=db):
+            with mock.patch.object(Book.objects, '_fetch', return_value=dict(self.data)):
+                self.assertEqual(document.save(), 'saved')
+        data = db.post.call_args[1]['json']
+        self.assertEqual(data['title'], 'Php cookbook')
+        self.assertEqual(data['pages'], 806)
+        self.assertEqual(data['isbn'], '978-1449340377')
+
+    def test_bulk_save(self):
+        documents = [self.get_partial(Book, 'title'), Book(_id='django_guide')]
+        db = mock.Mock()
+        db.all_docs.return_value = dict(rows=[dict(key='python_cookbook', doc=dict(self.data))])
+        db.bulk_docs.return_value = [dict(id='python_cookbook', rev='2-b'), dict(id='django_guide', rev='1-c')]
+        with mock.patch.object(Book._meta, 'get_database', return_value=db):
+            self.assertEqual(Book.objects.bulk_save(documents), ['saved', 'saved'])
+        db.all_docs.assert_called_once_with(['python_cookbook'])
+        self.assertEqual(db.bulk_docs.call_args[0][0][0]['isbn'], '978-1449340377')
+
+    def test_bulk_save_partial_errors(self):
+        documents = [
+            Book(_id='django_guide'),
+            self.get_partial(Book, 'title'),
+            database.to_document(Book, dict(_id='missing', _rev='1-a'), loaded_fields=frozenset(['_id', '_rev'])),
+        ]
+        db = mock.Mock()
+        db.all_docs.return_value = dict(rows=[
+            dict(key='python_cookbook', doc=dict(self.data, _rev='2-a')),
+            dict(key='missing', error='not_found'),
+        ])
+        db.bulk_docs.return_value = [dict(id='django_guide', rev='1-c')]
+        with mock.patch.object(Book._meta, 'get_database', return_value=db):
+            result = Book.objects.bulk_save(documents)
+        self.assertEqual(result[0], 'saved')
+        self.assertIsInstance(result[1], exceptions.RevisionMismatch)
+        self.assertEqual(result[1].args[0]['id'], 'python_cookbook')
+        self.assertIsInstance(result[2], exceptions.ObjectDoesNotExist)
+        self.assertEqual([row['_id'] for row in db.bulk_docs.call_args[0][0]], ['django_guide'])
+        self.assertEqual(documents[0]._rev, '1-c')
+        db.bulk_docs.reset_mock()
+        with mock.patch.object(Book._meta, 'get_database', return_value=db):
+            self.assertEqual(len(Book.objects.bulk_save(documents[1:])), 2)
+        self.assertFalse(db.bulk_docs.called)
+
+    def test_compact(self):
+        document = self.get_partial(CompactBook, 'title')
+        self.assertEqual(document._get_data(), dict(
+            _id='python_cookbook', _rev='1-a', document_type='book', title='Python cookbook',
+        ))
+        document.title = 'Php cookbook'
+        with mock.patch.object(CompactBook.objects, '_fetch', return_value=dict(self.data)):
+            self.assertEqual(document.pages, 806)
+            self.assertEqual(document.isbn, '978-1449340377')
+        self.assertEqual(document.title, 'Php cookbook')
+        self.assertEqual(document.datetime, datetime.datetime(2013, 5, 1, 9, 0, tzinfo=pytz.utc))
+
+
 class DocumentTest(CouchTestCase):
     def setUp(self):
         self.server = Server()
@@ -468,6 +884,25 @@ class DocumentTest(CouchTestCase):
         document.save(only_if_changed=True)
         self.assertNotEqual(document._rev, first_document_rev)
 
+    def test_save_only_if_changed_snapshot(self):
+        Book(_id='python_cookbook', title='Python cookbook').save()
+        document = Book.objects.get('python_cookbook')
+        first_document_rev = document._rev
+        with mock.patch.object(Book.objects, 'get') as get:
+            self.assertEqual(document.save(only_if_changed=True), 'unchanged')
+            document.title = 'Php cookbook'
+            self.assertEqual(document.changed_fields(), ['title'])
+            self.assertEqual(document.save(only_if_changed=True), 'saved')
+            self.assertFalse(document.is_dirty())
+        self.assertFalse(get.called)
+        self.assertNotEqual(document._rev, first_document_rev)
+
+    def test_save_only_if_changed_no_snapshot(self):
+        Book(_id='python_cookbook', title='Python cookbook').save()
+        document = Book(_id='python_cookbook', title='Python cookbook')
+        self.assertEqual(document.save(only_if_changed=True), 'unchanged')
+        self.assertFalse(document.is_dirty())
+
     def test_delete(self):
         document = Book(_id='python_cookbook', title='Python cookbook')
         document.save()
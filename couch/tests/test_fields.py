@@ -1,4 +1,5 @@
 import pytz
+from datetime import date
 from datetime import datetime
 from django.test import override_settings
 from django.test import SimpleTestCase
@@ -17,6 +18,28 @@ class TextFieldTest(SimpleTestCase):
         self.assertEqual(value, 'Text')
 
 
+class DateFieldTest(SimpleTestCase):
+    def test_to_python(self):
+        self.assertEqual(fields.DateField().to_python('2013-05-01'), date(2013, 5, 1))
+
+    def test_to_python_fallback(self):
+        self.assertEqual(fields.DateField().to_python('2013-05-01T12:00:00+00:00'), date(2013, 5, 1))
+        self.assertEqual(fields.DateField().to_python('May 1 2013'), date(2013, 5, 1))
+
+
+class ParseDatetimeTest(SimpleTestCase):
+    def test_iso(self):
+        self.assertEqual(fields.parse_datetime('2013-05-01T12:00:00'), datetime(2013, 5, 1, 12, 0))
+        self.assertEqual(fields.parse_datetime('2013-05-01T12:00:00.123456+00:00'),
+                         pytz.utc.localize(datetime(2013, 5, 1, 12, 0, 0, 123456)))
+        self.assertEqual(fields.parse_datetime('2013-05-01T12:00:00Z'), pytz.utc.localize(datetime(2013, 5, 1, 12, 0)))
+
+    def test_fallback(self):
+        self.assertEqual(fields.parse_datetime('May 1 2013 12:00 UTC'), pytz.utc.localize(datetime(2013, 5, 1, 12, 0)))
+        with self.assertRaises(TypeError):
+            fields.parse_datetime(None)
+
+
 class DateTimeFieldTest(SimpleTestCase):
     def test_to_json_naive(self):
         with self.assertRaises(exceptions.CouchError) as context:
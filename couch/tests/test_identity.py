@@ -0,0 +1,97 @@
+import threading
+import time
+from unittest import mock
+from django.test import override_settings
+from django.test import SimpleTestCase
+from .. import documents
+from ..database import to_document
+from ..identity import get_identity_map
+from ..identity import identity_map
+from ..middleware import IdentityMapMiddleware
+
+
+class Book(documents.Document):
+    title = documents.TextField()
+
+    class Meta:
+        database_name = 'db'
+        document_type = 'book'
+
+
+class Author(documents.Document):
+    class Meta:
+        database_name = 'db'
+        document_type = 'author'
+
+
+@override_settings(COUCH_SERVERS=dict(default=dict()))
+class IdentityMapTest(SimpleTestCase):
+    def setUp(self):
+        self.db = Book._meta.get_database()
+
+    def test_context_manager(self):
+        self.assertEqual(get_identity_map(), None)
+        with identity_map() as outer:
+            self.assertIs(get_identity_map(), outer)
+            with identity_map() as inner:
+                self.assertIs(inner, outer)
+            self.assertIs(get_identity_map(), outer)
+        self.assertEqual(get_identity_map(), None)
+        self.assertEqual(len(outer), 0)
+
+    def test_middleware(self):
+        def get_response(request):
+            self.assertNotEqual(get_identity_map(), None)
+            return 'response'
+
+        self.assertEqual(IdentityMapMiddleware(get_response)('request'), 'response')
+        self.assertEqual(get_identity_map(), None)
+
+    def test_add(self):
+        with identity_map() as documents:
+            book = Book(_id='a')
+            self.assertIs(documents.add(self.db, book), book)
+            self.assertIs(documents.add(self.db, Book(_id='a')), book)
+            self.assertIs(documents.get(self.db, Book, 'a'), book)
+            self.assertEqual(documents.get(self.db, Author, 'a'), None)
+            other = Book(_id='a')
+            documents.set(self.db, other)
+            self.assertIs(documents.get(self.db, Book, 'a'), other)
+            documents.remove(self.db, 'a')
+            self.assertEqual(documents.get(self.db, Book, 'a'), None)
+
+    def test_get(self):
+        data = dict(_id='a', _rev='1-a', document_type='book', title='A')
+        with mock.patch.object(Book.objects, '_fetch', side_effect=lambda db, _id: dict(data)) as fetch:
+            self.assertIsNot(Book.objects.get('a'), Book.objects.get('a'))
+            with identity_map():
+                book = Book.objects.get('a')
+                self.assertIs(Book.objects.get('a'), book)
+                self.assertIs(to_document(Book, data, self.db), book)
+                self.assertIsNot(Book.objects.get('a', raw=True), book)
+        self.assertEqual(fetch.call_count, 4)
+
+    def test_to_document(self):
+        with identity_map():
+            book = to_document(Book, dict(_id='a', title='A'), self.db)
+            self.assertIs(to_document(Book, dict(_id='a', title='A'), self.db), book)
+            self.assertIsNot(to_document(Book, dict(title='A'), self.db), book)
+
+    def test_add_threads(self):
+        class SlowDict(dict):
+            def get(self, key, default=None):
+                value = super(SlowDict, self).get(key, default)
+                # Widens the window between the lookup and the registration.
+                time.sleep(0.01)
+                return value
+
+        with identity_map() as mapped:
+            mapped._documents = SlowDict()
+            results = []
+            threads = [threading.Thread(target=lambda: results.append(mapped.add(self.db, Book(_id='a'))))
+                       for i in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(set(map(id, results))), 1)
@@ -0,0 +1,169 @@
+import time
+from unittest import mock
+from django.core.cache import caches
+from django.test import override_settings
+from django.test import SimpleTestCase
+from ..test import CouchTestCase
+from .. import Database
+from .. import documents
+from .. import exceptions
+from .. import invalidation
+from .. import Server
+
+
+class Book(documents.Document):
+    title = documents.TextField()
+
+    class Meta:
+        database_name = 'invalidationdb'
+        document_type = 'book'
+        cache = True
+        etag_cache = 10
+
+
+class Author(documents.Document):
+    name = documents.TextField()
+
+    class Meta:
+        database_name = 'otherdb'
+
+
+def get_change(_id, rev, deleted=False):
+    change = dict(seq='1-a', id=_id, changes=[dict(rev=rev)])
+    if deleted:
+        change['deleted'] = True
+    return change
+
+
+@override_settings(COUCH_SERVERS=dict(default=dict()))
+class InvalidationTest(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        Book._meta.etag_cache.clear()
+        self.db = Database('invalidationdb')
+
+    def set_cached(self, data):
+        Book._meta.cache.set(self.db, data)
+        Book._meta.etag_cache.set(('invalidationdb', data['_id']), ('"{}"'.format(data['_rev']), data))
+
+    def is_cached(self, document_id):
+        return (
+            Book._meta.cache.get(self.db, document_id) is not None,
+            ('invalidationdb', document_id) in Book._meta.etag_cache,
+        )
+
+    def test_generation(self):
+        generation = invalidation.get_generation(self.db)
+        invalidation.invalidate(self.db, get_change('a', '1-a'))
+        self.assertEqual(invalidation.get_generation(self.db), generation + 1)
+        self.assertEqual(invalidation.get_generation(Database('otherdb')), 0)
+
+    def test_document_classes(self):
+        self.assertEqual(set(invalidation.get_document_classes(self.db)), {Book})
+        self.assertIn(Author, set(invalidation.get_document_classes(Database('otherdb'))))
+
+    def test_evict(self):
+        self.set_cached(dict(_id='a', _rev='1-a', title='A'))
+        self.set_cached(dict(_id='b', _rev='1-b', title='B'))
+        invalidation.invalidate(self.db, get_change('a', '2-a'))
+        self.assertEqual(self.is_cached('a'), (False, False))
+        self.assertEqual(self.is_cached('b'), (True, True))
+
+    def test_keep_same_revision(self):
+        self.set_cached(dict(_id='a', _rev='2-a', title='A'))
+        invalidation.invalidate(self.db, get_change('a', '2-a'))
+        self.assertEqual(self.is_cached('a'), (True, True))
+        invalidation.invalidate(self.db, get_change('a', '2-a', deleted=True))
+        self.assertEqual(self.is_cached('a'), (False, False))
+
+    @override_settings(COUCH_SERVERS=dict(default=dict(INVALIDATION=True), other=dict(INVALIDATION=['db1', 'db2'])))
+    def test_listened_databases(self):
+        self.assertEqual(invalidation.get_listened_databases(), [
+            ('default', 'ctanotherdb'), ('default', 'ctdb'), ('default', 'ctemptydb'), ('other', 'db1'), ('other', 'db2'),
+        ])
+
+    def test_no_listened_databases(self):
+        self.assertEqual(invalidation.get_listened_databases(), [])
+        self.assertEqual(invalidation.start_listeners(), [])
+
+    @override_settings(COUCH_SERVERS=dict(default=dict(INVALIDATION=['db1'])))
+    def test_start_listeners_after_fork(self):
+        with mock.patch.object(invalidation, 'ChangesListener') as listener_class:
+            listeners = invalidation.start_listeners()
+            self.assertEqual(invalidation.start_listeners(), listeners)
+            self.assertEqual(listener_class.call_count, 1)
+            invalidation._reset_listeners()
+            self.assertEqual(invalidation.start_listeners(), listeners)
+            self.assertEqual(listener_class.call_count, 2)
+            invalidation.stop_listeners()
+        listener_class.assert_called_with('db1', alias='default')
+
+    def test_listener(self):
+        db = mock.Mock()
+        db.changes.return_value = (row for row in [None, get_change('a', '2-a'), None])
+        listener = invalidation.ChangesListener('invalidationdb')
+        with mock.patch.object(invalidation.registry, 'get_database', return_value=db):
+            with mock.patch.object(invalidation, 'invalidate') as invalidate:
+                listener.run()
+        invalidate.assert_called_once_with(db, get_change('a', '2-a'))
+        self.assertEqual(db.changes.call_args[1]['since'], 'now')
+        self.assertEqual(db.changes.call_args[1]['feed'], 'continuous')
+
+    def test_listener_reconnect(self):
+        db = mock.Mock()
+        listener = invalidation.ChangesListener('invalidationdb')
+        listener._stop_event.wait = mock.Mock()
+        states = []
+
+        def broken():
+            yield None
+            yield get_change('a', '2-a')
+            states.append((invalidation.is_listened(db), invalidation.get_generation(db)))
+            raise exceptions.CouchError(dict(error='requests.exceptions.ConnectionError', reason='reset'))
+
+        def resumed():
+            states.append((invalidation.is_listened(db), invalidation.get_generation(db)))
+            yield None
+            states.append((invalidation.is_listened(db), invalidation.get_generation(db)))
+            listener._stop_event.set()
+            yield None
+
+        db.changes.side_effect = [broken(), resumed()]
+        with mock.patch.object(invalidation.registry, 'get_database', return_value=db):
+            with mock.patch.object(invalidation, 'invalidate'):
+                listener.run()
+        generation = states[0][1]
+        self.assertEqual(states, [(True, generation), (False, generation + 1), (True, generation + 1)])
+        self.assertFalse(invalidation.is_listened(db))
+        self.assertEqual(db.changes.call_args[1]['since'], '1-a')
+        self.assertEqual(db.changes.call_args[1]['max_retries'], 0)
+        listener._stop_event.wait.assert_called_once_with(1)
+
+    def test_listener_stop(self):
+        db = mock.Mock()
+        db.changes.return_value = (row for row in [None, get_change('a', '2-a')])
+        listener = invalidation.ChangesListener('invalidationdb')
+        listener._stop_event.set()
+        with mock.patch.object(invalidation.registry, 'get_database', return_value=db):
+            with mock.patch.object(invalidation, 'invalidate') as invalidate:
+                listener.run()
+        self.assertFalse(invalidate.called)
+
+
+class ChangesListenerTest(CouchTestCase):
+    def test_listener(self):
+        db, created = Server().get_or_create_database('invalidationdb')
+        listener = invalidation.ChangesListener('invalidationdb', heartbeat=100)
+        listener.start()
+        try:
+            generation = invalidation.get_generation(db)
+            time.sleep(0.5)
+            Book(_id='a', title='A').save()
+            for i in range(50):
+                if invalidation.get_generation(db) > generation:
+                    break
+                time.sleep(0.1)
+            self.assertGreater(invalidation.get_generation(db), generation)
+        finally:
+            listener.stop(timeout=5)
+        self.assertFalse(listener.is_alive())
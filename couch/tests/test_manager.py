@@ -2,6 +2,8 @@ import datetime
 import itertools
 import pytz
 from decimal import Decimal
+from unittest import mock
+from django.core.cache import caches
 from django.test import override_settings
 from ..test import CouchTestCase
 from .. import documents
@@ -203,6 +205,24 @@ class ManagerFindTest(CouchTestCase):
             list(itertools.islice(result, 5))
         self.assertEqual(context.exception.args[0], "Type mismatch error: document_type 'book' expected, got 'author'")
 
+    def test_only(self):
+        result = list(Book.objects.find(selector=dict(document_type='book'), warning=False).only('title'))
+        self.assertEqual(len(result), 2)
+        document = result[0]
+        self.assertEqual(document._loaded_fields, {'_id', '_rev', 'document_type', 'title'})
+        self.assertNotIn('pages', document._get_data())
+        self.assertEqual(document.title, 'The Definitive Guide to Django')
+        self.assertEqual(document.pages, 536)
+        self.assertEqual(document._loaded_fields, None)
+
+    def test_only_save(self):
+        document = Book.objects.find_one(selector=dict(title='Python Cookbook'), fields=['title'], warning=False)
+        document.title = 'Python Cookbook, 3rd edition'
+        self.assertEqual(document.save(), 'saved')
+        document = Book.objects.get('python_cookbook')
+        self.assertEqual(document.title, 'Python Cookbook, 3rd edition')
+        self.assertEqual(document.pages, 806)
+
 
 class ManagerFindOneTest(CouchTestCase):
     def setUp(self):
@@ -232,3 +252,174 @@ class ManagerFindOneTest(CouchTestCase):
     def test_find_one_multiple_objects(self):
         with self.assertRaises(Author.MultipleObjectsReturned):
             Author.objects.find_one(selector=dict(document_type='author'), warning=False)
+
+
+class ManagerBulkTest(CouchTestCase):
+    def setUp(self):
+        self.db, created = Server().get_or_create_database('db')
+
+    def test_bulk_save(self):
+        books = [Book(title='Book {}'.format(i), pages=i) for i in range(5)]
+        result = Book.objects.bulk_save(books, batch_size=2)
+        self.assertEqual(result, ['saved'] * 5)
+        for book in books:
+            self.assertNotEqual(book._id, None)
+            self.assertNotEqual(book._rev, None)
+            document = Book.objects.get(book._id)
+            self.assertEqual(document.title, book.title)
+            self.assertEqual(document.pages, book.pages)
+            self.assertEqual(document._rev, book._rev)
+
+    def test_bulk_save_update(self):
+        book = Book(_id='python_cookbook', title='Python Cookbook')
+        book.save()
+        first_rev = book._rev
+        book.title = 'Python Cookbook, 3rd edition'
+        self.assertEqual(Book.objects.bulk_save([book]), ['saved'])
+        self.assertNotEqual(book._rev, first_rev)
+        self.assertEqual(Book.objects.get('python_cookbook').title, 'Python Cookbook, 3rd edition')
+
+    def test_bulk_save_conflict(self):
+        Book(_id='python_cookbook').save()
+        books = [Book(_id='python_cookbook'), Book(_id='django_guide')]
+        result = Book.objects.bulk_save(books)
+        self.assertIsInstance(result[0], exceptions.RevisionMismatch)
+        self.assertEqual(result[0].args[0]['error'], 'conflict')
+        self.assertEqual(result[0].args[0]['id'], 'python_cookbook')
+        self.assertEqual(books[0]._rev, None)
+        self.assertEqual(result[1], 'saved')
+        self.assertNotEqual(books[1]._rev, None)
+
+    def test_bulk_save_ko_batch_size(self):
+        with self.assertRaises(ValueError) as context:
+            Book.objects.bulk_save([], batch_size=0)
+        self.assertEqual(context.exception.args, ('batch_size must be greater than 0',))
+
+    def test_bulk_delete(self):
+        books = [Book(_id='python_cookbook'), Book(_id='django_guide'), Book(_id='php_cookbook')]
+        Book.objects.bulk_save(books)
+        stale = Book(_id='php_cookbook', _rev=books[2]._rev)
+        stale.save(revision_mismatch_override=True)
+        result = Book.objects.bulk_delete(books, batch_size=2)
+        self.assertEqual(result[:2], ['deleted', 'deleted'])
+        self.assertIsInstance(result[2], exceptions.RevisionMismatch)
+        with self.assertRaises(Book.DoesNotExist):
+            Book.objects.get('python_cookbook')
+        with self.assertRaises(Book.DoesNotExist):
+            Book.objects.get('django_guide')
+        Book.objects.get('php_cookbook')
+
+
+@override_settings(TIME_ZONE='UTC')
+class ManagerGetManyTest(CouchTestCase):
+    def setUp(self):
+        self.db, created = Server().get_or_create_database('db')
+        Book(_id='python_cookbook', title='Python Cookbook', date=datetime.date(2013, 5, 1)).save()
+        Book(_id='django_guide', title='The Definitive Guide to Django').save()
+        Book(_id='deleted_book').save()
+        Book.objects.get('deleted_book').delete()
+
+    def test_get_many(self):
+        ids = ['python_cookbook', 'missing', 'django_guide', 'deleted_book']
+        result = Book.objects.get_many(ids, batch_size=3)
+        self.assertEqual(list(result.keys()), ids)
+        self.assertIsInstance(result['python_cookbook'], Book)
+        self.assertEqual(result['python_cookbook'].title, 'Python Cookbook')
+        self.assertEqual(result['python_cookbook'].date, datetime.date(2013, 5, 1))
+        self.assertEqual(result['django_guide'].title, 'The Definitive Guide to Django')
+        self.assertEqual(result['missing'], None)
+        self.assertEqual(result['deleted_book'], None)
+
+    def test_in_bulk(self):
+        result = Book.objects.in_bulk(['missing', 'django_guide', 'python_cookbook'])
+        self.assertEqual(list(result.keys()), ['django_guide', 'python_cookbook'])
+
+    def test_get_many_document_type_mismatch(self):
+        Author(_id='alex', name='Alex Martelli').save()
+        with self.assertRaises(exceptions.CouchError) as context:
+            Book.objects.get_many(['python_cookbook', 'alex'])
+        self.assertEqual(context.exception.args[0], "Type mismatch error: document_type 'book' expected, got 'author'")
+
+    def test_get_many_ko_batch_size(self):
+        with self.assertRaises(ValueError) as context:
+            Book.objects.get_many([], batch_size=0)
+        self.assertEqual(context.exception.args, ('batch_size must be greater than 0',))
+
+
+class Settings(documents.Document):
+    values = documents.JsonField()
+
+    class Meta:
+        database_name = 'db'
+        document_type = 'settings'
+        etag_cache = 10
+
+
+class ManagerEtagCacheTest(CouchTestCase):
+    def setUp(self):
+        self.server = Server()
+        self.server.get_or_create_database('db')
+        Settings._meta.etag_cache.clear()
+
+    def test_get_not_modified(self):
+        Settings(_id='site', values=dict(theme='dark')).save()
+        document = Settings.objects.get('site')
+        self.assertEqual(document.values, dict(theme='dark'))
+        document.values['theme'] = 'light'
+        with mock.patch.object(Server, '_check_response') as check_response:
+            document = Settings.objects.get('site')
+        self.assertFalse(check_response.called)
+        self.assertEqual(document.values, dict(theme='dark'))
+
+    def test_get_modified(self):
+        Settings(_id='site', values=dict(theme='dark')).save()
+        document = Settings.objects.get('site')
+        document.values = dict(theme='light')
+        document.save()
+        document = Settings.objects.get('site')
+        self.assertEqual(document.values, dict(theme='light'))
+        self.assertEqual(document._rev, Settings.objects.get('site')._rev)
+
+    def test_get_deleted(self):
+        Settings(_id='site').save()
+        Settings.objects.get('site').delete()
+        with self.assertRaises(Settings.DoesNotExist):
+            Settings.objects.get('site')
+        self.assertEqual(len(Settings._meta.etag_cache), 0)
+
+    def test_get_rev(self):
+        document = Settings(_id='site')
+        document.save()
+        self.assertEqual(Settings.objects.get_rev('site'), document._rev)
+        with self.assertRaises(Settings.DoesNotExist):
+            Settings.objects.get_rev('missing')
+
+
+class CachedBook(documents.Document):
+    title = documents.TextField()
+
+    class Meta:
+        database_name = 'db'
+        document_type = 'book'
+        cache = True
+
+
+class ManagerDocumentCacheTest(CouchTestCase):
+    def setUp(self):
+        self.server = Server()
+        self.server.get_or_create_database('db')
+        caches['default'].clear()
+        CachedBook._meta.cache.reset_stats()
+
+    def test_write_through(self):
+        document = CachedBook(_id='python_cookbook', title='Python cookbook')
+        document.save()
+        self.assertEqual(CachedBook.objects.get('python_cookbook')._rev, document._rev)
+        self.assertEqual(CachedBook._meta.cache.stats()['hits'], 1)
+        document.title = 'Python cookbook v2'
+        document.save()
+        self.assertEqual(CachedBook.objects.get('python_cookbook').title, 'Python cookbook v2')
+        document.delete()
+        with self.assertRaises(CachedBook.DoesNotExist):
+            CachedBook.objects.get('python_cookbook')
+        self.assertEqual(CachedBook._meta.cache.stats()['misses'], 1)
@@ -0,0 +1,101 @@
+import asyncio
+from django.conf import settings
+from django.test import override_settings
+from django.test import SimpleTestCase
+from .. import documents
+from ..registry import registry
+from ..registry import get_async_server
+from ..registry import get_database
+from ..registry import get_server
+
+
+@override_settings(COUCH_SERVERS=dict(default=dict(), another=dict(PORT=9999)))
+class RegistryTest(SimpleTestCase):
+    def test_get_server(self):
+        server = get_server()
+        self.assertEqual(server.alias, 'default')
+        self.assertIs(get_server(), server)
+        self.assertIs(get_server('default'), server)
+
+    def test_get_server_alias(self):
+        server = get_server('another')
+        self.assertEqual(server.alias, 'another')
+        self.assertEqual(server.port, 9999)
+        self.assertIsNot(get_server(), server)
+
+    def test_get_database(self):
+        db = get_database('mydb')
+        self.assertEqual(db.name, 'mydb')
+        self.assertIs(db.server, get_server())
+        self.assertIs(get_database('mydb'), db)
+        self.assertIsNot(get_database('otherdb'), db)
+        self.assertIsNot(get_database('mydb', alias='another'), db)
+
+    def test_prefix_change(self):
+        server = get_server()
+        db = get_database('mydb')
+        config = settings.COUCH_SERVERS['default']
+        config['DATABASE_PREFIX'] = 'prefix_'
+        try:
+            new_server = get_server()
+            new_db = get_database('mydb')
+            self.assertIsNot(new_server, server)
+            self.assertIsNot(new_db, db)
+            self.assertEqual(new_db._get_database_name(), 'prefix_mydb')
+        finally:
+            config.pop('DATABASE_PREFIX')
+        self.assertIs(get_server(), server)
+
+    def test_clear(self):
+        server = get_server()
+        generation = registry.generation
+        registry.clear()
+        self.assertEqual(registry.generation, generation + 1)
+        self.assertIsNot(get_server(), server)
+
+    def test_clear_async(self):
+        async def get_servers():
+            return get_async_server()
+
+        async def clear():
+            registry.clear()
+            await asyncio.sleep(0)
+
+        loop = asyncio.get_event_loop()
+        server = loop.run_until_complete(get_servers())
+        registry.clear()
+        self.assertTrue(server.session.is_closed)
+        server = loop.run_until_complete(get_servers())
+        loop.run_until_complete(clear())
+        self.assertTrue(server.session.is_closed)
+        self.assertIsNot(loop.run_until_complete(get_servers()), server)
+
+    def test_setting_changed(self):
+        server = get_server()
+        with override_settings(COUCH_SERVERS=dict(default=dict(HOST='example.com'))):
+            self.assertEqual(get_server().host, 'example.com')
+        self.assertIsNot(get_server(), server)
+        self.assertEqual(get_server().host, 'localhost')
+
+    def test_options_get_database(self):
+        class Book(documents.Document):
+            class Meta:
+                database_name = 'db'
+
+        db = Book._meta.get_database()
+        self.assertIs(Book._meta.get_database(), db)
+        self.assertIs(db, get_database('db'))
+        registry.clear()
+        new_db = Book._meta.get_database()
+        self.assertIsNot(new_db, db)
+        self.assertIs(new_db, get_database('db'))
+
+    def test_options_database_assigned(self):
+        class Book(documents.Document):
+            class Meta:
+                database_name = 'db'
+
+        db = get_database('otherdb')
+        Book._meta.database = db
+        registry.clear()
+        self.assertIs(Book._meta.get_database(), db)
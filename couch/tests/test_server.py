@@ -1,7 +1,12 @@
+import time
+from unittest import mock
+from django.core.exceptions import ImproperlyConfigured
 from django.test import override_settings
 from django.test import SimpleTestCase
 from .. import exceptions
 from .. import Server
+from ..cache import ResultCache
+from ..codec import JsonCodec
 from ..test import CouchTestCase
 
 
@@ -115,6 +120,37 @@ class ServerTest(CouchTestCase):
         with self.assertRaises(exceptions.CouchError):
             server.single_node_setup()
 
+    def test_cookie_authentication(self):
+        server = Server(authentication='cookie')
+        self.assertEqual(server.session.auth, None)
+        data = server.get('/_session')
+        self.assertEqual(data['userCtx']['name'], 'admin')
+        self.assertIn('AuthSession', server.session.cookies)
+        self.assertNotEqual(server._session_started, None)
+
+    def test_cookie_authentication_expired(self):
+        server = Server(authentication='cookie')
+        server.get('/_session')
+        server._session_started -= server.session_timeout
+        cookie = server.session.cookies['AuthSession']
+        data = server.get('/_session')
+        self.assertEqual(data['userCtx']['name'], 'admin')
+        self.assertNotEqual(server.session.cookies['AuthSession'], cookie)
+
+    def test_cookie_authentication_unauthorized(self):
+        server = Server(authentication='cookie')
+        server.get('/_session')
+        server.session.cookies.clear()
+        data = server.get('/_all_dbs')
+        self.assertIsInstance(data, list)
+        self.assertIn('AuthSession', server.session.cookies)
+
+    def test_cookie_authentication_wrong_password(self):
+        server = Server(authentication='cookie', password='wrong')
+        with self.assertRaises(exceptions.CouchError) as context:
+            server.get('/_all_dbs')
+        self.assertEqual(context.exception.args[0]['error'], 'unauthorized')
+
 
 class DefaultServerTest(SimpleTestCase):
     @override_settings(COUCH_SERVERS=dict(default=dict()))
@@ -127,6 +163,11 @@ class DefaultServerTest(SimpleTestCase):
         self.assertEqual(server.username, None)
         self.assertEqual(server.password, None)
         self.assertEqual(server.database_prefix, '')
+        self.assertEqual(server.pool_connections, 10)
+        self.assertEqual(server.pool_maxsize, 10)
+        self.assertEqual(server.pool_block, False)
+        self.assertEqual(server.authentication, 'basic')
+        self.assertEqual(server.session_timeout, 600)
 
     @override_settings(COUCH_SERVERS=dict(default=dict(PROTOCOL='https', HOST='192.168.1.1', PORT=9999, USERNAME='user', PASSWORD='pass', DATABASE_PREFIX='test_')))
     def test_config(self):
@@ -150,6 +191,102 @@ class DefaultServerTest(SimpleTestCase):
         self.assertEqual(server.password, 'admin')
         self.assertEqual(server.database_prefix, 'demo_')
 
+    @override_settings(COUCH_SERVERS=dict(default=dict(POOL_CONNECTIONS=4, POOL_MAXSIZE=20, POOL_BLOCK=True)))
+    def test_pool_config(self):
+        server = Server()
+        self.assertEqual(server.pool_connections, 4)
+        self.assertEqual(server.pool_maxsize, 20)
+        self.assertEqual(server.pool_block, True)
+        for prefix in ('http://', 'https://'):
+            adapter = server.session.get_adapter(prefix)
+            self.assertEqual(adapter._pool_connections, 4)
+            self.assertEqual(adapter._pool_maxsize, 20)
+            self.assertEqual(adapter._pool_block, True)
+
+    @override_settings(COUCH_SERVERS=dict(default=dict(POOL_CONNECTIONS=4, POOL_MAXSIZE=20, POOL_BLOCK=True)))
+    def test_pool_override(self):
+        server = Server(pool_connections=1, pool_maxsize=2, pool_block=False)
+        adapter = server.session.get_adapter('http://')
+        self.assertEqual(adapter._pool_connections, 1)
+        self.assertEqual(adapter._pool_maxsize, 2)
+        self.assertEqual(adapter._pool_block, False)
+
+    @override_settings(COUCH_SERVERS=dict(default=dict(USERNAME='user', PASSWORD='pass')))
+    def test_session_auth(self):
+        server = Server()
+        self.assertEqual(server.session.auth, ('user', 'pass'))
+
+    @override_settings(COUCH_SERVERS=dict(default=dict(USERNAME='user', PASSWORD='pass', AUTHENTICATION='cookie', SESSION_TIMEOUT=60)))
+    def test_cookie_authentication_config(self):
+        server = Server()
+        self.assertEqual(server.authentication, 'cookie')
+        self.assertEqual(server.session_timeout, 60)
+        self.assertEqual(server.auth, ('user', 'pass'))
+        self.assertEqual(server.session.auth, None)
+
+    @override_settings(COUCH_SERVERS=dict(default=dict(AUTHENTICATION='cookie')))
+    def test_cookie_authentication_no_credentials(self):
+        server = Server()
+        self.assertEqual(server.authentication, 'basic')
+        self.assertEqual(server.session.auth, None)
+
+    @override_settings(COUCH_SERVERS=dict(default=dict(USERNAME='user', PASSWORD='pass', AUTHENTICATION='cookie')))
+    def test_cookie_authentication_relogin_once(self):
+        server = Server()
+        server._session_started = time.time()
+        responses = [mock.Mock(status_code=401), mock.Mock(status_code=200, cookies=dict())]
+
+        def request(method, url, **kwargs):
+            response = responses.pop(0)
+            if response.status_code == 401:
+                # Another thread logs in while the request is in flight.
+                server._session_started += 1
+            return response
+
+        with mock.patch.object(server.session, 'request', side_effect=request):
+            with mock.patch.object(server, '_login') as login:
+                self.assertEqual(server._send('GET', '', [200]).status_code, 200)
+        self.assertFalse(login.called)
+        responses = [mock.Mock(status_code=401), mock.Mock(status_code=200, cookies=dict())]
+        with mock.patch.object(server.session, 'request', side_effect=lambda *args, **kwargs: responses.pop(0)):
+            with mock.patch.object(server, '_login') as login:
+                self.assertEqual(server._send('GET', '', [200]).status_code, 200)
+        login.assert_called_once_with()
+
+    @override_settings(COUCH_SERVERS=dict(default=dict(AUTHENTICATION='digest')))
+    def test_authentication_unknown(self):
+        with self.assertRaises(ImproperlyConfigured):
+            Server()
+
+    @override_settings(COUCH_SERVERS=dict(default=dict(JSON_CODEC='couch.codec.JsonCodec')))
+    def test_json_codec_config(self):
+        server = Server()
+        self.assertEqual(server.json_codec, 'couch.codec.JsonCodec')
+        self.assertIsInstance(server.codec, JsonCodec)
+        server = Server(json_codec='json')
+        self.assertIsInstance(server.codec, JsonCodec)
+
+    @override_settings(COUCH_SERVERS=dict(default=dict(JSON_CODEC='nowhere.Codec')))
+    def test_json_codec_unknown(self):
+        with self.assertRaises(ImproperlyConfigured):
+            Server()
+
+    @override_settings(COUCH_SERVERS=dict(default=dict(RESULT_CACHE=dict(max_size=1024))))
+    def test_result_cache_config(self):
+        server = Server()
+        self.assertIsInstance(server.result_cache, ResultCache)
+        self.assertEqual(server.result_cache.cache.max_size, 1024)
+        self.assertIsInstance(Server(result_cache=True).result_cache, ResultCache)
+        self.assertEqual(Server(result_cache=False).result_cache, None)
+
+    @override_settings(COUCH_SERVERS=dict(default=dict()))
+    def test_encode_body(self):
+        server = Server()
+        kwargs = server._encode_body(dict(json=dict(a=1), headers=dict(Accept='text/plain')))
+        self.assertEqual(server.codec.loads(kwargs['data']), dict(a=1))
+        self.assertEqual(kwargs['headers'], {'Accept': 'text/plain', 'Content-Type': 'application/json'})
+        self.assertEqual(server._encode_body(dict(data='x')), dict(data='x'))
+
 
 class OtherServerTest(SimpleTestCase):
     @override_settings(COUCH_SERVERS=dict(another=dict()))
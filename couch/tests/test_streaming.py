@@ -0,0 +1,52 @@
+import json
+from django.test import SimpleTestCase
+from .. import exceptions
+from ..streaming import RowParser
+
+
+class RowParserTest(SimpleTestCase):
+    def setUp(self):
+        self.rows = [
+            dict(id='docid{}'.format(i), key=['key', i, 'café'], value=dict(text='a],{"b"' * i))
+            for i in range(20)
+        ]
+        rows = ',\r\n'.join(json.dumps(row, ensure_ascii=False) for row in self.rows)
+        body = '{"total_rows":20,"offset":0,"rows":[\r\n' + rows + '\r\n]}\n'
+        self.body = body.encode('utf-8')
+
+    def parse(self, chunk_size):
+        parser = RowParser()
+        rows = []
+        for i in range(0, len(self.body), chunk_size):
+            rows.extend(parser.feed(self.body[i:i + chunk_size]))
+        parser.close()
+        return rows
+
+    def test_single_chunk(self):
+        self.assertEqual(self.parse(len(self.body)), self.rows)
+
+    def test_small_chunks(self):
+        for chunk_size in (1, 2, 7, 64):
+            self.assertEqual(self.parse(chunk_size), self.rows)
+
+    def test_empty(self):
+        parser = RowParser()
+        self.assertEqual(parser.feed(b'{"total_rows":0,"offset":0,"rows":[]}'), [])
+        parser.close()
+
+    def test_other_key(self):
+        parser = RowParser(key='results')
+        rows = parser.feed(b'{"results":[{"seq":"1"},\n{"seq":"2"}\n],"last_seq":"2"}')
+        self.assertEqual(rows, [dict(seq='1'), dict(seq='2')])
+
+    def test_buffer_bounded(self):
+        parser = RowParser()
+        parser.feed(self.body[:len(self.body) // 2])
+        self.assertLess(len(parser.buffer), len(json.dumps(self.rows[-1])) * 2)
+
+    def test_incomplete(self):
+        parser = RowParser()
+        parser.feed(self.body[:100])
+        with self.assertRaises(exceptions.CouchError) as context:
+            parser.close()
+        self.assertEqual(context.exception.args[0]['error'], 'stream_error')
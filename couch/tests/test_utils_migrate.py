@@ -1,5 +1,10 @@
+from unittest import mock
+from django.test import override_settings
+from django.test import SimpleTestCase
+from .. import Database
 from .. import exceptions
 from .. import Server
+from ..registry import get_database
 from ..test import CouchTestCase
 from ..utils import apply_schema_migration
 
@@ -18,6 +23,17 @@ class MigrateTest(CouchTestCase):
         self.assertIn('db2', databases)
 
 
+@override_settings(COUCH_SERVERS=dict(default=dict()))
+class MigrateRegistryTest(SimpleTestCase):
+    def test_registry_database(self):
+        schema = dict(default=dict(db1=dict()))
+        with mock.patch.object(Server, 'get_or_create_database', return_value=(None, False)):
+            with mock.patch.object(Database, 'list_design_documents', autospec=True, return_value=dict(rows=[])):
+                with mock.patch.object(Database, 'list_indexes', autospec=True, return_value=dict()) as list_indexes:
+                    apply_schema_migration(schema)
+        list_indexes.assert_called_once_with(get_database('db1'))
+
+
 class MigrateDesignTest(CouchTestCase):
     def setUp(self):
         self.schema = dict(
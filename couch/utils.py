@@ -6,13 +6,14 @@ from importlib import import_module
 from django.apps import apps
 from django.utils.module_loading import module_has_submodule
 from . import documents
-from . import Server
+from .registry import get_database
+from .registry import get_server
 
 
 def server_setup(verbosity=0, stdout=sys.stdout):
     from django.conf import settings
     for alias in settings.COUCH_SERVERS.keys():
-        server = Server(alias=alias)
+        server = get_server(alias)
         server.single_node_setup()
         if verbosity > 0:
             stdout.write("Server '{}' setup.".format(alias))
@@ -94,9 +95,11 @@ def merge_schema(schema):
 def apply_schema_migration(schema, verbosity=0, stdout=sys.stdout):
     if schema:
         for alias, server_info in schema.items():
-            server = Server(alias=alias)
+            server = get_server(alias)
             for db_name, db_schema in server_info.items():
-                db, created = server.get_or_create_database(db_name)
+                created = server.get_or_create_database(db_name)[1]
+                # The registry instance, shared with the documents of db_name.
+                db = get_database(db_name, alias=alias)
                 if created and verbosity > 0:
                     stdout.write("Server '{}' - Database '{}' created.".format(alias, db_name))
                 # Remove no more needed design docs
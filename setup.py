@@ -31,9 +31,16 @@ setup(
         'License :: OSI Approved :: MIT License',
         'Operating System :: OS Independent',
         'Programming Language :: Python',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
         'Topic :: Utilities',
     ],
     zip_safe=False,
+    python_requires='>=3.7',
     packages=find_packages(),
     install_requires=requirements,
+    extras_require={
+        'async': ['httpx>=0.23'],
+        'columns': ['numpy'],
+    },
 )